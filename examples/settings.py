@@ -2,12 +2,42 @@
 # leave empty string to disable
 RAW_DATA_DIR = '/tmp/quakestats/data'
 
+# writable directory, events of unfinished QL matches are spooled there
+# so they survive collector restart, leave empty string to disable
+QL_SPOOL_DIR = '/tmp/quakestats/ql-spool'
+
 # secret token used for minimalistic auth, e.g. post new results
 ADMIN_TOKEN = 'mysecret'
 
 # secret key used to encrypt cookies (see flask session docs)
 SECRET_KEY = 'somesecret'
 
+# directory for cached API responses shared between web app processes
+# leave empty string to keep responses in process memory only
+RESPONSE_CACHE_DIR = ''
+
+# number of API responses cached in process memory
+RESPONSE_CACHE_SIZE = 512
+
+# max number of API responses kept in RESPONSE_CACHE_DIR
+RESPONSE_CACHE_DIR_SIZE = 10000
+
+# seconds between checks whether cached responses were invalidated by other process
+RESPONSE_CACHE_GENERATION_TTL = 5
+
+# max-age (seconds) of cached API responses for browsers and reverse proxies
+RESPONSE_CACHE_MAX_AGE = 300
+
+# directory where uploaded logs wait for processing (required for uploads),
+# not shared with other quakestats instances
+UPLOAD_SPOOL_DIR = '/tmp/quakestats/uploads'
+
+# number of background workers processing uploaded logs
+UPLOAD_WORKERS = 2
+
+# seconds after which status of processed upload is removed
+UPLOAD_RETENTION = 86400
+
 # mongo DB uri
 MONGO_URI = 'mongodb://localhost:27017/quakestats'
 
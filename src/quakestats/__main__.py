@@ -2,7 +2,8 @@
 
 import asyncio
 import logging
-import time
+import os
+import signal
 from configparser import (
     ConfigParser,
 )
@@ -16,18 +17,25 @@ from quakestats import (
     manage,
 )
 from quakestats.core.collector import (
-    QLStatCollector,
+    QLCollectorManager,
+)
+from quakestats.core.qlparser.spool import (
+    QLEventSpool,
 )
 from quakestats.health import (
     HealthInfo,
 )
 from quakestats.sdk import (
+    QLAnalysisPipeline,
     QSSdk,
 )
 from quakestats.system import (
     context,
     log,
 )
+from quakestats.system.cache import (
+    clear_disk_cache,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -48,15 +56,36 @@ def set_admin_password(password):
 
 
 @cli.command(name="rebuild-db")
-def run_rebuild_db():
+@click.option(
+    '--workers', type=int, default=None,
+    help="Analyze matches using given number of processes",
+)
+@click.option(
+    '--batch-size', type=int, default=100,
+    help="Number of matches written to DB at once",
+)
+@click.option(
+    '--incremental', is_flag=True, default=False,
+    help="Re-analyze only matches with changed warehouse file or analyzer",
+)
+def run_rebuild_db(workers, batch_size, incremental):
     ctx = context.SystemContext()
     sdk = QSSdk(ctx)
-    sdk.rebuild_db()
+    sdk.rebuild_db(workers, batch_size, incremental)
+    clear_disk_cache(ctx.config.get("RESPONSE_CACHE_DIR"))
 
 
 @cli.command(name="collect-ql")
 @click.argument("configfile")
-def collect_ql(configfile):
+@click.option(
+    '--raw-frames', is_flag=True, default=False,
+    help="Keep received events encoded, decode them only when match is analyzed",
+)
+@click.option(
+    '--analysis-workers', type=int, default=None,
+    help="Analyze finished matches in given number of processes",
+)
+def collect_ql(configfile, raw_frames, analysis_workers):
     """
     Config format
 
@@ -67,32 +96,100 @@ def collect_ql(configfile):
 
     [serv2]
     ...
+
+    Config is reloaded on SIGHUP
+    Events of unfinished matches are spooled in QL_SPOOL_DIR
+    and replayed on restart
     """
     ctx = context.SystemContext()
+    for name in ctx.ds.ensure_indexes():
+        logger.info("Created index %s", name)
     sdk = QSSdk(ctx)
-
-    collector_config = ConfigParser()
-    collector_config.read(configfile)
+    if analysis_workers:
+        sdk.ql_pipeline = QLAnalysisPipeline(sdk, analysis_workers)
+    spool_dir = ctx.config.get("QL_SPOOL_DIR")
 
     def event_cb(feed, timestamp: int, event: dict):
-        event['__recv_timestamp'] = time.time()
+        # called in executor thread, timestamp is the time of receiving
+        event['__recv_timestamp'] = timestamp
         sdk.feed_ql(feed, event)
 
-    async def main():
-        tasks = []
-        for section in collector_config.sections():
-            logger.info("Attaching stats from %s", section)
-            feed = sdk.create_ql_feed()
-            cb = partial(event_cb, feed)
-
-            ip = collector_config.get(section, 'ip')
-            port = collector_config.get(section, 'port')
-            pwd = collector_config.get(section, 'password')
+    async def report_metrics(manager):
+        while True:
+            await asyncio.sleep(60)
+            for metrics in manager.metrics():
+                logger.info("Collector metrics %s", metrics)
 
-            collector = QLStatCollector(ip, port, pwd)
-            tasks.append(asyncio.create_task(collector.start(cb)))
+    async def sync_spools(spools):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(1)
+            for spool in list(spools.values()):
+                await loop.run_in_executor(None, spool.sync_if_due)
 
-        await asyncio.gather(*tasks)
+    async def main():
+        manager = QLCollectorManager(raw=raw_frames)
+        # section -> (endpoint, server config)
+        attached = {}
+        spools = {}
+
+        reload_lock = asyncio.Lock()
+
+        async def load_config():
+            """
+            Attach new and detach removed/changed servers
+            """
+            collector_config = ConfigParser()
+            collector_config.read(configfile)
+            servers = {
+                section: (
+                    collector_config.get(section, 'ip'),
+                    collector_config.get(section, 'port'),
+                    collector_config.get(section, 'password'),
+                )
+                for section in collector_config.sections()
+            }
+
+            loop = asyncio.get_event_loop()
+            for section, (endpoint, server) in list(attached.items()):
+                if servers.get(section) != server:
+                    # waits for event being processed, spool is not used afterwards
+                    await manager.remove_server(endpoint)
+                    del attached[section]
+                    if section in spools:
+                        await loop.run_in_executor(None, spools.pop(section).close)
+
+            for section, server in servers.items():
+                if section in attached:
+                    continue
+
+                logger.info("Attaching stats from %s", section)
+                spool = None
+                if spool_dir:
+                    spool = QLEventSpool(
+                        os.path.join(spool_dir, f"{section}.jsonl")
+                    )
+                # replayed games are analyzed, don't block other servers
+                feed = await loop.run_in_executor(None, sdk.create_ql_feed, spool)
+                collector = manager.add_server(
+                    *server, partial(event_cb, feed), spool=spool
+                )
+                attached[section] = (collector.endpoint, server)
+                if spool:
+                    spools[section] = spool
+
+        async def reload():
+            async with reload_lock:
+                await load_config()
+
+        await reload()
+        # servers can be added/removed without restart, kill -HUP <pid>
+        asyncio.get_event_loop().add_signal_handler(
+            signal.SIGHUP, lambda: asyncio.ensure_future(reload())
+        )
+        await asyncio.gather(
+            manager.run(), report_metrics(manager), sync_spools(spools)
+        )
 
     asyncio.run(main())
 
@@ -125,12 +222,16 @@ def status():
 @cli.command(name="process-q3-log")
 @click.argument('file_path')
 @click.argument('mod')
-def process_q3_log(file_path, mod):
+@click.option(
+    '--workers', type=int, default=None,
+    help="Parse and analyze games using given number of processes",
+)
+def process_q3_log(file_path, mod, workers):
     ctx = context.SystemContext()
     sdk = QSSdk(ctx)
 
     with open(file_path) as fh:
-        sdk.process_q3_log(fh.read(), mod)
+        sdk.process_q3_log_lines(fh, mod, workers)
 
 
 @cli.command('list-matches')
@@ -155,6 +256,29 @@ def delete_match(match_guid):
     ctx = context.SystemContext()
     sdk = QSSdk(ctx)
     sdk.delete_match(match_guid)
+    clear_disk_cache(ctx.config.get("RESPONSE_CACHE_DIR"))
+
+
+@cli.command(name="ensure-indexes")
+def ensure_indexes():
+    ctx = context.SystemContext()
+    for name in ctx.ds.ensure_indexes():
+        print(f"Created index {name}")
+
+    for collection_name, query in ctx.ds.get_collection_scans():
+        print(f"Collection scan: {collection_name} {query}")
+
+
+@cli.command(name="migrate-db")
+def migrate_db():
+    """
+    Backfill data missing in databases created by older versions,
+    run once after upgrade
+    """
+    ctx = context.SystemContext()
+    for name in ctx.ds.migrate():
+        print(f"Migrated {name}")
+    clear_disk_cache(ctx.config.get("RESPONSE_CACHE_DIR"))
 
 
 def main(args=None):
@@ -5,48 +5,84 @@ QL zmq event collector
 import asyncio
 import logging
 import time
+from concurrent.futures import (
+    Executor,
+)
+from typing import (
+    Dict,
+    Hashable,
+    List,
+    Optional,
+)
 
 import zmq
 import zmq.asyncio
 
+from quakestats.core.qlparser.raw import (
+    RECV_TIMESTAMP,
+    RawQLEvent,
+)
+from quakestats.core.qlparser.spool import (
+    QLEventSpool,
+)
+
 logger = logging.getLogger(__name__)
 ctx = zmq.asyncio.Context()
 
 
 class QLStatCollector():
+    """
+    Connection to single QL server, events are received by QLCollectorManager.
+    Received events are put into bounded queue and processed by
+    :on_event_cb in :executor (default loop executor), so slow processing
+    (e.g. analysis of finished match) doesn't block other collectors.
+    Events of single collector are processed one by one, in order.
+    In :raw mode events are received without copying and decoding,
+    see RawQLEvent. Received events are recorded in :spool before queueing.
+    """
 
-    def __init__(self, host: str, port: str, password: str):
+    def __init__(
+        self, host: str, port: str, password: str,
+        queue_size: int = 10000, executor: Optional[Executor] = None,
+        raw: bool = False, spool: Optional[QLEventSpool] = None,
+    ):
         self.host = host
         self.port = port
         self.password = password
         self.endpoint = f"tcp://{self.host}:{self.port}"
         self.socket = None
-        self.reader: asyncio.Task = None
+        self.consumer: asyncio.Task = None
         self.last_event_timestamp = None
+        self.queue_size = queue_size
+        self.queue: asyncio.Queue = None
+        self.executor = executor
+        self.raw = raw
+        self.spool = spool
 
-    async def refresh_idle(self, on_event_cb: callable):
-        """
-        There is a bug in QL server side, PUB socket stops sending events after long idle time.
-        To overcome this issue the socket has to be reconnected when no data was received for 15mins.
-        According to qlstats:
-        https://github.com/PredatH0r/XonStat/tree/master/feeder#connecting-to-quake-live-game-zmq
-        """
-        while True:
-            await asyncio.sleep(60)
-            if (time.time() - self.last_event_timestamp) > 60 * 15:
-                logger.debug("Socked idle, restarting")
-                self.reader.cancel()
-                self.socket.close()
-                self.reader = asyncio.create_task(self.read_loop(on_event_cb))
-
-    async def start(self, on_event_cb: callable):
-        self.reader = asyncio.create_task(self.read_loop(on_event_cb))
-        return await asyncio.create_task(self.refresh_idle(on_event_cb))
-
-    async def read_loop(self, on_event_cb: callable):
+        # metrics
+        self.processed = 0
+        self.errors = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    def metrics(self) -> dict:
         """
-        def on_event_cb(timestamp, event)
+        lag - seconds between receiving and processing of last event
         """
+        return {
+            "endpoint": self.endpoint,
+            "queue_depth": self.queue_depth,
+            "processed": self.processed,
+            "errors": self.errors,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+        }
+
+    def connect(self) -> zmq.asyncio.Socket:
         logger.info("Establishing connection to %s", self.endpoint)
         self.socket = ctx.socket(zmq.SUB)
         self.socket.setsockopt_string(zmq.SUBSCRIBE, '')
@@ -54,14 +90,245 @@ class QLStatCollector():
         self.socket.setsockopt_string(zmq.PLAIN_PASSWORD, self.password)
         self.socket.setsockopt(zmq.RECONNECT_IVL, 60000)
         self.socket.connect(self.endpoint)
+        return self.socket
+
+    async def recv_event(self, flags: int = 0) -> dict:
+        if self.raw:
+            frame = await self.socket.recv(flags, copy=False)
+            return RawQLEvent(frame.buffer)
+        return await self.socket.recv_json(flags)
 
-        timestamp = time.time()
+    async def consume_loop(self, on_event_cb: callable):
+        """
+        def on_event_cb(timestamp, event)
+        """
+        loop = asyncio.get_event_loop()
         while True:
-            self.last_event_timestamp = timestamp
-            data = await self.socket.recv_json()
-            timestamp = time.time()
+            timestamp, data = await self.queue.get()
+            self.lag = time.time() - timestamp
+            self.max_lag = max(self.max_lag, self.lag)
+            future = loop.run_in_executor(
+                self.executor, on_event_cb, timestamp, data
+            )
             try:
-                on_event_cb(timestamp, data)
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # running callback can't be interrupted, stop after it finishes
+                await asyncio.wait([future])
+                raise
             except Exception as e:
+                self.errors += 1
                 logger.error("Error processing %s", self.endpoint)
                 logger.exception(e)
+            finally:
+                self.processed += 1
+                self.queue.task_done()
+
+
+class TimerWheel():
+    """
+    Hashed timer wheel with :tick resolution.
+    Scheduling and cancelling is O(1), deadlines further than
+    the wheel span are clamped to its end (callers re-check expired keys).
+    """
+
+    def __init__(self, tick: float, size: int, now: float):
+        self.tick = tick
+        self.slots = [set() for _ in range(size)]
+        self.current = int(now // tick)
+        # key -> tick number
+        self.entries: Dict[Hashable, int] = {}
+
+    def schedule(self, key: Hashable, deadline: float):
+        self.cancel(key)
+        tick_no = int(deadline // self.tick)
+        tick_no = max(tick_no, self.current + 1)
+        tick_no = min(tick_no, self.current + len(self.slots) - 1)
+        self.slots[tick_no % len(self.slots)].add(key)
+        self.entries[key] = tick_no
+
+    def cancel(self, key: Hashable):
+        tick_no = self.entries.pop(key, None)
+        if tick_no is not None:
+            self.slots[tick_no % len(self.slots)].discard(key)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """
+        Move wheel to :now, returns expired keys
+        """
+        target = int(now // self.tick)
+        # whole wheel is expired when it wasn't advanced for a long time
+        start = max(self.current, target - len(self.slots))
+        expired = []
+        for tick_no in range(start + 1, target + 1):
+            slot = self.slots[tick_no % len(self.slots)]
+            expired.extend(slot)
+            for key in slot:
+                del self.entries[key]
+            slot.clear()
+
+        self.current = max(self.current, target)
+        return expired
+
+
+class QLCollectorManager():
+    """
+    Receives events of many QL servers using single poller.
+    There is a bug in QL server side, PUB socket stops sending events after long idle time.
+    To overcome this issue the socket has to be reconnected when no data was received for 15mins.
+    According to qlstats:
+    https://github.com/PredatH0r/XonStat/tree/master/feeder#connecting-to-quake-live-game-zmq
+    Idle sockets are reconnected using shared timer wheel,
+    at most :max_reconnects per :tick to avoid reconnecting all servers at once.
+    Events are queued and processed by QLStatCollector consumers.
+    """
+    IDLE_TIMEOUT = 60 * 15
+
+    def __init__(
+        self, tick: float = 5, max_reconnects: int = 5,
+        executor: Optional[Executor] = None, raw: bool = False,
+    ):
+        self.tick = tick
+        self.raw = raw
+        self.max_reconnects = max_reconnects
+        self.executor = executor
+        self.poller = zmq.asyncio.Poller()
+        self.wheel = TimerWheel(
+            tick, int(self.IDLE_TIMEOUT // tick) + 2, time.time()
+        )
+        self.collectors: Dict[str, QLStatCollector] = {}
+        self.sockets: Dict[zmq.asyncio.Socket, QLStatCollector] = {}
+        # sockets paused because of full queue
+        self.paused = set()
+        # sockets are closed between polls,
+        # closing a socket cancels pending poll
+        self.closing = []
+
+    def add_server(
+        self, host: str, port: str, password: str, on_event_cb: callable,
+        spool: Optional[QLEventSpool] = None,
+    ) -> QLStatCollector:
+        """
+        def on_event_cb(timestamp, event)
+        Has to be called with running event loop
+        """
+        collector = QLStatCollector(
+            host, port, password, executor=self.executor, raw=self.raw,
+            spool=spool,
+        )
+        if collector.endpoint in self.collectors:
+            raise ValueError(f"Server {collector.endpoint} already added")
+
+        collector.queue = asyncio.Queue(collector.queue_size)
+        collector.consumer = asyncio.create_task(collector.consume_loop(on_event_cb))
+        collector.last_event_timestamp = time.time()
+        self.collectors[collector.endpoint] = collector
+        self.register(collector)
+        return collector
+
+    async def remove_server(self, endpoint: str):
+        """
+        Queued events are dropped (they are kept in spool if any),
+        returns when event being processed is finished
+        """
+        collector = self.collectors.pop(endpoint)
+        logger.info("Detaching %s", endpoint)
+        self.unregister(collector)
+        self.wheel.cancel(endpoint)
+        collector.consumer.cancel()
+        await asyncio.wait([collector.consumer])
+
+    def register(self, collector: QLStatCollector):
+        socket = collector.connect()
+        self.sockets[socket] = collector
+        self.poller.register(socket, zmq.POLLIN)
+        self.wheel.schedule(
+            collector.endpoint, collector.last_event_timestamp + self.IDLE_TIMEOUT
+        )
+
+    def unregister(self, collector: QLStatCollector):
+        socket = collector.socket
+        del self.sockets[socket]
+        if socket in self.paused:
+            self.paused.discard(socket)
+        else:
+            self.poller.unregister(socket)
+        self.closing.append(socket)
+
+    def metrics(self) -> List[dict]:
+        return [collector.metrics() for collector in self.collectors.values()]
+
+    async def run(self):
+        while True:
+            self.update_paused()
+            events = await self.poller.poll(self.tick * 1000)
+            while self.closing:
+                self.closing.pop().close(linger=0)
+
+            now = time.time()
+            for socket, _ in events:
+                await self.receive(socket, now)
+
+            self.reconnect_idle(now)
+
+    def update_paused(self):
+        """
+        Sockets of full queues are not polled until the queue is drained,
+        messages are buffered by zmq meanwhile
+        """
+        for socket, collector in self.sockets.items():
+            full = collector.queue.full()
+            if full and socket not in self.paused:
+                logger.warning("Queue of %s is full, receiving paused", collector.endpoint)
+                self.poller.unregister(socket)
+                self.paused.add(socket)
+            elif not full and socket in self.paused:
+                self.poller.register(socket, zmq.POLLIN)
+                self.paused.discard(socket)
+
+    async def receive(self, socket: zmq.asyncio.Socket, now: float):
+        collector = self.sockets.get(socket)
+        if collector is None:
+            # removed meanwhile
+            return
+
+        while not collector.queue.full():
+            try:
+                data = await collector.recv_event(zmq.NOBLOCK)
+                if collector.spool:
+                    # recorded on receipt so queued events survive restart,
+                    # fsync is left to sync_if_due
+                    data[RECV_TIMESTAMP] = now
+                    collector.spool.append(data, sync=False)
+            except zmq.Again:
+                break
+            except ValueError as e:
+                # not json/utf-8, only the frame is dropped
+                collector.last_event_timestamp = now
+                collector.errors += 1
+                logger.warning("Dropping malformed event from %s, %s", collector.endpoint, e)
+                continue
+
+            # spurious POLLIN doesn't postpone idle reconnect
+            collector.last_event_timestamp = now
+            collector.queue.put_nowait((now, data))
+
+    def reconnect_idle(self, now: float):
+        budget = self.max_reconnects
+        for endpoint in self.wheel.advance(now):
+            collector = self.collectors[endpoint]
+            deadline = collector.last_event_timestamp + self.IDLE_TIMEOUT
+            if collector.socket in self.paused:
+                # not idle, just not received because of full queue
+                self.wheel.schedule(endpoint, now + self.IDLE_TIMEOUT)
+            elif deadline > now:
+                self.wheel.schedule(endpoint, deadline)
+            elif budget > 0:
+                budget -= 1
+                logger.debug("Socket of %s idle, restarting", endpoint)
+                self.unregister(collector)
+                collector.last_event_timestamp = now
+                self.register(collector)
+            else:
+                # postpone to next tick
+                self.wheel.schedule(endpoint, now + self.tick)
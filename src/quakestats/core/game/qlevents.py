@@ -1,5 +1,5 @@
-from copy import (
-    deepcopy,
+from typing import (
+    Callable,
 )
 
 from quakestats.core.q3toql import (
@@ -15,16 +15,54 @@ def __register(ql_event_cls):
     return ql_event_cls
 
 
+def compile_template(template) -> Callable:
+    """
+    Build factory producing fresh copies of given payload template.
+    Only dicts and lists are copied, scalars are shared.
+    Flat containers are copied with a single C level call,
+    which is a lot cheaper than deepcopy for every emitted event.
+    """
+    if isinstance(template, dict):
+        nested = {
+            key: compile_template(value)
+            for key, value in template.items()
+            if isinstance(value, (dict, list))
+        }
+        if not nested:
+            return template.copy
+
+        def make_dict():
+            obj = template.copy()
+            for key, factory in nested.items():
+                obj[key] = factory()
+            return obj
+        return make_dict
+
+    elif isinstance(template, list):
+        if not any(isinstance(value, (dict, list)) for value in template):
+            return template.copy
+
+        factories = [compile_template(value) for value in template]
+        return lambda: [factory() for factory in factories]
+
+    return lambda: template
+
+
 class QLEvent(dict):
     name = None
     payload = {}
+    _make_payload = staticmethod(dict)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._make_payload = staticmethod(compile_template(cls.payload))
 
     def __init__(self):
         self['TYPE'] = self.name
         self['DATA'] = {}
 
     def initialize(self, time: int, match_guid: str, warmup: bool = False):
-        self['DATA'] = deepcopy(self.payload)
+        self['DATA'] = self._make_payload()
         self['DATA'].update({
             'TIME': time,
             'WARMUP': warmup,
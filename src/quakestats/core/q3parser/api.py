@@ -7,11 +7,13 @@ from datetime import (
     datetime,
 )
 from typing import (
+    Iterable,
     Iterator,
     List,
 )
 
 from .parser import (
+    GameLogParser,
     GameLogParserBaseQ3,
     GameLogParserEdawn,
     GameLogParserOsp,
@@ -31,16 +33,24 @@ class Q3ParserAPI():
         for game in splitter.iter_games(raw_data):
             yield game
 
-    def parse_game_log(self, game_log: Q3GameLog) -> Q3Game:
+    def split_games_from_lines(self, lines: Iterable[str], mod_hint: str) -> Iterator[Q3GameLog]:
+        splitter = GameLogSplitter(mod_hint)
+        for game in splitter.iter_games_from_lines(lines):
+            yield game
 
-        if game_log.mod == 'edawn':
+    def create_parser(self, mod: str) -> GameLogParser:
+        if mod == 'edawn':
             parser = GameLogParserEdawn()
-        elif game_log.mod == 'osp':
+        elif mod == 'osp':
             parser = GameLogParserOsp()
-        elif game_log.mod == 'baseq3':
+        elif mod == 'baseq3':
             parser = GameLogParserBaseQ3()
         else:
-            raise Exception(f"Unsupported mod {game_log.mod}")
+            raise Exception(f"Unsupported mod {mod}")
+        return parser
+
+    def parse_game_log(self, game_log: Q3GameLog) -> Q3Game:
+        parser = self.create_parser(game_log.mod)
         return parser.parse(game_log)
 
     def load_game_log(self, data: List[str], identifier: str, create_date: datetime) -> Q3Game:
@@ -18,12 +18,23 @@ RawEvent = namedtuple(
 
 
 class Q3GameEvent():
+    """
+    Base class for parsed events, large logs produce tens of thousands
+    of events so all of them use __slots__ to keep memory footprint low
+    """
+    __slots__ = ('time',)
+
     def __init__(self, ev_time: int):
         assert ev_time >= 0
         self.time = ev_time
 
 
 class Q3EVInitGame(Q3GameEvent):
+    __slots__ = (
+        'hostname', 'gametype', 'mapname', 'fraglimit',
+        'timelimit', 'capturelimit', 'modname',
+    )
+
     def __init__(
         self, ev_time: int,
         hostname: str, gametype: str, mapname: str,
@@ -43,6 +54,8 @@ class Q3EVInitGame(Q3GameEvent):
 
 
 class Q3EVUpdateClient(Q3GameEvent):
+    __slots__ = ('client_id', 'name', 'team')
+
     def __init__(
         self, ev_time: int, client_id: int, name: str, team: str
     ):
@@ -56,6 +69,8 @@ class Q3EVUpdateClient(Q3GameEvent):
 
 
 class Q3EVPlayerStats(Q3GameEvent):
+    __slots__ = ('client_id', 'weapons', 'pickups', 'damage')
+
     WeaponStat = namedtuple('WeaponStat', ['shots', 'hits'])
     DamageStat = namedtuple('DamageStat', ['given', 'received'])
     PickupStats = namedtuple('PickupStats', ['health', 'armor'])
@@ -81,6 +96,8 @@ class Q3EVPlayerStats(Q3GameEvent):
 
 
 class Q3EVPlayerKill(Q3GameEvent):
+    __slots__ = ('client_id', 'victim_id', 'reason')
+
     def __init__(
         self, ev_time: int, client_id: int, victim_id: int, reason: str
     ):
@@ -91,24 +108,32 @@ class Q3EVPlayerKill(Q3GameEvent):
 
 
 class Q3EVClientDisconnect(Q3GameEvent):
+    __slots__ = ('client_id',)
+
     def __init__(self, ev_time: int, client_id: int):
         super().__init__(ev_time)
         self.client_id = client_id
 
 
 class Q3EventExit(Q3GameEvent):
+    __slots__ = ('reason',)
+
     def __init__(self, ev_time: int, reason: str):
         super().__init__(ev_time)
         self.reason = reason
 
 
 class Q3EVServerTime(Q3GameEvent):
+    __slots__ = ('dt',)
+
     def __init__(self, ev_time: int, dt: datetime):
         super().__init__(ev_time)
         self.dt = dt
 
 
 class Q3EVItem(Q3GameEvent):
+    __slots__ = ('client_id', 'item_name')
+
     def __init__(self, ev_time: int, client_id: int, item_name: str):
         super().__init__(ev_time)
         self.client_id = client_id
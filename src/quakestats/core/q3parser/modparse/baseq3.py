@@ -6,6 +6,12 @@ from quakestats.core.q3parser import (
 
 RawEvent = events.RawEvent
 
+USER_INFO_RE = re.compile(r'^(\d+) (.*)$')
+KILL_RE = re.compile(r"(\d+) (\d+) (\d+): .* by (\w+)")
+CLIENT_ID_RE = re.compile(r"(\d+)")
+EXIT_RE = re.compile(r"(.*)")
+ITEM_RE = re.compile(r"(\d+) (\w+)")
+
 
 class BaseQ3ParserMixin():
     GAMETYPE_MAP = {
@@ -49,7 +55,7 @@ class BaseQ3ParserMixin():
         4 n\n0npax\t\0\model\sarge\hmodel\sarge
         \c1\1\c2\5\hc\100\w\0\l\0\rt\0\st\0
         """  # noqa
-        match = re.match(r'^(\d+) (.*)$', ev.payload)
+        match = USER_INFO_RE.match(ev.payload)
         client_id, user_info = match.groups()
         client_id = int(client_id)
         user_data = user_info.split("\\")
@@ -64,7 +70,7 @@ class BaseQ3ParserMixin():
         return result
 
     def parse_kill(self, raw_event: RawEvent) -> events.Q3EVPlayerKill:
-        match = re.search(r"(\d+) (\d+) (\d+): .* by (\w+)", raw_event.payload)
+        match = KILL_RE.search(raw_event.payload)
         killer_id, victim_id, weapon_id, reason = match.groups()
         return events.Q3EVPlayerKill(
             raw_event.time, int(killer_id), int(victim_id), reason
@@ -73,12 +79,12 @@ class BaseQ3ParserMixin():
     def parse_client_disconnect(
         self, raw_event: RawEvent
     ) -> events.Q3EVClientDisconnect:
-        match = re.search(r"(\d+)", raw_event.payload)
+        match = CLIENT_ID_RE.search(raw_event.payload)
         client_id = int(match.groups()[0])
         return events.Q3EVClientDisconnect(raw_event.time, client_id)
 
     def parse_exit(self, raw_event: RawEvent) -> events.Q3EventExit:
-        match = re.search(r"(.*)", raw_event.payload)
+        match = EXIT_RE.search(raw_event.payload)
         reason = match.groups()[0]
         return events.Q3EventExit(raw_event.time, reason)
 
@@ -86,6 +92,6 @@ class BaseQ3ParserMixin():
         """
         3 item_quad
         """
-        match = re.search(r"(\d+) (\w+)", raw_event.payload)
+        match = ITEM_RE.search(raw_event.payload)
         client_id, item_name = match.groups()
         return events.Q3EVItem(raw_event.time, int(client_id), item_name)
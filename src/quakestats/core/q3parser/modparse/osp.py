@@ -9,6 +9,11 @@ from quakestats.core.q3parser import (
 
 RawEvent = events.RawEvent
 
+CLIENT_ID_RE = re.compile(r'^\d+')
+WEAPON_STAT_RE = re.compile(r'([a-zA-Z\.]+):(\d+):(\d+):(\d+):(\d+)')
+# given received armor health
+GRAH_STAT_RE = re.compile(r'([a-zA-Z\.]+):(\d+)')
+
 
 class OspParserMixin():
     STAT_WEAPON_MAP = {
@@ -31,10 +36,9 @@ class OspParserMixin():
             2 MachineGun:1367:267:0:0 Shotgun:473:107:23:8 G.Launcher:8:1:8:3 R.Launcher:30:11:9:5 LightningGun:403:68:15:10 Plasmagun:326:45:13:8 Given:5252 Recvd:7836 Armor:620 Health:545
         """  # noqa
         payload = ev.payload
-        client_id = int(re.search(r'^\d+', payload).group())
-        weapons = re.findall(r'([a-zA-Z\.]+):(\d+):(\d+):(\d+):(\d+)', payload)
-        # given received armor health
-        grah = re.findall(r'([a-zA-Z\.]+):(\d+)', payload)
+        client_id = int(CLIENT_ID_RE.search(payload).group())
+        weapons = WEAPON_STAT_RE.findall(payload)
+        grah = GRAH_STAT_RE.findall(payload)
 
         event = events.Q3EVPlayerStats(ev.time, client_id)
         for weapon_name, shot, hit, pick, drop in weapons:
@@ -5,6 +5,7 @@ from datetime import (
     timedelta,
 )
 from typing import (
+    Dict,
     List,
 )
 
@@ -57,9 +58,27 @@ class GameLogParser():
     - [x] OSP
     - [x] edawn
     - [ ] CPMA - it's probably the same as baseq3, need to check
+
+    Subclasses describe the log line format with `event_format`
+    (time, event name, payload groups) and map event names to
+    parse methods with `event_handlers`. Both are resolved once,
+    lines are then tokenized with a single precompiled regex and
+    dispatched with a dict lookup.
     """
+    event_format: str = None
+    event_handlers: Dict[str, str] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._event_re = (
+            re.compile(cls.event_format) if cls.event_format else None
+        )
+
     def __init__(self):
-        pass
+        self._dispatch = {
+            name: getattr(self, handler)
+            for name, handler in self.event_handlers.items()
+        }
 
     def parse(self, game_log: Q3GameLog) -> Q3Game:
         assert not game_log.is_empty
@@ -81,7 +100,32 @@ class GameLogParser():
         self.populate_dates(game)
         return game
 
-    def parse_line(self, line: str) -> events.RawEvent:
+    def parse_line(self, line: str) -> events.Q3GameEvent:
+        raw_event = self.line_to_raw_event(line)
+        return self.parse_event(raw_event)
+
+    def line_to_raw_event(self, line: str) -> events.RawEvent:
+        match = self._event_re.search(line)
+        if not match:
+            raise Exception(f"Malformed line, {line}")
+
+        ev_time, ev_name, ev_payload = match.groups()
+        ev_payload = ev_payload.strip()
+        return events.RawEvent(
+            self.mktime(ev_time), ev_name,
+            ev_payload if ev_payload else None
+        )
+
+    def parse_event(self, raw_event: events.RawEvent) -> events.Q3GameEvent:
+        try:
+            handler = self._dispatch[raw_event.name]
+        except KeyError:
+            # not supported event
+            return None
+
+        return handler(raw_event)
+
+    def mktime(self, event_time: str) -> int:
         raise NotImplementedError()
 
     def populate_dates(self, game: Q3Game) -> Q3Game:
@@ -96,29 +140,19 @@ class GameLogParser():
 
 class GameLogParserBaseQ3(GameLogParser, BaseQ3ParserMixin):
     event_format = r" *(\d+\:\d+) (.+?):(.*)"
+    event_handlers = {
+        'InitGame': 'parse_init_game',
+        'ClientUserinfoChanged': 'parse_user_info',
+        'Kill': 'parse_kill',
+        'ClientDisconnect': 'parse_client_disconnect',
+        'Exit': 'parse_exit',
+        'Item': 'parse_item',
+    }
 
     def __init__(self):
         # time of game init event
         super().__init__()
 
-    def parse_line(self, line: str):
-        raw_event = self.line_to_raw_event(line)
-        event = self.parse_event(raw_event)
-        return event
-
-    def line_to_raw_event(self, line: str) -> events.RawEvent:
-        match = re.search(self.event_format, line)
-        if match:
-            ev_time = match.group(1)
-            ev_name = match.group(2)
-            ev_payload = match.group(3).strip()
-            return events.RawEvent(
-                self.mktime(ev_time), ev_name,
-                ev_payload if ev_payload else None
-            )
-        else:
-            raise Exception(f"Malformed line, {line}")
-
     def populate_dates(self, game: Q3Game) -> Q3Game:
         init_ev: events.Q3EVInitGame = None
         exit_ev: events.Q3EventExit = None
@@ -142,46 +176,24 @@ class GameLogParserBaseQ3(GameLogParser, BaseQ3ParserMixin):
         minutes, seconds = event_time.split(':')
         return int(minutes) * 60 * 1000 + int(seconds) * 1000
 
-    def parse_event(self, raw_event: events.RawEvent) -> events.Q3GameEvent:
-        if raw_event.name == 'InitGame':
-            return self.parse_init_game(raw_event)
-        elif raw_event.name == 'ClientUserinfoChanged':
-            return self.parse_user_info(raw_event)
-        elif raw_event.name == 'Kill':
-            return self.parse_kill(raw_event)
-        elif raw_event.name == 'ClientDisconnect':
-            return self.parse_client_disconnect(raw_event)
-        elif raw_event.name == 'Exit':
-            return self.parse_exit(raw_event)
-        elif raw_event.name == 'Item':
-            return self.parse_item(raw_event)
-
 
 class GameLogParserOsp(GameLogParser, BaseQ3ParserMixin, OspParserMixin):
     event_format = r"^(\d+\.\d+) (.+?):(.*)"
+    event_handlers = {
+        'InitGame': 'parse_init_game',
+        'ClientUserinfoChanged': 'parse_user_info',
+        'Weapon_Stats': 'parse_weapon_stat',
+        'Kill': 'parse_kill',
+        'ClientDisconnect': 'parse_client_disconnect',
+        'Exit': 'parse_exit',
+        'ServerTime': 'parse_server_time',
+        'Item': 'parse_item',
+    }
 
     def __init__(self):
         # time of game init event
         super().__init__()
 
-    def parse_line(self, line: str):
-        raw_event = self.line_to_raw_event(line)
-        event = self.parse_event(raw_event)
-        return event
-
-    def line_to_raw_event(self, line: str) -> events.RawEvent:
-        match = re.search(self.event_format, line)
-        if match:
-            ev_time = match.group(1)
-            ev_name = match.group(2)
-            ev_payload = match.group(3).strip()
-            return events.RawEvent(
-                self.mktime(ev_time), ev_name,
-                ev_payload if ev_payload else None
-            )
-        else:
-            raise Exception(f"Malformed line, {line}")
-
     def populate_dates(self, game: Q3Game) -> Q3Game:
         init_ev: events.Q3EVInitGame = None
         exit_ev: events.Q3EventExit = None
@@ -209,24 +221,6 @@ class GameLogParserOsp(GameLogParser, BaseQ3ParserMixin, OspParserMixin):
         seconds, tenths = event_time.split('.')
         return int(seconds) * 1000 + int(tenths) * 100
 
-    def parse_event(self, raw_event: events.RawEvent) -> events.Q3GameEvent:
-        if raw_event.name == 'InitGame':
-            return self.parse_init_game(raw_event)
-        elif raw_event.name == 'ClientUserinfoChanged':
-            return self.parse_user_info(raw_event)
-        elif raw_event.name == 'Weapon_Stats':
-            return self.parse_weapon_stat(raw_event)
-        elif raw_event.name == 'Kill':
-            return self.parse_kill(raw_event)
-        elif raw_event.name == 'ClientDisconnect':
-            return self.parse_client_disconnect(raw_event)
-        elif raw_event.name == 'Exit':
-            return self.parse_exit(raw_event)
-        elif raw_event.name == 'ServerTime':
-            return self.parse_server_time(raw_event)
-        elif raw_event.name == 'Item':
-            return self.parse_item(raw_event)
-
 
 class GameLogParserEdawn(GameLogParser, BaseQ3ParserMixin, EdawnParserMixin):
     """
@@ -234,29 +228,22 @@ class GameLogParserEdawn(GameLogParser, BaseQ3ParserMixin, EdawnParserMixin):
     Enchanced logging (higher granularity) is planned for 1.6.3
     """
     event_format = r"^\s+(\d+:\d+\.\d+) (.+?):(.*)"
+    event_handlers = {
+        'InitGame': 'parse_init_game',
+        'ClientUserinfoChanged': 'parse_user_info',
+        'Weapon_Stats': 'parse_weapon_stat',
+        'Kill': 'parse_kill',
+        'ClientDisconnect': 'parse_client_disconnect',
+        'Exit': 'parse_exit',
+        'ServerTime': 'parse_server_time',
+        'Item': 'parse_item',
+    }
     time_format = r"(\d+):(\d+)\.(\d+)"
+    _time_re = re.compile(time_format)
 
     def __init__(self):
         super().__init__()
 
-    def parse_line(self, line: str):
-        raw_event = self.line_to_raw_event(line)
-        event = self.parse_event(raw_event)
-        return event
-
-    def line_to_raw_event(self, line: str) -> events.RawEvent:
-        match = re.search(self.event_format, line)
-        if match:
-            ev_time = match.group(1)
-            ev_name = match.group(2)
-            ev_payload = match.group(3).strip()
-            return events.RawEvent(
-                self.mktime(ev_time), ev_name,
-                ev_payload if ev_payload else None
-            )
-        else:
-            raise Exception(f"Malformed line, {line}")
-
     def populate_dates(self, game: Q3Game) -> Q3Game:
         init_ev: events.Q3EVInitGame = None
         exit_ev: events.Q3EventExit = None
@@ -280,25 +267,7 @@ class GameLogParserEdawn(GameLogParser, BaseQ3ParserMixin, EdawnParserMixin):
 
         return game
 
-    def parse_event(self, raw_event: events.RawEvent) -> events.Q3GameEvent:
-        if raw_event.name == 'InitGame':
-            return self.parse_init_game(raw_event)
-        elif raw_event.name == 'ClientUserinfoChanged':
-            return self.parse_user_info(raw_event)
-        elif raw_event.name == 'Weapon_Stats':
-            return self.parse_weapon_stat(raw_event)
-        elif raw_event.name == 'Kill':
-            return self.parse_kill(raw_event)
-        elif raw_event.name == 'ClientDisconnect':
-            return self.parse_client_disconnect(raw_event)
-        elif raw_event.name == 'Exit':
-            return self.parse_exit(raw_event)
-        elif raw_event.name == 'ServerTime':
-            return self.parse_server_time(raw_event)
-        elif raw_event.name == 'Item':
-            return self.parse_item(raw_event)
-
     @classmethod
     def mktime(cls, event_time: str) -> int:
-        minutes, seconds, tenths = re.search(cls.time_format, event_time).groups()
+        minutes, seconds, tenths = cls._time_re.search(event_time).groups()
         return int(minutes) * 60 * 1000 + int(seconds) * 1000 + int(tenths) * 100
@@ -6,8 +6,11 @@ from datetime import (
     timezone,
 )
 from typing import (
+    Iterable,
     Iterator,
     List,
+    Optional,
+    Union,
 )
 
 from quakestats.core.game.gamelog import (
@@ -26,11 +29,35 @@ class Q3GameLog(RawGameLog):
         self.mod = mod
         self.received: datetime = received
         self.__checksum: str = None
-
-    def add_line(self, line: str):
+        # MD5 of lines is updated as lines are added
+        # None when lines were set directly (deserialize)
+        self.__digest = hashlib.md5()
+
+    def add_line(self, line: str, encoded: Optional[bytes] = None):
+        """
+        :encoded - utf-8 encoded line if already at hand,
+            spares encoding it again for the checksum
+        """
+        if self.__digest is None:
+            self.__digest = self.__digest_lines()
+
+        self.__digest.update(line.encode() if encoded is None else encoded)
         self.__checksum = None
         self.lines.append(line)
 
+    def __getstate__(self):
+        # hash objects can't be pickled, keep computed checksum instead
+        state = self.__dict__.copy()
+        state["_Q3GameLog__checksum"] = self.checksum
+        state["_Q3GameLog__digest"] = None
+        return state
+
+    def __digest_lines(self):
+        digest = hashlib.md5()
+        for line in self.lines:
+            digest.update(line.encode())
+        return digest
+
     def serialize(self) -> str:
         assert self.mod
         assert self.received
@@ -57,6 +84,7 @@ class Q3GameLog(RawGameLog):
             obj.lines = data
 
         obj.__checksum = recv_identifier
+        obj.__digest = None
         return obj
 
     @property
@@ -64,11 +92,10 @@ class Q3GameLog(RawGameLog):
         if self.__checksum:
             return self.__checksum
 
-        checksum = hashlib.md5()
-        for line in self.lines:
-            checksum.update(line.encode())
+        if self.__digest is None:
+            self.__digest = self.__digest_lines()
 
-        self.__checksum = checksum.hexdigest()
+        self.__checksum = self.__digest.hexdigest()
         return self.__checksum
 
     @property
@@ -92,8 +119,27 @@ class GameLogSplitter():
         self.mod = mod
 
     def iter_games(self, raw_data: str) -> Iterator[Q3GameLog]:
+        return self.iter_games_from_lines(raw_data.splitlines())
+
+    def iter_games_from_lines(
+        self, lines: Iterable[Union[str, bytes]]
+    ) -> Iterator[Q3GameLog]:
+        """
+        Streaming variant of iter_games, accepts any iterable of lines
+        (e.g. file object, gzip stream) and yields each game as soon
+        as its separator is reached so the whole log is never kept in memory.
+        Trailing line endings are stripped, bytes are decoded as utf-8.
+        """
         current_game = Q3GameLog(datetime.now(), self.mod)
-        for line in raw_data.splitlines():
+        for line in lines:
+            if isinstance(line, bytes):
+                # utf-8 bytes are hashed as they are
+                encoded = line.rstrip(b"\r\n")
+                line = encoded.decode("utf-8")
+            else:
+                encoded = None
+                line = line.rstrip("\r\n")
+
             if self.is_separator(line):
                 if not current_game.is_empty:
                     yield current_game
@@ -101,7 +147,7 @@ class GameLogSplitter():
                 current_game = Q3GameLog(datetime.now(), self.mod)
                 continue
 
-            current_game.add_line(line)
+            current_game.add_line(line, encoded)
 
         if not current_game.is_empty:
             yield current_game
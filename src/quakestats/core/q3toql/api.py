@@ -4,9 +4,15 @@ Base module for Q3 game parser
 
 import logging
 
+from quakestats.core.q3parser.api import (
+    Q3ParserAPI,
+)
 from quakestats.core.q3parser.parser import (
     Q3Game,
 )
+from quakestats.core.q3parser.splitter import (
+    Q3GameLog,
+)
 from quakestats.core.q3toql.transform import (
     Q3toQL,
     QuakeGame,
@@ -19,3 +25,11 @@ class Q3toQLAPI():
     def transform(self, q3game: Q3Game) -> QuakeGame:
         tf = Q3toQL()
         return tf.transform(q3game)
+
+    def transform_game_log(self, game_log: Q3GameLog) -> QuakeGame:
+        """
+        Parse and transform raw game log in a single pass
+        """
+        parser = Q3ParserAPI().create_parser(game_log.mod)
+        tf = Q3toQL()
+        return tf.transform_lines(game_log, parser)
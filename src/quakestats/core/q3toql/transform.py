@@ -1,6 +1,9 @@
 import hashlib
 import logging
 import re
+from functools import (
+    lru_cache,
+)
 
 from quakestats.core.game import (
     qlevents,
@@ -10,11 +13,33 @@ from quakestats.core.game.base import (
 )
 from quakestats.core.q3parser import events as q3_events
 from quakestats.core.q3parser.parser import (
+    GameLogParser,
     Q3Game,
 )
+from quakestats.core.q3parser.splitter import (
+    Q3GameLog,
+)
 
 logger = logging.getLogger(__name__)
 
+IDENTITY_CACHE_SIZE = 4096
+COLOR_RE = re.compile(r"\^\d")
+
+
+@lru_cache(maxsize=IDENTITY_CACHE_SIZE)
+def resolve_identity(server_domain: str, name: str) -> str:
+    """
+    Calculate player id from raw (colored) player name.
+    Results are memoized process wide, the same few names
+    are resolved for every kill/stats/switchteam event.
+    Use resolve_identity.cache_info() for hit/miss stats.
+    """
+    raw_name = COLOR_RE.sub("", name).capitalize()
+    raw_name = "q3-{}-{}".format(server_domain, raw_name)
+    h = hashlib.sha256()
+    h.update(raw_name.encode("utf-8"))
+    return h.hexdigest()[:24]
+
 
 class ClientQ3World():
     def __init__(self):
@@ -52,13 +77,7 @@ class Client():
         """
         resolve identity
         """
-        server_domain = "Q3"
-        raw_name = re.sub(r"\^\d", "", self.name).capitalize()
-        raw_name = "q3-{}-{}".format(server_domain, raw_name)
-        h = hashlib.sha256()
-        h.update(raw_name.encode("utf-8"))
-        steam_id = h.hexdigest()[:24]
-        return steam_id
+        return resolve_identity("Q3", self.name)
 
 
 class Quake3Game(QuakeGame):
@@ -255,26 +274,100 @@ class Q3toQL():
             self.gamelog.identifier, init_game
         )
 
+        handlers = self.get_handlers()
         ev_exit = None
         for event in self.gamelog.events:
-            if isinstance(event, q3_events.Q3EVUpdateClient):
-                self.game.user_info_changed(event)
-            elif isinstance(event, q3_events.Q3EVPlayerStats):
-                self.game.weapon_stats(event)
-            elif isinstance(event, q3_events.Q3EVPlayerKill):
-                self.game.kill(event)
-            elif isinstance(event, q3_events.Q3EVClientDisconnect):
-                self.game.client_disconnect(event)
-            elif isinstance(event, q3_events.Q3EVItem):
-                self.game.item(event)
-
             # Exit event can be produced before player stats in q3
             # for compatibility with QL we will always emmit
             # MATCH_REPORT as a last event
-            elif isinstance(event, q3_events.Q3EventExit):
+            if type(event) is q3_events.Q3EventExit:
                 ev_exit = event
+                continue
+
+            self._dispatch(handlers, event)
 
         if ev_exit:
             self.game.exit(ev_exit)
 
         return self.game
+
+    def transform_lines(self, game_log: Q3GameLog, parser: GameLogParser) -> QuakeGame:
+        """
+        Fused variant of transform(parser.parse(game_log)).
+        Raw lines are parsed and transformed in a single pass,
+        parsed Q3 events are not kept. Produces the same game.
+        Player identities are still resolved lazily in get_events
+        as they depend on the final player names.
+        """
+        assert not game_log.is_empty
+        self.game = Quake3Game()
+        self.gamelog = None
+        handlers = self.get_handlers()
+
+        # game used only to determine start/finish dates with parser logic
+        dates_game = Q3Game(game_log.identifier, game_log.mod)
+        date_events = (
+            q3_events.Q3EVInitGame, q3_events.Q3EVServerTime,
+            q3_events.Q3EventExit,
+        )
+
+        # events which occured before InitGame
+        pending = []
+        init_game = None
+        ev_exit = None
+        for line in game_log.lines:
+            event = parser.parse_line(line)
+            if not event:
+                continue
+
+            event_type = type(event)
+            if event_type in date_events:
+                dates_game.add_event(event)
+
+            if event_type is q3_events.Q3EVInitGame:
+                if not init_game:
+                    init_game = event
+                    self.game.add_match_started(game_log.identifier, init_game)
+                    for pending_event in pending:
+                        self._dispatch(handlers, pending_event)
+                    pending = None
+                continue
+
+            if event_type is q3_events.Q3EventExit:
+                ev_exit = event
+                continue
+
+            if not init_game:
+                pending.append(event)
+                continue
+
+            self._dispatch(handlers, event)
+
+        if not init_game:
+            raise Exception(f"No InitGame event in {game_log.identifier}")
+
+        parser.populate_dates(dates_game)
+        self.game.metadata.start_date = dates_game.start_date
+        self.game.metadata.finish_date = dates_game.finish_date
+
+        if ev_exit:
+            self.game.exit(ev_exit)
+
+        return self.game
+
+    def get_handlers(self) -> dict:
+        return {
+            q3_events.Q3EVUpdateClient: self.game.user_info_changed,
+            q3_events.Q3EVPlayerStats: self.game.weapon_stats,
+            q3_events.Q3EVPlayerKill: self.game.kill,
+            q3_events.Q3EVClientDisconnect: self.game.client_disconnect,
+            q3_events.Q3EVItem: self.game.item,
+        }
+
+    def _dispatch(self, handlers: dict, event: q3_events.Q3GameEvent):
+        try:
+            handler = handlers[type(event)]
+        except KeyError:
+            return
+
+        handler(event)
@@ -1,18 +1,27 @@
 from typing import (
     List,
+    Optional,
 )
 
 from .splitter import (
     QLGameLog,
     QLGameLogSplitter,
 )
+from .spool import (
+    QLEventSpool,
+)
 
 
 class QLFeed():
     def __init__(self):
         self.splitter = QLGameLogSplitter()
+        # events are recorded in spool by the receiver when set
+        self.spool: Optional[QLEventSpool] = None
+        # spool sequence number following the last fed event
+        self.position = 0
 
     def feed(self, ev: dict) -> QLGameLog:
+        self.position += 1
         return self.splitter.add_event(ev)
 
 
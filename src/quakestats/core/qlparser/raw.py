@@ -0,0 +1,111 @@
+"""
+QL events kept as received (json encoded zmq frames).
+Only fields needed to split events into matches are extracted,
+full decoding is deferred until the event is accessed as a dict.
+"""
+import json
+import re
+from collections.abc import (
+    MutableMapping,
+)
+from typing import (
+    Any,
+    Optional,
+    Tuple,
+    Union,
+)
+
+TYPE_RE = re.compile(rb'"TYPE"\s*:\s*"([A-Z_]+)"')
+MATCH_GUID_RE = re.compile(rb'"MATCH_GUID"\s*:\s*"([^"]*)"')
+RECV_TIMESTAMP = "__recv_timestamp"
+
+
+class RawQLEvent(MutableMapping):
+    """
+    Behaves like decoded QL event dict
+    """
+
+    def __init__(self, data: Union[bytes, memoryview]):
+        # memoryview of zmq frame, kept without copying
+        self.data = data
+        self.recv_timestamp: Optional[float] = None
+        self._decoded: Optional[dict] = None
+
+    def header(self) -> Tuple[str, str]:
+        """
+        (TYPE, MATCH_GUID) extracted without decoding whole event
+        """
+        if self._decoded is None:
+            ev_type = TYPE_RE.search(self.data)
+            match_guid = MATCH_GUID_RE.search(self.data)
+            # escaped values need proper decoding
+            if ev_type and match_guid and b"\\" not in match_guid.group(1):
+                return ev_type.group(1).decode(), match_guid.group(1).decode()
+
+        return self.decoded["TYPE"], self.decoded["DATA"]["MATCH_GUID"]
+
+    @property
+    def decoded(self) -> dict:
+        if self._decoded is None:
+            self._decoded = json.loads(bytes(self.data))
+            if self.recv_timestamp is not None:
+                self._decoded[RECV_TIMESTAMP] = self.recv_timestamp
+        return self._decoded
+
+    def to_json(self) -> str:
+        """
+        Json encoded event, decoding is avoided if possible
+        """
+        if self._decoded is not None:
+            return json.dumps(self._decoded)
+
+        data = bytes(self.data).decode("utf-8").strip()
+        if self.recv_timestamp is None:
+            return data
+
+        # put timestamp at the beginning of encoded object
+        if not data.startswith("{"):
+            raise ValueError("Event is not json object")
+        rest = data[1:].lstrip()
+        separator = "" if rest.startswith("}") else ", "
+        return f'{{"{RECV_TIMESTAMP}": {json.dumps(self.recv_timestamp)}{separator}{rest}'
+
+    def __getitem__(self, key: str) -> Any:
+        return self.decoded[key]
+
+    def __setitem__(self, key: str, value: Any):
+        if key == RECV_TIMESTAMP:
+            self.recv_timestamp = value
+            if self._decoded is None:
+                return
+        self.decoded[key] = value
+
+    def __delitem__(self, key: str):
+        if key == RECV_TIMESTAMP:
+            if self.recv_timestamp is None:
+                raise KeyError(key)
+            self.recv_timestamp = None
+            if self._decoded is None:
+                return
+        del self.decoded[key]
+
+    def __iter__(self):
+        return iter(self.decoded)
+
+    def __len__(self) -> int:
+        return len(self.decoded)
+
+
+def event_header(event: dict) -> Tuple[str, str]:
+    """
+    (TYPE, MATCH_GUID) of decoded or raw QL event
+    """
+    if isinstance(event, RawQLEvent):
+        return event.header()
+    return event["TYPE"], event["DATA"]["MATCH_GUID"]
+
+
+def encode_event(event: dict) -> str:
+    if isinstance(event, RawQLEvent):
+        return event.to_json()
+    return json.dumps(event)
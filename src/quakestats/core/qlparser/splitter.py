@@ -12,6 +12,10 @@ from typing import (
 from quakestats.core.game.gamelog import (
     RawGameLog,
 )
+from quakestats.core.qlparser.raw import (
+    encode_event,
+    event_header,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +39,9 @@ class QLGameLog(RawGameLog):
         assert not self.is_empty
         base_header = super().serialize()
         header = f"{self.identifier} {self.received.timestamp()}"
-        return "\n".join(itertools.chain([base_header, header, json.dumps(self.events)]))
+        # raw events are not re-encoded
+        events = "[{}]".format(", ".join(encode_event(event) for event in self.events))
+        return "\n".join(itertools.chain([base_header, header, events]))
 
     @classmethod
     def deserialize(cls, data: List[str]) -> 'QLGameLog':
@@ -74,8 +80,7 @@ class QLGameLogSplitter():
         """
         Consumes ql events, produces QLGameLog when MATCH_REPORT reached
         """
-        game_id = ql_event['DATA']['MATCH_GUID']
-        event_type = ql_event['TYPE']
+        event_type, game_id = event_header(ql_event)
 
         if not self.current_game:
             logger.debug("Created new game %s", game_id)
@@ -0,0 +1,226 @@
+"""
+Write-ahead spool of live QL events.
+Events of unfinished matches are kept on disk so they can be
+replayed into a new feed after collector restart.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import (
+    Iterable,
+    Iterator,
+)
+
+from quakestats.core.qlparser.raw import (
+    encode_event,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class QLEventSpool():
+    """
+    Append-only file of json encoded events, one per line.
+    Appended events are fsynced in batches, after :batch_size events
+    or :sync_interval seconds (see also sync_if_due).
+    Events are numbered in order of arrival, see mark/discard.
+    :lock is held only for buffered writes and file swaps, fsync and
+    rewrites run outside of it so appending from event loop doesn't wait on disk.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100, sync_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self.pending = 0
+        self.last_sync = time.time()
+        self.lock = threading.Lock()
+        # rewrites (discard/reset) are serialized, appends are not blocked
+        self.rewrite_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.fh = open(path, "a", encoding="utf-8")
+        self._terminate_partial_event()
+        # sequence number of the first event in file,
+        # and the number of events in file
+        self.first = 0
+        self.count = sum(1 for _ in self.replay())
+
+    def replay(self) -> Iterator[dict]:
+        """
+        Events stored in spool, in order of arrival.
+        Partially written (last) event is skipped
+        """
+        with open(self.path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping broken event in %s", self.path)
+
+    def append(self, event: dict, sync: bool = True):
+        """
+        :sync - False when appending must not block on fsync
+            (e.g. in event loop), sync_if_due has to be called periodically
+        """
+        line = encode_event(event)
+        with self.lock:
+            self.fh.write(line)
+            self.fh.write("\n")
+            self.count += 1
+            self.pending += 1
+            due = sync and (
+                self.pending >= self.batch_size or
+                time.time() - self.last_sync >= self.sync_interval
+            )
+
+        if due:
+            self.sync()
+
+    def sync_if_due(self):
+        """
+        Sync events which wait longer than :sync_interval,
+        to be called periodically when no more events arrive
+        """
+        with self.lock:
+            due = (
+                not self.fh.closed and self.pending and
+                time.time() - self.last_sync >= self.sync_interval
+            )
+
+        if due:
+            self.sync()
+
+    def sync(self):
+        """
+        Flush appended events and fsync them, the file descriptor
+        is duplicated so the spool file can be swapped meanwhile
+        """
+        with self.lock:
+            if self.fh.closed:
+                return
+
+            self.fh.flush()
+            fd = os.dup(self.fh.fileno())
+            self.pending = 0
+            self.last_sync = time.time()
+
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def reset(self, events: Iterable[dict] = ()):
+        """
+        Replace all events with :events, e.g. when match was finished and stored.
+        Events appended while rewriting are kept after :events
+        """
+        with self.rewrite_lock:
+            with self.lock:
+                if self.fh.closed:
+                    return
+
+                self.fh.flush()
+                size = self.fh.tell()
+                count = self.count
+            self._rewrite(size, count, drop=count, head=events)
+
+    def mark(self) -> int:
+        """
+        Sequence number following the last appended event
+        """
+        with self.lock:
+            return self.first + self.count
+
+    def discard(self, mark: int):
+        """
+        Drop events appended before given :mark, later events are kept.
+        Used when events of finished match are appended meanwhile
+        """
+        with self.rewrite_lock:
+            with self.lock:
+                drop = mark - self.first
+                if drop <= 0 or self.fh.closed:
+                    return
+
+                self.fh.flush()
+                size = self.fh.tell()
+                count = self.count
+            self._rewrite(size, count, drop=drop)
+            with self.lock:
+                self.first += min(drop, count)
+
+    def _rewrite(self, size: int, count: int, drop: int, head: Iterable[dict] = ()):
+        """
+        :size bytes holding :count events are rewritten to temporary file
+        without first :drop events, prefixed by :head events.
+        Events appended meanwhile are copied under lock and the temporary
+        file replaces the spool, so the events are not lost when interrupted
+        """
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        kept = 0
+        try:
+            with open(self.path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                for event in head:
+                    dst.write(encode_event(event).encode("utf-8") + b"\n")
+                    kept += 1
+
+                skipped = 0
+                for line in src.read(size).split(b"\n"):
+                    try:
+                        json.loads(line)
+                    except ValueError:
+                        continue
+
+                    if skipped < drop:
+                        skipped += 1
+                        continue
+                    dst.write(line + b"\n")
+                    kept += 1
+                dst.flush()
+                os.fsync(dst.fileno())
+
+                with self.lock:
+                    self.fh.flush()
+                    src.seek(size)
+                    dst.write(src.read())
+                    dst.flush()
+                    os.replace(tmp_path, self.path)
+                    self.fh.close()
+                    self.fh = open(self.path, "a", encoding="utf-8")
+                    self.count = kept + self.count - count
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _terminate_partial_event(self):
+        """
+        Event partially written before crash would swallow
+        the next appended event, it's terminated to be skipped on replay
+        """
+        with open(self.path, "rb") as fh:
+            fh.seek(0, os.SEEK_END)
+            if not fh.tell():
+                return
+
+            fh.seek(-1, os.SEEK_END)
+            if fh.read(1) != b"\n":
+                self.fh.write("\n")
+                self.fh.flush()
+
+    def close(self):
+        with self.rewrite_lock, self.lock:
+            self.fh.flush()
+            os.fsync(self.fh.fileno())
+            self.pending = 0
+            self.fh.close()
@@ -2,6 +2,7 @@
 File based warehouse for raw log files/event files from quake matches
 """
 
+import hashlib
 import logging
 import os
 import typing
@@ -23,6 +24,11 @@ class WarehouseItem():
     def __repr__(self) -> str:
         return f"WarehouseItem({self.identifier}) - {self.ext} {self.create_date}"
 
+    @property
+    def checksum(self) -> str:
+        assert self.data is not None, "WH item was not read"
+        return hashlib.md5(self.data.encode()).hexdigest()
+
 
 class Warehouse():
     """
@@ -12,9 +12,15 @@ Produces Match info:
     [x] badges
     [x] kill / death info
 """
+import hashlib
+import inspect
 
 from quakestats.dataprovider.analyzer.badges import (
     Badger,
+    badger_handlers,
+)
+from quakestats.dataprovider.analyzer.columnar import (
+    ColumnarEvents,
 )
 from quakestats.dataprovider.analyzer.events import (
     Event, EventPlayerQuad
@@ -24,11 +30,33 @@ from quakestats.dataprovider.analyzer.scores import (
 )
 from quakestats.dataprovider.analyzer.specials import (
     SpecialScores,
+    special_handlers,
 )
 from quakestats.dataprovider.analyzer.teams import (
     TeamLifecycle,
 )
 
+# bump when analysis logic outside of special score/badge handlers changes
+ANALYZER_REVISION = 1
+
+
+def analyzer_version() -> str:
+    """
+    Fingerprint of the analysis logic, built from the special score
+    and badge handler registries. Changes whenever a handler is added,
+    removed or modified, used to detect matches which need re-analysis
+    """
+    h = hashlib.sha1(str(ANALYZER_REVISION).encode())
+    handlers = [
+        handler
+        for event_name in sorted(special_handlers)
+        for handler in special_handlers[event_name]
+    ] + badger_handlers
+    for handler in handlers:
+        h.update(handler.__qualname__.encode())
+        h.update(inspect.getsource(handler).encode())
+    return h.hexdigest()
+
 
 class AnalysisResult:
     """
@@ -152,8 +180,11 @@ class Analyzer:
         self.match_metadata.from_full_match_info(full_match_info)
         self.server_info.from_full_match_info(full_match_info)
 
-        for raw_event in full_match_info.events:
-            self.analyze_event(raw_event)
+        if isinstance(full_match_info.events, ColumnarEvents):
+            self.analyze_columnar(full_match_info.events)
+        else:
+            for raw_event in full_match_info.events:
+                self.analyze_event(raw_event)
 
         self.badger.assign()
         # report generation
@@ -195,6 +226,19 @@ class Analyzer:
 
         handler(event)
 
+    def analyze_columnar(self, events: ColumnarEvents):
+        """
+        Kill/death rows are passed directly to the handlers,
+        other events are processed as usual
+        """
+        for event_type, row in events.iter_rows():
+            if event_type == "PLAYER_KILL":
+                self.on_player_kill(row)
+            elif event_type == "PLAYER_DEATH":
+                self.on_player_death(row)
+            else:
+                self.analyze_event(row)
+
     def add_player_if_needed(self, player_id, player_name):
         if player_id not in self.players:
             player_info = PlayerInfo()
@@ -1,4 +1,4 @@
-import pandas as pd
+import heapq
 
 badger_handlers = []
 
@@ -36,18 +36,36 @@ class Badger:
         except KeyError:
             return []
 
-        df = pd.DataFrame(scores, columns=["ts", "to", "from", "value"])
-        series = (
-            df.groupby(["to"])
-            .agg({"value": aggregate, "ts": "max"})
-            .sort_values(by=["value", "ts"])
-        )
+        # group by player_id (:to) keeping aggregated value and max ts
+        groups = {}
+        for ts, to, _, value in scores:
+            try:
+                group = groups[to]
+            except KeyError:
+                groups[to] = [value, ts, 1]
+                continue
+            group[0] += value
+            group[2] += 1
+            if ts > group[1]:
+                group[1] = ts
+
+        if aggregate == "sum":
+            rows = [(value, ts, to) for to, (value, ts, _) in groups.items()]
+        elif aggregate == "count":
+            rows = [(cnt, ts, to) for to, (_, ts, cnt) in groups.items()]
+        else:
+            raise ValueError(f"Unsupported aggregate '{aggregate}'")
+
+        # sort by value, ts; ties are resolved by player_id, the same way
+        # as stable sort of groups ordered by key would do
+        rows.sort(key=lambda row: row[2])
+        keyed = [(value, ts, idx, to) for idx, (value, ts, to) in enumerate(rows)]
         if head:
-            res = series.head(count)
+            res = heapq.nsmallest(count, keyed)
         else:
-            res = series.tail(count)
+            res = heapq.nlargest(count, keyed)[::-1]
 
-        return [(index, row.ts, row.value) for index, row in res.iterrows()]
+        return [(to, ts, value) for value, ts, _, to in res]
 
     def get_multi_badge_count(self):
         # world is also a player
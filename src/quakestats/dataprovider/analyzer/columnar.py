@@ -0,0 +1,163 @@
+"""
+Columnar representation of QL match events.
+
+Kill and death events (the vast majority of any match) are kept in
+typed arrays with player ids, player names and means of death interned.
+All other events are rare and are kept as raw QL dicts.
+Analyzer consumes it row by row without wrapping and inspecting
+nested QL dicts for every kill.
+"""
+from array import (
+    array,
+)
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+KILL_EVENTS = ("PLAYER_KILL", "PLAYER_DEATH")
+
+
+class InternTable():
+    """
+    Maps hashable values to consecutive integer codes
+    """
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def intern(self, value: Any) -> int:
+        try:
+            return self.codes[value]
+        except KeyError:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+            return code
+
+    def __getitem__(self, code: int) -> Any:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class KillRow():
+    """
+    Lightweight view of single PLAYER_KILL/PLAYER_DEATH row.
+    Exposes the same attributes as EventPlayerKill
+    """
+    __slots__ = ("time", "killer_id", "victim_id", "killer_name", "mod")
+
+    def __init__(
+        self, time: float, killer_id: str, victim_id: str,
+        killer_name: Optional[str], mod: str,
+    ):
+        self.time = time
+        self.killer_id = killer_id
+        self.victim_id = victim_id
+        self.killer_name = killer_name
+        self.mod = mod
+
+
+class ColumnarEvents():
+    """
+    Columns (one entry per event):
+        times - game time, ints for QL, floats for Q3
+        types - event type code, see :event_types
+        killers, victims - player codes, see :players, -1 for non kill events
+        killer_names - name codes, see :names, -1 if unknown
+        mods - means of death codes, see :mod_names
+        others - index of raw event in :raw_events, -1 for kill events
+    """
+    def __init__(self):
+        self.times = array("q")
+        self.types = array("b")
+        self.killers = array("i")
+        self.victims = array("i")
+        self.killer_names = array("i")
+        self.mods = array("h")
+        self.others = array("i")
+
+        self.event_types = InternTable()
+        self.players = InternTable()
+        self.names = InternTable()
+        self.mod_names = InternTable()
+        self.raw_events = []
+
+        # resolve kill types codes upfront to keep them stable
+        self.kill_type_codes = tuple(
+            self.event_types.intern(ev_type) for ev_type in KILL_EVENTS
+        )
+
+    @classmethod
+    def from_events(cls, events: Iterable[dict]) -> "ColumnarEvents":
+        store = cls()
+        for event in events:
+            store.append(event)
+        return store
+
+    def append(self, event: dict):
+        data = event["DATA"]
+        ev_type = event["TYPE"]
+        time = data.get("TIME", 0)
+        if self.times.typecode == "q" and not isinstance(time, int):
+            self.times = array("d", self.times)
+
+        self.times.append(time)
+        self.types.append(self.event_types.intern(ev_type))
+
+        if ev_type in KILL_EVENTS:
+            killer = data["KILLER"]
+            # there is no killer if mod 'HURT'
+            killer_id = killer["STEAM_ID"] if killer else "q3-world"
+            killer_name = killer.get("NAME") if killer else None
+            self.killers.append(self.players.intern(killer_id))
+            self.victims.append(
+                self.players.intern(data["VICTIM"]["STEAM_ID"])
+            )
+            self.killer_names.append(
+                -1 if killer_name is None else self.names.intern(killer_name)
+            )
+            self.mods.append(self.mod_names.intern(data["MOD"]))
+            self.others.append(-1)
+        else:
+            self.killers.append(-1)
+            self.victims.append(-1)
+            self.killer_names.append(-1)
+            self.mods.append(-1)
+            self.others.append(len(self.raw_events))
+            self.raw_events.append(event)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def kill_row(self, idx: int) -> KillRow:
+        name_code = self.killer_names[idx]
+        return KillRow(
+            self.times[idx],
+            self.players[self.killers[idx]],
+            self.players[self.victims[idx]],
+            None if name_code == -1 else self.names[name_code],
+            self.mod_names[self.mods[idx]],
+        )
+
+    def iter_rows(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Yields (event type, row) in original order, row is KillRow
+        for kill/death events and raw QL event dict otherwise
+        """
+        kill_codes = self.kill_type_codes
+        event_types = self.event_types.values
+        for idx, type_code in enumerate(self.types):
+            if type_code in kill_codes:
+                yield event_types[type_code], self.kill_row(idx)
+            else:
+                yield (
+                    event_types[type_code],
+                    self.raw_events[self.others[idx]],
+                )
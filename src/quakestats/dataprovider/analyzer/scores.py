@@ -1,6 +1,90 @@
+from bisect import (
+    bisect_left,
+    insort,
+)
 from collections import (
     defaultdict,
 )
+from typing import (
+    Optional,
+    Tuple,
+)
+
+WORLD_ID = "q3-world"
+
+
+class RankedScores(dict):
+    """
+    Maps player_id to [score, timestamp] (missing players get [0, 0]).
+    Additionally keeps players ordered the same way as
+    sorted(keys, key=score, reverse=True) would, ties in insertion order.
+    The order is updated incrementally, so scores have to be changed
+    with set_score (or by assigning a new list), not in place.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # sorted (-score, -timestamp, insertion seq, player_id)
+        self._order = []
+        self._entries = {}
+        self._seq = 0
+
+    def __missing__(self, player_id: str) -> list:
+        score = [0, 0]
+        self[player_id] = score
+        return score
+
+    def __setitem__(self, player_id: str, score: list):
+        try:
+            seq = self._unlink(player_id)
+        except KeyError:
+            seq = self._seq
+            self._seq += 1
+
+        super().__setitem__(player_id, score)
+        self._link(player_id, seq)
+
+    def __delitem__(self, player_id: str):
+        super().__delitem__(player_id)
+        self._unlink(player_id)
+
+    def _link(self, player_id: str, seq: int):
+        score, timestamp = self[player_id]
+        entry = (-score, -timestamp, seq, player_id)
+        insort(self._order, entry)
+        self._entries[player_id] = entry
+
+    def _unlink(self, player_id: str) -> int:
+        entry = self._entries.pop(player_id)
+        del self._order[bisect_left(self._order, entry)]
+        return entry[2]
+
+    def set_score(self, player_id: str, score: int, timestamp=None):
+        value = self[player_id]
+        seq = self._unlink(player_id)
+        value[0] = score
+        if timestamp is not None:
+            value[1] = timestamp
+        self._link(player_id, seq)
+
+    def ordered(self) -> list:
+        return [entry[3] for entry in self._order]
+
+    def first(self, skip: Optional[str] = None) -> Optional[str]:
+        for entry in self._order[:2]:
+            if entry[3] != skip:
+                return entry[3]
+
+    def last(self, skip: Optional[str] = None) -> Optional[str]:
+        for entry in self._order[:-3:-1]:
+            if entry[3] != skip:
+                return entry[3]
+
+    def is_ranked_below(self, player_id: str, other_id: str) -> bool:
+        try:
+            return self._entries[player_id] > self._entries[other_id]
+        except KeyError:
+            return False
 
 
 class PlayerScores:
@@ -15,32 +99,58 @@ class PlayerScores:
         self.scores = []
 
         self.kdr = defaultdict(lambda: KDR())
-        # store (score, timestamp) per player
-        self.player_score = defaultdict(lambda: [0, 0])
+        # store (score, timestamp) per player, ordered by score
+        self.player_score = RankedScores()
 
     def get_final_kdr(self):
         return [
             (player_id, kdr.r)
             for player_id, kdr in self.kdr.items()
-            if kdr.d != 0 and kdr.k != 0 and player_id != "q3-world"
+            if kdr.d != 0 and kdr.k != 0 and player_id != WORLD_ID
         ]
 
     def players_sorted_by_score(self, reverse=True, skip_world=False):
         """
         Active players sorted by score
         """
-        sorted_players = sorted(
-            self.player_score.keys(),
-            reverse=reverse,
-            key=lambda k: (self.player_score[k]),
-        )
+        if reverse:
+            sorted_players = self.player_score.ordered()
+        else:
+            sorted_players = sorted(
+                self.player_score.keys(),
+                key=lambda k: (self.player_score[k]),
+            )
 
         if skip_world:
             sorted_players = [
-                pid for pid in sorted_players if pid != "q3-world"
+                pid for pid in sorted_players if pid != WORLD_ID
             ]
         return sorted_players
 
+    def count_players(self, skip_world=False) -> int:
+        count = len(self.player_score)
+        if skip_world and WORLD_ID in self.player_score:
+            count -= 1
+        return count
+
+    def score_bounds(self, skip_world=False) -> Tuple[Optional[str], Optional[str], int]:
+        """
+        (first, last, number of players) of players_sorted_by_score()
+        without building the whole list
+        """
+        skip = WORLD_ID if skip_world else None
+        return (
+            self.player_score.first(skip),
+            self.player_score.last(skip),
+            self.count_players(skip_world),
+        )
+
+    def is_ranked_below(self, player_id: str, other_id: str) -> bool:
+        """
+        True when player is placed after other player in players_sorted_by_score()
+        """
+        return self.player_score.is_ranked_below(player_id, other_id)
+
     def from_match_started(self, event):
         for player in event.iter_players():
             # use defaultdict to set init values
@@ -56,11 +166,9 @@ class PlayerScores:
 
         # not self kill
         if killer_id != victim_id:
-            self.player_score[killer_id][0] += 1
-            self.player_score[killer_id][1] = game_time
-            self.scores.append(
-                (game_time, killer_id, self.player_score[killer_id][0], mod)
-            )
+            score = self.player_score[killer_id][0] + 1
+            self.player_score.set_score(killer_id, score, game_time)
+            self.scores.append((game_time, killer_id, score, mod))
             self.kdr[killer_id].add_kill()
 
         # TODO add friendlyfire for teamplay
@@ -74,11 +182,10 @@ class PlayerScores:
         self.deaths.append((game_time, killer_id, victim_id, mod))
 
         self.kdr[victim_id].add_death()
-        if killer_id == victim_id or killer_id == "q3-world":
-            self.player_score[victim_id][0] -= 1
-            self.scores.append(
-                (game_time, victim_id, self.player_score[victim_id][0], mod)
-            )
+        if killer_id == victim_id or killer_id == WORLD_ID:
+            score = self.player_score[victim_id][0] - 1
+            self.player_score.set_score(victim_id, score)
+            self.scores.append((game_time, victim_id, score, mod))
 
     def from_player_switchteam(self, player_switchteam):
         # In OSP 1v1 user is forced to spect right after match end
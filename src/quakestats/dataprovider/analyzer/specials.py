@@ -1,6 +1,9 @@
 from collections import (
     defaultdict,
 )
+from functools import (
+    wraps,
+)
 
 special_handlers = defaultdict(lambda: [])
 
@@ -25,6 +28,7 @@ class SpecialScores:
 
     def on_stateful_event(event_name, state_id, default=None):
         def wrapper(func):
+            @wraps(func)
             def enchanced(self, *args, **kwargs):
                 defval = default if default is not None else {}
                 state = self.states.setdefault(
@@ -113,11 +117,12 @@ class SpecialScores:
         if mod != "GAUNTLET":
             should_calculate = False
 
-        sorted_players = self.player_state[None].get(
-            "previous_players_by_score", []
+        # (first, last, number of players) after previous kill
+        first, last, players_count = self.player_state[None].get(
+            "previous_score_bounds", (None, None, 0)
         )
 
-        if len(sorted_players) < 2:
+        if players_count < 2:
             should_calculate = False
 
         # two extra cases to consider
@@ -127,16 +132,16 @@ class SpecialScores:
         # so we need to take a look into history
 
         if should_calculate:
-            if victim_id == sorted_players[0]:
+            if victim_id == first:
                 self.add_score("HEADHUNTER", player_kill)
                 self.add_score("HEADLESS_KNIGHT", player_kill, swap_kv=True)
-            elif victim_id == sorted_players[-1]:
+            elif victim_id == last:
                 self.add_score("DUCKHUNTER", player_kill)
 
         # global state
         self.player_state[None][
-            "previous_players_by_score"
-        ] = self.player_scores.players_sorted_by_score(skip_world=True)
+            "previous_score_bounds"
+        ] = self.player_scores.score_bounds(skip_world=True)
 
     @on_event("PLAYER_KILL")
     def score_death(self, player_kill):
@@ -339,33 +344,19 @@ class SpecialScores:
         if killer_id == victim_id:
             should_calculate = False
 
-        sorted_players = self.player_state[None].get(
-            "previous_players_by_score", []
-        )
-
-        if len(sorted_players) < 2:
+        # scores are assigned before special scores are calculated,
+        # ranking already includes current kill
+        if self.player_scores.count_players(skip_world=True) < 2:
             should_calculate = False
 
-        # two extra cases to consider
-        # scores are assigned before special scores are calculated so:
-        # A is first B second score 1:1, B kills A, B should get marauder
-        # so we need to take a look into history again
-
-        if should_calculate:
-            try:
-                killer_idx = sorted_players.index(killer_id)
-                victim_idx = sorted_players.index(victim_id)
-            except ValueError:
-                pass
-            else:
-                # player is behind victim
-                if killer_idx > victim_idx:
-                    self.add_score("MARAUDER", player_kill)
+        if "q3-world" in (killer_id, victim_id):
+            should_calculate = False
 
-        # global state
-        self.player_state[None][
-            "previous_players_by_score"
-        ] = self.player_scores.players_sorted_by_score(skip_world=True)
+        # player is behind victim
+        if should_calculate and self.player_scores.is_ranked_below(
+            killer_id, victim_id
+        ):
+            self.add_score("MARAUDER", player_kill)
 
     @on_stateful_event("PLAYER_KILL", "CONSECUTIVE_RAIL_KILL", 0)
     def score_consecutive_rail_kill(self, state, kill):
@@ -2,9 +2,19 @@
 TODO add documentation
 """
 import typing
+from collections import (
+    defaultdict,
+)
+from concurrent.futures import (
+    Executor,
+)
 from copy import (
     deepcopy,
 )
+from datetime import (
+    datetime,
+    timedelta,
+)
 
 import pymongo
 
@@ -12,11 +22,127 @@ from quakestats.datasource.entities import (
     Q3Match,
 )
 
+WORLD_ID = "q3-world"
+# player stats rollups (kills, deaths, badges) are kept per day and per week
+ROLLUP_FIELDS = ("kills", "deaths")
+# backfills of databases created before careers/rollups were introduced,
+# completed ones are recorded in migration collection
+MIGRATION_PLAYER_CAREER = "player_career"
+MIGRATION_PLAYER_ROLLUP = "player_rollup"
+MIGRATIONS = (MIGRATION_PLAYER_CAREER, MIGRATION_PLAYER_ROLLUP)
+DATA_GENERATION_ID = "data"
+
+ASC = pymongo.ASCENDING
+DESC = pymongo.DESCENDING
+# indexes for every access pattern, {collection: [(keys, unique), ...]}
+INDEXES = {
+    "match": [([("match_guid", ASC)], False), ([("start_date", DESC)], False)],
+    "player": [([("id", ASC), ("server_domain", ASC)], False)],
+    "team_switch": [([("match_guid", ASC)], False), ([("player_id", ASC)], False)],
+    "score": [([("match_guid", ASC)], False), ([("player_id", ASC)], False)],
+    "kill": [
+        ([("match_guid", ASC)], False),
+        ([("killer_id", ASC)], False),
+        ([("victim_id", ASC)], False),
+    ],
+    "special_score": [
+        ([("match_guid", ASC)], False),
+        ([("killer_id", ASC)], False),
+        ([("victim_id", ASC)], False),
+    ],
+    "badge": [([("match_guid", ASC)], False), ([("player_id", ASC), ("name", ASC)], False)],
+    "player_stats": [([("match_guid", ASC)], False), ([("player_id", ASC)], False)],
+    "player_merge": [([("src_player_id", ASC), ("target_player_id", ASC)], False)],
+    "match_fingerprint": [([("match_guid", ASC)], True)],
+    "player_career": [([("player_id", ASC)], True)],
+    "player_rollup": [
+        ([("period", ASC), ("bucket", ASC), ("player_id", ASC)], True),
+        ([("player_id", ASC)], False),
+    ],
+    "user": [([("username", ASC)], False)],
+    "migration": [([("name", ASC)], True)],
+    "map": [([("map_name", ASC)], False)],
+}
+
+
+def day_start(date: datetime) -> datetime:
+    return datetime(date.year, date.month, date.day)
+
+
+def rollup_buckets(date: datetime) -> typing.List[typing.Tuple[str, datetime]]:
+    """
+    (period, bucket start) pairs of given match start date
+    """
+    day = day_start(date)
+    return [("day", day), ("week", day - timedelta(days=day.weekday()))]
+
+
+def rollup_filter(since: datetime) -> dict:
+    """
+    Minimal set of buckets covering everything since given day:
+    days up to the next monday and all weeks afterwards
+    """
+    since = day_start(since)
+    first_week = since + timedelta(days=(7 - since.weekday()) % 7)
+    return {
+        "$or": [
+            {"period": "day", "bucket": {"$gte": since, "$lt": first_week}},
+            {"period": "week", "bucket": {"$gte": first_week}},
+        ]
+    }
+
+
+# representative queries verified with explain, (collection, filter, sort)
+QUERY_PATTERNS = [
+    ("match", {"match_guid": ""}, None),
+    ("match", {}, [("start_date", DESC)]),
+    ("player", {"id": ""}, None),
+    ("team_switch", {"match_guid": ""}, None),
+    ("score", {"match_guid": ""}, None),
+    ("kill", {"match_guid": ""}, None),
+    ("kill", {"killer_id": ""}, None),
+    ("kill", {"victim_id": ""}, None),
+    ("special_score", {"match_guid": ""}, None),
+    ("badge", {"match_guid": ""}, None),
+    ("badge", {"player_id": ""}, None),
+    ("player_stats", {"match_guid": ""}, None),
+    ("player_stats", {"player_id": ""}, None),
+    ("player_career", {"player_id": ""}, None),
+    ("player_rollup", rollup_filter(datetime(2020, 1, 1)), None),
+    ("player_rollup", {"player_id": ""}, None),
+]
+
+
+def iter_plan_stages(plan: dict) -> typing.Iterator[str]:
+    """
+    Stage names of explain() query plan tree
+    """
+    yield plan.get("stage")
+    for key in ("inputStage", "innerStage", "outerStage"):
+        if key in plan:
+            yield from iter_plan_stages(plan[key])
+    for stage in plan.get("inputStages", []):
+        yield from iter_plan_stages(stage)
+
 
 class DataStoreMongo:
     def __init__(self, db: pymongo.database.Database):
         self.db = db
 
+    def get_data_generation(self) -> int:
+        """
+        Counter incremented when stored matches are modified (delete,
+        players merge, rebuild), used to invalidate cached API responses
+        of all processes. Storing new matches doesn't change it
+        """
+        doc = self.db.data_generation.find_one({"_id": DATA_GENERATION_ID})
+        return doc["generation"] if doc else 0
+
+    def bump_data_generation(self):
+        self.db.data_generation.update_one(
+            {"_id": DATA_GENERATION_ID}, {"$inc": {"generation": 1}}, upsert=True
+        )
+
     def store_analysis_report(self, analysis_report):
         match_guid = analysis_report.match_metadata.match_guid
         match_in_db = self.db.match.find_one({"match_guid": match_guid})
@@ -31,11 +157,80 @@ class DataStoreMongo:
         self.store_special_scores(analysis_report)
         self.store_badges(analysis_report)
         self.store_player_stats(analysis_report)
+        self.store_player_careers(analysis_report)
+        self.store_player_rollups(analysis_report)
         return True, match_guid
 
+    def store_analysis_reports(self, analysis_reports) -> typing.List[typing.Tuple[bool, str]]:
+        """
+        Bulk variant of store_analysis_report. Documents of all given
+        matches are grouped by collection and written with a single
+        bulk_write/insert_many call per collection.
+        """
+        match_guids = [r.match_metadata.match_guid for r in analysis_reports]
+        in_db = {
+            m["match_guid"] for m in self.db.match.find(
+                {"match_guid": {"$in": match_guids}}, {"match_guid": 1}
+            )
+        }
+
+        results = []
+        player_operations = []
+        documents = defaultdict(list)
+        rollup_increments = {}
+        for analysis_report in analysis_reports:
+            match_guid = analysis_report.match_metadata.match_guid
+            if match_guid in in_db:
+                results.append((False, match_guid))
+                continue
+
+            in_db.add(match_guid)
+            documents["match"].append(self.build_match(analysis_report))
+            player_operations.extend(self.build_players(analysis_report))
+            documents["team_switch"].extend(self.build_team_lifecycle(analysis_report))
+            documents["score"].extend(self.build_scores(analysis_report))
+            documents["kill"].extend(self.build_kills(analysis_report))
+            documents["special_score"].extend(self.build_special_scores(analysis_report))
+            documents["badge"].extend(self.build_badges(analysis_report))
+            documents["player_stats"].extend(self.build_player_stats(analysis_report))
+            self.merge_increments(rollup_increments, self.build_rollup_increments(
+                analysis_report.match_metadata.start_date,
+                self.build_kills(analysis_report), self.build_badges(analysis_report),
+            ))
+            results.append((True, match_guid))
+
+        if player_operations:
+            self.db.player.bulk_write(player_operations)
+
+        for collection_name, docs in documents.items():
+            if docs:
+                getattr(self.db, collection_name).insert_many(docs, ordered=False)
+
+        career_operations = self.build_player_careers(self.build_career_increments(
+            documents["kill"], documents["player_stats"], documents["badge"]
+        ))
+        if career_operations:
+            self.db.player_career.bulk_write(career_operations)
+
+        rollup_operations = self.build_player_rollups(rollup_increments)
+        if rollup_operations:
+            self.db.player_rollup.bulk_write(rollup_operations)
+
+        return results
+
     def get_match(self, match_guid: str):
         return self.db.match.find_one({"match_guid": match_guid})
 
+    def get_known_match_guids(self, match_guids: typing.List[str]) -> typing.Set[str]:
+        """
+        Subset of given match guids which are already stored
+        """
+        return {
+            e["match_guid"] for e in self.db.match.find(
+                {"match_guid": {"$in": match_guids}}, {"match_guid": 1, "_id": 0}
+            )
+        }
+
     def merge_players(self, src_player_id, target_player_id):
         # TODO this can probably be tested properly only with integration tests
         self.db.badge.bulk_write(
@@ -109,7 +304,16 @@ class DataStoreMongo:
                 }
             )
 
+        # e.g. kills between merged players become selfkills
+        # so the careers can't be simply summed up
+        self.refresh_player_careers([src_player_id, target_player_id])
+        self.merge_player_rollups(src_player_id, target_player_id)
+        self.bump_data_generation()
+
     def store_match(self, analysis_report):
+        self.db.match.insert_one(self.build_match(analysis_report))
+
+    def build_match(self, analysis_report) -> dict:
         match_info = self.attr2dict(
             analysis_report.match_metadata,
             [
@@ -130,10 +334,12 @@ class DataStoreMongo:
         )
 
         match_info["summary"] = analysis_report.summary
-
-        self.db.match.insert_one(match_info)
+        return match_info
 
     def store_players(self, analysis_report):
+        self.db.player.bulk_write(self.build_players(analysis_report))
+
+    def build_players(self, analysis_report) -> typing.List[pymongo.UpdateOne]:
         server_domain = analysis_report.match_metadata.server_domain
 
         operations = []
@@ -152,9 +358,12 @@ class DataStoreMongo:
                     upsert=True,
                 )
             )
-        self.db.player.bulk_write(operations)
+        return operations
 
     def store_team_lifecycle(self, analysis_report):
+        self.db.team_switch.insert_many(self.build_team_lifecycle(analysis_report))
+
+    def build_team_lifecycle(self, analysis_report) -> typing.List[dict]:
         match_guid = analysis_report.match_metadata.match_guid
         result = []
         for switch in analysis_report.team_switches:
@@ -167,9 +376,12 @@ class DataStoreMongo:
                     "to": switch[3],
                 }
             )
-        self.db.team_switch.insert_many(result)
+        return result
 
     def store_scores(self, analysis_report):
+        self.db.score.insert_many(self.build_scores(analysis_report))
+
+    def build_scores(self, analysis_report) -> typing.List[dict]:
         match_guid = analysis_report.match_metadata.match_guid
         results = []
         for score in analysis_report.scores:
@@ -182,9 +394,14 @@ class DataStoreMongo:
                     "by": score[3],
                 }
             )
-        self.db.score.insert_many(results)
+        return results
 
     def store_kills(self, analysis_report):
+        results = self.build_kills(analysis_report)
+        if results:
+            self.db.kill.insert_many(results)
+
+    def build_kills(self, analysis_report) -> typing.List[dict]:
         match_guid = analysis_report.match_metadata.match_guid
         results = []
         for kill in analysis_report.kills:
@@ -197,10 +414,12 @@ class DataStoreMongo:
                     "by": kill[3],
                 }
             )
-        if results:
-            self.db.kill.insert_many(results)
+        return results
 
     def store_special_scores(self, analysis_report):
+        self.db.special_score.insert_many(self.build_special_scores(analysis_report))
+
+    def build_special_scores(self, analysis_report) -> typing.List[dict]:
         match_guid = analysis_report.match_metadata.match_guid
         results = []
         for score_type, scores in analysis_report.special_scores.items():
@@ -216,9 +435,12 @@ class DataStoreMongo:
                         "value": score[3],
                     }
                 )
-        self.db.special_score.insert_many(results)
+        return results
 
     def store_badges(self, analysis_report):
+        self.db.badge.insert_many(self.build_badges(analysis_report))
+
+    def build_badges(self, analysis_report) -> typing.List[dict]:
         match_guid = analysis_report.match_metadata.match_guid
         results = []
         for badge in analysis_report.badges:
@@ -230,22 +452,411 @@ class DataStoreMongo:
                     "count": badge[2],
                 }
             )
-        self.db.badge.insert_many(results)
+        return results
 
     def store_player_stats(self, analysis_report):
         # its possible that weapon stats is empty
         # not sure when it happens but I've seen such match
-        if not analysis_report.player_stats:
-            return
+        results = self.build_player_stats(analysis_report)
+        if results:
+            self.db.player_stats.insert_many(results)
 
+    def build_player_stats(self, analysis_report) -> typing.List[dict]:
         match_guid = analysis_report.match_metadata.match_guid
         results = []
         for entry in analysis_report.player_stats:
             res = deepcopy(entry)
             res["match_guid"] = match_guid
             results.append(res)
+        return results
+
+    def store_player_careers(self, analysis_report):
+        operations = self.build_player_careers(self.build_career_increments(
+            self.build_kills(analysis_report),
+            self.build_player_stats(analysis_report),
+            self.build_badges(analysis_report),
+        ))
+        if operations:
+            self.db.player_career.bulk_write(operations)
+
+    def build_career_increments(
+        self, kills: typing.Iterable[dict], player_stats: typing.Iterable[dict],
+        badges: typing.Iterable[dict], sign: int = 1,
+    ) -> typing.Dict[str, typing.Dict[str, int]]:
+        """
+        Per player career counters calculated from
+        kill, player_stats and badge documents
+        Use :sign -1 to calculate decrements
+        """
+        increments = defaultdict(lambda: defaultdict(int))
+        for kill in kills:
+            killer_id = kill["killer_id"]
+            victim_id = kill["victim_id"]
+            increments[killer_id]["kills"] += sign
+            increments[victim_id]["deaths"] += sign
+            if killer_id == victim_id or killer_id == WORLD_ID:
+                increments[victim_id]["selfkills"] += sign
+
+        for stats in player_stats:
+            increment = increments[stats["player_id"]]
+            increment["games"] += sign
+            increment["damage_dealt"] += sign * stats.get("damage_dealt", 0)
+            increment["damage_taken"] += sign * stats.get("damage_taken", 0)
+
+        for badge in badges:
+            increments[badge["player_id"]][
+                "badges.{}".format(badge["name"])
+            ] += sign * badge["count"]
+
+        return increments
+
+    def build_player_careers(
+        self, increments: typing.Dict[str, typing.Dict[str, int]]
+    ) -> typing.List[pymongo.UpdateOne]:
+        return [
+            pymongo.UpdateOne(
+                {"player_id": player_id},
+                {"$inc": dict(increment)},
+                upsert=True,
+            )
+            for player_id, increment in increments.items()
+        ]
+
+    def drop_player_careers(self, match_filter: dict):
+        """
+        Subtract matches (selected by :match_filter) from player careers
+        has to be called before the match documents are deleted
+        """
+        increments = self.build_career_increments(
+            self.db.kill.find(match_filter, {"killer_id": 1, "victim_id": 1}),
+            self.db.player_stats.find(
+                match_filter,
+                {"player_id": 1, "damage_dealt": 1, "damage_taken": 1},
+            ),
+            self.db.badge.find(match_filter, {"player_id": 1, "name": 1, "count": 1}),
+            sign=-1,
+        )
+        operations = self.build_player_careers(increments)
+        if operations:
+            self.db.player_career.bulk_write(operations)
+
+    def refresh_player_careers(self, player_ids: typing.List[str]):
+        """
+        Recalculate careers of given players from raw collections
+        """
+        careers = {
+            player_id: {
+                "player_id": player_id, "kills": 0, "deaths": 0,
+                "selfkills": 0, "damage_dealt": 0, "damage_taken": 0,
+                "games": 0, "badges": {},
+            }
+            for player_id in player_ids
+        }
+        found = set()
+
+        kills = self.db.kill.aggregate([
+            {"$match": {"killer_id": {"$in": player_ids}}},
+            {"$group": {"_id": "$killer_id", "kills": {"$sum": 1}}},
+        ])
+        for entry in kills:
+            careers[entry["_id"]]["kills"] = entry["kills"]
+            found.add(entry["_id"])
+
+        deaths = self.db.kill.aggregate([
+            {"$match": {"victim_id": {"$in": player_ids}}},
+            {"$group": {
+                "_id": "$victim_id",
+                "deaths": {"$sum": 1},
+                "selfkills": {"$sum": {"$cond": [
+                    {"$or": [
+                        {"$eq": ["$killer_id", "$victim_id"]},
+                        {"$eq": ["$killer_id", WORLD_ID]},
+                    ]}, 1, 0,
+                ]}},
+            }},
+        ])
+        for entry in deaths:
+            careers[entry["_id"]]["deaths"] = entry["deaths"]
+            careers[entry["_id"]]["selfkills"] = entry["selfkills"]
+            found.add(entry["_id"])
+
+        player_stats = self.db.player_stats.aggregate([
+            {"$match": {"player_id": {"$in": player_ids}}},
+            {"$group": {
+                "_id": "$player_id",
+                "games": {"$sum": 1},
+                "damage_dealt": {"$sum": "$damage_dealt"},
+                "damage_taken": {"$sum": "$damage_taken"},
+            }},
+        ])
+        for entry in player_stats:
+            careers[entry["_id"]].update({
+                "games": entry["games"],
+                "damage_dealt": entry["damage_dealt"],
+                "damage_taken": entry["damage_taken"],
+            })
+            found.add(entry["_id"])
+
+        badges = self.db.badge.aggregate([
+            {"$match": {"player_id": {"$in": player_ids}}},
+            {"$group": {
+                "_id": {"name": "$name", "player_id": "$player_id"},
+                "count": {"$sum": "$count"},
+            }},
+        ])
+        for entry in badges:
+            player_id = entry["_id"]["player_id"]
+            careers[player_id]["badges"][entry["_id"]["name"]] = entry["count"]
+            found.add(player_id)
+
+        operations = [
+            pymongo.ReplaceOne({"player_id": player_id}, career, upsert=True)
+            if player_id in found
+            else pymongo.DeleteOne({"player_id": player_id})
+            for player_id, career in careers.items()
+        ]
+        self.db.player_career.bulk_write(operations)
+
+    def is_migrated(self, name: str) -> bool:
+        return self.db.migration.find_one({"name": name}) is not None
+
+    def set_migrated(self, name: str):
+        self.db.migration.update_one(
+            {"name": name},
+            {"$set": {"name": name, "date": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    def migrate(self) -> typing.List[str]:
+        """
+        Backfill data introduced after matches were stored,
+        returns names of executed migrations
+        """
+        executed = []
+        for name, migration in [
+            (MIGRATION_PLAYER_CAREER, self.ensure_player_careers),
+            (MIGRATION_PLAYER_ROLLUP, self.ensure_player_rollups),
+        ]:
+            if migration():
+                executed.append(name)
+        return executed
+
+    def get_pending_migrations(self) -> typing.List[str]:
+        return [name for name in MIGRATIONS if not self.is_migrated(name)]
+
+    def ensure_player_careers(self) -> bool:
+        """
+        Calculate careers of all players unless it was already done.
+        Careers are recalculated from match documents so the ones
+        created meanwhile (by newly stored matches) are just replaced
+        """
+        if self.is_migrated(MIGRATION_PLAYER_CAREER):
+            return False
+
+        player_ids = set(self.db.kill.distinct("killer_id"))
+        player_ids.update(self.db.kill.distinct("victim_id"))
+        player_ids.update(self.db.player_stats.distinct("player_id"))
+        player_ids.update(self.db.badge.distinct("player_id"))
+        if player_ids:
+            self.refresh_player_careers(list(player_ids))
+        self.set_migrated(MIGRATION_PLAYER_CAREER)
+        return True
+
+    def get_player_career(self, player_id: str) -> typing.Optional[dict]:
+        return self.db.player_career.find_one({"player_id": player_id}, {"_id": 0})
+
+    def get_player_careers(self) -> typing.List[dict]:
+        return list(self.db.player_career.find({}, {"_id": 0}))
+
+    def store_player_rollups(self, analysis_report):
+        operations = self.build_player_rollups(self.build_rollup_increments(
+            analysis_report.match_metadata.start_date,
+            self.build_kills(analysis_report),
+            self.build_badges(analysis_report),
+        ))
+        if operations:
+            self.db.player_rollup.bulk_write(operations)
+
+    def build_rollup_increments(
+        self, start_date: typing.Optional[datetime], kills: typing.Iterable[dict],
+        badges: typing.Iterable[dict], sign: int = 1,
+    ) -> typing.Dict[tuple, typing.Dict[str, int]]:
+        """
+        Rollup counters of single match
+        {(period, bucket, player_id): {kills, deaths, badges.<name>}}
+        """
+        if not start_date:
+            return {}
+
+        increments = self.build_career_increments(kills, [], badges, sign)
+        result = {}
+        for period, bucket in rollup_buckets(start_date):
+            for player_id, increment in increments.items():
+                result[(period, bucket, player_id)] = {
+                    key: value for key, value in increment.items()
+                    if key in ROLLUP_FIELDS or key.startswith("badges.")
+                }
+        return result
+
+    def merge_increments(self, target: dict, increments: dict) -> dict:
+        for key, increment in increments.items():
+            merged = target.setdefault(key, defaultdict(int))
+            for field, value in increment.items():
+                merged[field] += value
+        return target
+
+    def build_player_rollups(
+        self, increments: typing.Dict[tuple, typing.Dict[str, int]]
+    ) -> typing.List[pymongo.UpdateOne]:
+        return [
+            pymongo.UpdateOne(
+                {"period": period, "bucket": bucket, "player_id": player_id},
+                {"$inc": dict(increment)},
+                upsert=True,
+            )
+            for (period, bucket, player_id), increment in increments.items()
+            if increment
+        ]
+
+    def build_stored_rollup_increments(self, match_filter: dict, sign: int = 1) -> dict:
+        """
+        Rollup increments of stored matches selected by :match_filter
+        """
+        start_dates = {
+            m["match_guid"]: m.get("start_date")
+            for m in self.db.match.find(match_filter, {"match_guid": 1, "start_date": 1})
+        }
+        kills = defaultdict(list)
+        for kill in self.db.kill.find(
+            match_filter, {"match_guid": 1, "killer_id": 1, "victim_id": 1}
+        ):
+            kills[kill["match_guid"]].append(kill)
+        badges = defaultdict(list)
+        for badge in self.db.badge.find(
+            match_filter, {"match_guid": 1, "player_id": 1, "name": 1, "count": 1}
+        ):
+            badges[badge["match_guid"]].append(badge)
+
+        increments = {}
+        for match_guid, start_date in start_dates.items():
+            self.merge_increments(increments, self.build_rollup_increments(
+                start_date, kills[match_guid], badges[match_guid], sign
+            ))
+        return increments
+
+    def drop_player_rollups(self, match_filter: dict):
+        """
+        Subtract matches (selected by :match_filter) from player rollups
+        has to be called before the match documents are deleted
+        """
+        operations = self.build_player_rollups(
+            self.build_stored_rollup_increments(match_filter, sign=-1)
+        )
+        if operations:
+            self.db.player_rollup.bulk_write(operations)
+
+    def merge_player_rollups(self, src_player_id: str, target_player_id: str):
+        # rollups keep only kills/deaths/badges so they can be simply summed up
+        operations = []
+        for rollup in self.db.player_rollup.find({"player_id": src_player_id}):
+            increment = {field: rollup.get(field, 0) for field in ROLLUP_FIELDS}
+            for name, count in rollup.get("badges", {}).items():
+                increment["badges.{}".format(name)] = count
+            operations.append(pymongo.UpdateOne(
+                {
+                    "period": rollup["period"], "bucket": rollup["bucket"],
+                    "player_id": target_player_id,
+                },
+                {"$inc": increment},
+                upsert=True,
+            ))
+            operations.append(pymongo.DeleteOne({"_id": rollup["_id"]}))
+
+        if operations:
+            self.db.player_rollup.bulk_write(operations)
+
+    def ensure_player_rollups(self) -> bool:
+        """
+        Calculate rollups of all stored matches unless it was already done.
+        Rollups are incremented, the ones created meanwhile are dropped first
+        """
+        if self.is_migrated(MIGRATION_PLAYER_ROLLUP):
+            return False
+
+        self.db.player_rollup.delete_many({})
+        match_guids = [m["match_guid"] for m in self.db.match.find({}, {"match_guid": 1})]
+        for idx in range(0, len(match_guids), 100):
+            operations = self.build_player_rollups(self.build_stored_rollup_increments(
+                {"match_guid": {"$in": match_guids[idx:idx + 100]}}
+            ))
+            if operations:
+                self.db.player_rollup.bulk_write(operations)
+        self.set_migrated(MIGRATION_PLAYER_ROLLUP)
+        return True
+
+    def get_rollup_stats(self, since: datetime) -> typing.Dict[str, typing.Dict[str, int]]:
+        """
+        Merged player stats of matches started since given day
+        {player_id: {kills, deaths, badges.<name>}}
+        """
+        stats = defaultdict(lambda: defaultdict(int))
+        for rollup in self.db.player_rollup.find(rollup_filter(since), {"_id": 0}):
+            player_stats = stats[rollup["player_id"]]
+            for field in ROLLUP_FIELDS:
+                player_stats[field] += rollup.get(field, 0)
+            for name, count in rollup.get("badges", {}).items():
+                player_stats["badges.{}".format(name)] += count
+        return stats
+
+    def get_matches_stats(self, match_guids: typing.List[str]) -> typing.Dict[str, typing.Dict[str, int]]:
+        """
+        The same as get_rollup_stats but calculated from given matches documents
+        """
+        match_filter = {"match_guid": {"$in": match_guids}}
+        increments = self.build_career_increments(
+            self.db.kill.find(match_filter, {"killer_id": 1, "victim_id": 1}),
+            [],
+            self.db.badge.find(match_filter, {"player_id": 1, "name": 1, "count": 1}),
+        )
+        return {
+            player_id: {
+                key: value for key, value in increment.items()
+                if key in ROLLUP_FIELDS or key.startswith("badges.")
+            }
+            for player_id, increment in increments.items()
+        }
+
+    def get_latest_stats(self, latest: int) -> typing.Dict[str, typing.Dict[str, int]]:
+        """
+        Player stats of :latest matches.
+        Whole days are read from rollups, only matches from the
+        oldest (partially included) day are aggregated from documents
+        """
+        matches = list(
+            self.db.match.find({}, {"match_guid": 1, "start_date": 1})
+            .sort("start_date", pymongo.DESCENDING)
+            .limit(latest)
+        )
+        if not matches:
+            return {}
+
+        if (
+            any(not m.get("start_date") for m in matches)
+            or not self.is_migrated(MIGRATION_PLAYER_ROLLUP)
+        ):
+            return self.get_matches_stats([m["match_guid"] for m in matches])
 
-        self.db.player_stats.insert_many(results)
+        next_day = day_start(matches[-1]["start_date"]) + timedelta(days=1)
+        stats = self.get_rollup_stats(next_day)
+        partial = self.get_matches_stats([
+            m["match_guid"] for m in matches if m["start_date"] < next_day
+        ])
+        return self.merge_increments(stats, partial)
+
+    def get_period_stats(self, latest: typing.Optional[int] = None, days: typing.Optional[int] = None):
+        if latest:
+            return self.get_latest_stats(latest)
+        return self.get_rollup_stats(datetime.utcnow() - timedelta(days=days))
 
     def attr2dict(self, obj, attributes):
         result = {}
@@ -309,7 +920,7 @@ class DataStoreMongo:
 
     def get_match_metadata(self, match_guid):
         res = self.db.match.find_one({"match_guid": match_guid})
-        return self.strip_id(res)
+        return self.strip_id(res) if res else None
 
     def get_team_lifecycle(self, match_guid):
         res = self.db.team_switch.find({"match_guid": match_guid})
@@ -339,93 +950,93 @@ class DataStoreMongo:
         res = self.db.player_stats.find({"match_guid": match_guid})
         return self.strip_id(res)
 
+    def get_match_bundle(
+        self, match_guid: str, executor: typing.Optional[Executor] = None
+    ) -> typing.Optional[dict]:
+        """
+        All per match documents in a single dict, None if match doesn't exist.
+        Collections are queried concurrently when :executor is given
+        """
+        getters = {
+            "metadata": self.get_match_metadata,
+            "players": self.get_match_players,
+            "teams": self.get_team_lifecycle,
+            "score": self.get_match_scores,
+            "special": self.get_match_special_scores,
+            "kill": self.get_match_kills,
+            "badge": self.get_match_badges,
+            "player_stats": self.get_match_player_stats,
+        }
+        if executor:
+            futures = {
+                key: executor.submit(getter, match_guid)
+                for key, getter in getters.items()
+            }
+            bundle = {key: future.result() for key, future in futures.items()}
+        else:
+            bundle = {key: getter(match_guid) for key, getter in getters.items()}
+
+        if bundle["metadata"] is None:
+            return None
+        return bundle
+
     def get_players(self, ids=None):
         if ids:
             return self.strip_id(self.db.player.find({"id": {"$in": ids}}))
         else:
             return self.strip_id(self.db.player.find())
 
-    def get_badge_sum(self, latest=None):
-        if latest:
-            matches = self.get_matches(latest, True)
-            aggregate = [
-                {
-                    "$match": {
-                        "match_guid": {
-                            "$in": [m["match_guid"] for m in matches]
-                        }
-                    }
-                },
+    def get_badge_sum(self, latest=None, days=None):
+        """
+        Badge counts per player of :latest matches, matches from last :days
+        or all matches (read from player careers)
+        """
+        if not (latest or days):
+            return [
+                {"name": name, "player_id": career["player_id"], "count": count}
+                for career in self.get_player_careers()
+                for name, count in career.get("badges", {}).items()
+                if count
             ]
-        else:
-            aggregate = []
-
-        aggregate.append(
-            {
-                "$group": {
-                    "_id": {"name": "$name", "player_id": "$player_id"},
-                    "count": {"$sum": "$count"},
-                }
-            }
-        )
 
-        res = self.db.badge.aggregate(aggregate)
+        prefix = "badges."
         return [
-            {
-                "name": entry["_id"]["name"],
-                "player_id": entry["_id"]["player_id"],
-                "count": entry["count"],
-            }
-            for entry in res
+            {"name": key[len(prefix):], "player_id": player_id, "count": count}
+            for player_id, stats in self.get_period_stats(latest, days).items()
+            for key, count in stats.items()
+            if key.startswith(prefix) and count
         ]
 
-    def get_total_stats(self, latest=None):
-        if latest:
-            matches = self.get_matches(latest, True)
-            match = {"match_guid": {"$in": [m["match_guid"] for m in matches]}}
-            min_score = 0
-        else:
-            match = {}
-            min_score = 100
+    def get_total_stats(self, latest=None, days=None):
+        if not (latest or days):
+            return self.get_career_total_stats(min_score=100)
 
-        kills = self.db.kill.aggregate(
-            [
-                {"$match": match},
-                {
-                    "$group": {
-                        "_id": {"killer_id": "$killer_id"},
-                        "count": {"$sum": 1},
-                    }
-                },
-            ]
-        )
-        deaths = self.db.kill.aggregate(
-            [
-                {"$match": match},
-                {
-                    "$group": {
-                        "_id": {"victim_id": "$victim_id"},
-                        "count": {"$sum": 1},
-                    }
-                },
-            ]
-        )
+        stats = self.get_period_stats(latest, days)
         return {
             "kills": [
-                {
-                    "player_id": entry["_id"]["killer_id"],
-                    "total": entry["count"],
-                }
-                for entry in kills
-                if entry["count"] > min_score
+                {"player_id": player_id, "total": entry["kills"]}
+                for player_id, entry in stats.items()
+                if entry.get("kills", 0) > 0
             ],
             "deaths": [
-                {
-                    "player_id": entry["_id"]["victim_id"],
-                    "total": entry["count"],
-                }
-                for entry in deaths
-                if entry["count"] > min_score
+                {"player_id": player_id, "total": entry["deaths"]}
+                for player_id, entry in stats.items()
+                if entry.get("deaths", 0) > 0
+            ],
+        }
+
+    def get_career_total_stats(self, min_score=0):
+        careers = self.get_player_careers()
+        return {
+            "kills": [
+                {"player_id": career["player_id"], "total": career["kills"]}
+                for career in careers
+                if career.get("kills", 0) > min_score
+            ],
+            "deaths": [
+                {"player_id": career["player_id"], "total": career["deaths"]}
+                for career in careers
+                if career.get("deaths", 0) > min_score
             ],
         }
 
@@ -470,17 +1081,69 @@ class DataStoreMongo:
         """
         Should drop all match related collections
         """
-        skip = ["user", "map", "player_merge"]
+        skip = ["user", "map", "player_merge", "data_generation"]
         for name in self.db.list_collection_names():
             if name in skip:
                 continue
             self.db.drop_collection(name)
+        self.bump_data_generation()
 
     def post_rebuild(self):
+        # collections were dropped (with indexes) by prepare_for_rebuild
+        self.ensure_indexes()
         for merge in self.db.player_merge.find():
             self.merge_players(
                 merge["src_player_id"], merge["target_player_id"]
             )
+        # careers and rollups were built from all matches
+        for name in MIGRATIONS:
+            self.set_migrated(name)
+        self.bump_data_generation()
+
+    def ensure_indexes(self) -> typing.List[str]:
+        """
+        Create indexes for all known access patterns,
+        existing indexes are left untouched. Returns created index names
+        """
+        missing = self.get_missing_indexes()
+        created = []
+        for collection_name, keys, unique in missing:
+            created.append(
+                getattr(self.db, collection_name).create_index(
+                    keys, unique=unique
+                )
+            )
+        return created
+
+    def get_missing_indexes(self) -> typing.List[typing.Tuple[str, list, bool]]:
+        """
+        (collection, keys, unique) of indexes defined in INDEXES
+        which don't exist in DB yet
+        """
+        missing = []
+        for collection_name, indexes in INDEXES.items():
+            existing = [
+                [tuple(key) for key in info["key"]]
+                for info in getattr(self.db, collection_name).index_information().values()
+            ]
+            for keys, unique in indexes:
+                if keys not in existing:
+                    missing.append((collection_name, keys, unique))
+        return missing
+
+    def get_collection_scans(self) -> typing.List[typing.Tuple[str, dict]]:
+        """
+        (collection, filter) of QUERY_PATTERNS resolved with full collection scan
+        """
+        result = []
+        for collection_name, query, sort in QUERY_PATTERNS:
+            cursor = getattr(self.db, collection_name).find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = cursor.explain()["queryPlanner"]["winningPlan"]
+            if "COLLSCAN" in iter_plan_stages(plan):
+                result.append((collection_name, query))
+        return result
 
     def get_user(self, username):
         return self.db.user.find_one({"username": username})
@@ -495,12 +1158,51 @@ class DataStoreMongo:
         self.db.map.update({"map_name": map_name}, {"$set": info}, upsert=True)
 
     def drop_match_info(self, match_guid):
+        self.drop_player_careers({"match_guid": match_guid})
+        self.drop_player_rollups({"match_guid": match_guid})
         skip = ["user", "map", "player_merge"]
         for name in self.db.list_collection_names():
             if name in skip:
                 continue
             c = pymongo.collection.Collection(self.db, name)
             c.delete_many({"match_guid": match_guid})
+        self.bump_data_generation()
+
+    def drop_matches_info(self, match_guids: typing.List[str]):
+        self.drop_player_careers({"match_guid": {"$in": match_guids}})
+        self.drop_player_rollups({"match_guid": {"$in": match_guids}})
+        skip = ["user", "map", "player_merge"]
+        for name in self.db.list_collection_names():
+            if name in skip:
+                continue
+            c = pymongo.collection.Collection(self.db, name)
+            c.delete_many({"match_guid": {"$in": match_guids}})
+        self.bump_data_generation()
+
+    def get_match_fingerprints(self) -> typing.Dict[str, dict]:
+        """
+        Fingerprint of analysis inputs for every stored match
+        {match_guid: {match_guid, checksum, analyzer_version}}
+        """
+        return {
+            e["match_guid"]: e
+            for e in self.db.match_fingerprint.find({}, {"_id": 0})
+        }
+
+    def store_match_fingerprints(self, fingerprints: typing.List[dict]):
+        if not fingerprints:
+            return
+
+        self.db.match_fingerprint.bulk_write(
+            [
+                pymongo.ReplaceOne(
+                    {"match_guid": fingerprint["match_guid"]},
+                    fingerprint,
+                    upsert=True,
+                )
+                for fingerprint in fingerprints
+            ]
+        )
 
     def get_player_kills(self, player_id):
         res = self.db.kill.find({"killer_id": player_id})
@@ -511,18 +1213,12 @@ class DataStoreMongo:
         return self.strip_id(res or [])
 
     def get_player_badges(self, player_id):
-        res = self.db.badge.aggregate(
-            [
-                {"$match": {"player_id": player_id}},
-                {
-                    "$group": {
-                        "_id": {"name": "$name", "player_id": "$player_id"},
-                        "count": {"$sum": "$count"},
-                    }
-                },
-            ]
-        )
+        career = self.get_player_career(player_id)
+        if not career:
+            return []
+
         return [
-            {"name": entry["_id"]["name"], "count": entry["count"]}
-            for entry in res
+            {"name": name, "count": count}
+            for name, count in career.get("badges", {}).items()
+            if count
         ]
@@ -43,6 +43,13 @@ class HealthInfo:
         else:
             return self.WARN, "Data dir is not configured"
 
+    def check_settings_upload_spool_dir(self):
+        spool_dir = get_conf_val("UPLOAD_SPOOL_DIR")
+        if spool_dir:
+            return self.OK, spool_dir
+        else:
+            return self.WARN, "Upload spool dir is not configured, uploads are disabled"
+
     def check_webapp_loadable(self):
         from quakestats.web import app  # noqa
 
@@ -55,12 +62,43 @@ class HealthInfo:
         else:
             return self.ERROR, str(result)
 
+    def check_db_indexes(self):
+        missing = self.ctx.ds.get_missing_indexes()
+        if missing:
+            return self.WARN, "Missing indexes (run ensure-indexes): {}".format(
+                ", ".join(f"{name} {keys}" for name, keys, _ in missing)
+            )
+        else:
+            return self.OK, "All indexes present"
+
+    def check_db_query_plans(self):
+        scans = self.ctx.ds.get_collection_scans()
+        if scans:
+            return self.WARN, "Collection scans: {}".format(
+                ", ".join(f"{name} {query}" for name, query in scans)
+            )
+        else:
+            return self.OK, "No collection scans"
+
+    def check_db_migrations(self):
+        pending = self.ctx.ds.get_pending_migrations()
+        if pending:
+            return self.WARN, "Pending migrations (run migrate-db): {}".format(
+                ", ".join(pending)
+            )
+        else:
+            return self.OK, "All migrations done"
+
     def run(self):
         for key, check in {
             "app -> version": self.check_version,
             "settings -> env var": self.check_quakestats_var,
             "settings -> RAW_DATA_DIR": self.check_settings_data_dir,
+            "settings -> UPLOAD_SPOOL_DIR": self.check_settings_upload_spool_dir,
             "db -> ping": self.check_db_access,
+            "db -> indexes": self.check_db_indexes,
+            "db -> query plans": self.check_db_query_plans,
+            "db -> migrations": self.check_db_migrations,
             "webapp -> loadable": self.check_webapp_loadable,
         }.items():
             try:
@@ -1,5 +1,26 @@
 import logging
+import queue
+import threading
+import time
+from collections import (
+    deque,
+    namedtuple,
+)
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+)
+from functools import (
+    partial,
+)
+from itertools import (
+    islice,
+)
 from typing import (
+    Any,
+    Callable,
+    Iterable,
     Iterator,
     List,
     Optional,
@@ -12,6 +33,9 @@ from quakestats.core.game.qlmatch import (
 from quakestats.core.q3parser.api import (
     Q3ParserAPI,
 )
+from quakestats.core.q3parser.splitter import (
+    Q3GameLog,
+)
 from quakestats.core.q3toql.api import (
     Q3toQLAPI,
     QuakeGame,
@@ -23,6 +47,12 @@ from quakestats.core.qlparser.api import (
     QLFeed,
     QLParserAPI,
 )
+from quakestats.core.qlparser.splitter import (
+    QLGameLog,
+)
+from quakestats.core.qlparser.spool import (
+    QLEventSpool,
+)
 from quakestats.core.wh import (
     Warehouse,
     WarehouseItem,
@@ -33,6 +63,9 @@ from quakestats.dataprovider import (
 from quakestats.dataprovider.analyze import (
     AnalysisResult,
 )
+from quakestats.dataprovider.analyzer.columnar import (
+    ColumnarEvents,
+)
 from quakestats.datasource.entities import (
     Q3Match,
 )
@@ -42,6 +75,159 @@ from quakestats.system.context import (
 
 logger = logging.getLogger(__name__)
 
+# number of game logs checked against DB with a single query
+DEDUP_BATCH_SIZE = 200
+
+Q3GameAnalysis = namedtuple('Q3GameAnalysis', ['fmi', 'report', 'error'])
+# report is None when the item was not changed or the game is not valid
+WarehouseAnalysis = namedtuple('WarehouseAnalysis', ['fingerprint', 'report', 'changed'])
+
+
+def create_full_match_info(game: QuakeGame, server_domain: str) -> FullMatchInfo:
+    return FullMatchInfo(
+        events=game.get_events(),
+        match_guid=game.game_guid,
+        duration=game.metadata.duration,
+        start_date=game.metadata.start_date,
+        finish_date=game.metadata.finish_date,
+        server_domain=server_domain,
+        source=game.source,
+    )
+
+
+def analyze_q3_game_log(game_log: Q3GameLog, server_domain: str) -> Optional[Q3GameAnalysis]:
+    """
+    Parse, transform and analyze single Q3 game log.
+    Executed in worker processes so the result has to be picklable.
+    Returns None when the game is not valid (e.g. warmup, too short)
+    """
+    ql_game = Q3toQLAPI().transform_game_log(game_log)
+    if not ql_game.is_valid or ql_game.metadata.duration < 60:
+        return None
+
+    fmi = create_full_match_info(ql_game, server_domain)
+    try:
+        report = detach_report(analyze.Analyzer().analyze(fmi))
+    except Exception as e:
+        logger.exception(e)
+        report = None
+        error = e
+    else:
+        error = None
+
+    # events are already consumed by the analyzer
+    fmi.events = None
+    return Q3GameAnalysis(fmi, report, error)
+
+
+def create_ql_game(game_log: QLGameLog) -> QLGame:
+    game = QLGame()
+    for ev in game_log.events:
+        game.add_event(ev['__recv_timestamp'], ev)
+    return game
+
+
+def load_game_from_wh(wh_item: WarehouseItem) -> QuakeGame:
+    """Loads QL or Q3 game from WH
+    Following formats are supported:
+    - q3 log - new format (header + data)
+    - q3 log - old format (data)
+    - ql log - new format (header + json)
+
+    Q3 Game is transformed to QL
+    QL Game representation is returned
+    """
+    if not wh_item.data:
+        raise Exception("WH item was not read")
+
+    lines = wh_item.data.splitlines()
+    qlparser = QLParserAPI()
+
+    if qlparser.is_log_from_ql(lines[0]):
+        game_log = qlparser.load_game_log(lines)
+        game = create_ql_game(game_log)
+    else:
+        # identifier and create date are needed for old warehouse items when only OSP was supported
+        game_log = Q3GameLog.deserialize(lines, wh_item.identifier, wh_item.create_date)
+        game = Q3toQLAPI().transform_game_log(game_log)
+
+    return game
+
+
+def analyze_wh_item(
+    wh_item: WarehouseItem, warehouse: Warehouse, server_domain: str,
+    analyzer_version: str, known_fingerprint: Optional[dict] = None,
+) -> WarehouseAnalysis:
+    """
+    Read, load and analyze single warehouse item.
+    Executed in worker processes during rebuild so the result has to be picklable.
+    Analysis is skipped when the item fingerprint (file checksum + analyzer version)
+    equals :known_fingerprint
+    """
+    warehouse.read_item(wh_item)
+    fingerprint = {
+        "match_guid": wh_item.identifier,
+        "checksum": wh_item.checksum,
+        "analyzer_version": analyzer_version,
+    }
+    if fingerprint == known_fingerprint:
+        return WarehouseAnalysis(fingerprint, None, False)
+
+    logger.info("Processing file %s", wh_item.path)
+    game = load_game_from_wh(wh_item)
+    if not game.is_valid:
+        logger.info("Game %s ignored", game.game_guid)
+        return WarehouseAnalysis(fingerprint, None, True)
+
+    fmi = create_full_match_info(game, server_domain)
+    fmi.events = ColumnarEvents.from_events(fmi.events)
+    report = detach_report(analyze.Analyzer().analyze(fmi))
+    return WarehouseAnalysis(fingerprint, report, True)
+
+
+def _analyze_wh_task(task: Tuple[WarehouseItem, Optional[dict]], *args) -> WarehouseAnalysis:
+    wh_item, known_fingerprint = task
+    return analyze_wh_item(wh_item, *args, known_fingerprint=known_fingerprint)
+
+
+def analyze_ql_game_log(data: str, server_domain: str) -> Optional[AnalysisResult]:
+    """
+    Analyze serialized QL game log, executed in worker processes.
+    Returns None when the game is not valid
+    """
+    game = create_ql_game(QLParserAPI().load_game_log(data.splitlines()))
+    if not game.is_valid:
+        return None
+
+    logger.info(f"Got valid game {game.game_guid}")
+    fmi = create_full_match_info(game, server_domain)
+    fmi.events = ColumnarEvents.from_events(fmi.events)
+    return detach_report(analyze.Analyzer().analyze(fmi))
+
+
+def detach_report(report: AnalysisResult) -> AnalysisResult:
+    # defaultdicts with lambda factories can't be pickled
+    report.final_scores = dict(report.final_scores)
+    report.special_scores = dict(report.special_scores)
+    return report
+
+
+def iter_bounded(
+    executor: Executor, fn: Callable, items: Iterable[Any], window: int, *args
+) -> Iterator[Tuple[Any, Future]]:
+    """
+    Similar to executor.map but consumes :items lazily and keeps
+    at most :window items in flight. Yields (item, future) in input order
+    """
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(fn, item, *args)))
+        if len(pending) >= window:
+            yield pending.popleft()
+
+    while pending:
+        yield pending.popleft()
+
 
 class QSSdk():
     def __init__(self, ctx: SystemContext):
@@ -51,6 +237,8 @@ class QSSdk():
         self.qlparser = QLParserAPI()
         self.warehouse = Warehouse(ctx.config.get("RAW_DATA_DIR", None))
         self.server_domain: str = ctx.config.get("SERVER_DOMAIN")
+        # finished QL games are analyzed synchronously when not set
+        self.ql_pipeline: Optional[QLAnalysisPipeline] = None
 
     def iter_matches(self, latest: Optional[int] = None) -> Iterator[Q3Match]:
         return self.ctx.ds.get_matches_n(latest=latest)
@@ -59,42 +247,142 @@ class QSSdk():
         # TODO what to return here?
         return self.ctx.ds.get_match(match_guid)
 
-    def create_ql_feed(self) -> QLFeed:
-        return self.qlparser.create_feed()
+    def iter_game_logs_known(
+        self, game_logs: Iterable[Q3GameLog]
+    ) -> Iterator[Tuple[Q3GameLog, bool]]:
+        """
+        Yields (game_log, already in DB). Q3 game guid is the checksum
+        of its log, so known games are detected before parsing,
+        with single DB query per DEDUP_BATCH_SIZE games
+        """
+        game_logs = iter(game_logs)
+        while True:
+            batch = list(islice(game_logs, DEDUP_BATCH_SIZE))
+            if not batch:
+                return
+
+            known = self.ctx.ds.get_known_match_guids(
+                list({game_log.identifier for game_log in batch})
+            )
+            for game_log in batch:
+                yield game_log, game_log.identifier in known
+
+    def create_ql_feed(self, spool: Optional[QLEventSpool] = None) -> QLFeed:
+        """
+        Events recorded in :spool (e.g. before collector restart)
+        are replayed into the feed, events of stored games
+        are discarded from it (see feed_ql)
+        """
+        feed = self.qlparser.create_feed()
+        if spool:
+            unfinished = []
+            for event in spool.replay():
+                unfinished.append(event)
+                if self._feed_ql_event(feed, event):
+                    unfinished = []
+
+            spool.reset(unfinished)
+            feed.spool = spool
+            feed.position = spool.mark()
+        return feed
 
     def feed_ql(self, feed: QLFeed, event: dict):
+        """
+        Events have to be recorded in feed.spool (if set)
+        when received, before they are fed
+        """
+        if self.ql_pipeline:
+            match_log = feed.feed(event)
+            if match_log:
+                on_stored = None
+                if feed.spool:
+                    # events fed so far are no longer needed once the game is stored
+                    on_stored = partial(feed.spool.discard, feed.position)
+                self.ql_pipeline.submit(match_log, on_stored)
+
+        elif self._feed_ql_event(feed, event) and feed.spool:
+            # game is stored, its events are no longer needed
+            feed.spool.discard(feed.position)
+
+    def _feed_ql_event(self, feed: QLFeed, event: dict) -> Optional[QLGameLog]:
+        """
+        Returns game log when its last event was fed
+        """
         match_log = feed.feed(event)
         if match_log:
-            game = QLGame()
-            for ev in match_log.events:
-                game.add_event(ev['__recv_timestamp'], ev)
-
+            game = create_ql_game(match_log)
             if game.is_valid:
                 logger.info(f"Got valid game {game.game_guid}")
 
                 if not self.warehouse.has_item(game.game_guid):
                     self.warehouse.save_match_log(game.game_guid, match_log.serialize())
-                self.analyze_and_store(game)
+
+                # may be already stored when events are replayed
+                if self.get_match(game.game_guid):
+                    logger.info("Game %s already in DB", game.game_guid)
+                else:
+                    self.analyze_and_store(game)
+
+        return match_log
+
+    def save_ql_game_log(self, match_guid: str, data: str) -> bool:
+        """
+        Returns True if the game log wasn't in warehouse yet
+        """
+        if self.warehouse.has_item(match_guid):
+            return False
+
+        self.warehouse.save_match_log(match_guid, data)
+        return True
+
+    def store_ql_analysis(self, report: AnalysisResult):
+        """
+        Store QL game analyzed by QLAnalysisPipeline
+        """
+        match_guid = report.match_metadata.match_guid
+        if self.get_match(match_guid):
+            logger.info("Game %s already in DB", match_guid)
+        else:
+            self.store_analysis_report(report)
 
     # TODO This needs further refactoring so all games go through validation (is_valid, duration) condition
-    def process_q3_log(self, raw_data: str, mod_hint: str) -> Tuple[List[FullMatchInfo], List[Exception]]:
+    def process_q3_log(
+        self, raw_data: str, mod_hint: str, workers: Optional[int] = None
+    ) -> Tuple[List[FullMatchInfo], List[Exception], int]:
+        return self.process_q3_log_lines(raw_data.splitlines(), mod_hint, workers)
+
+    def process_q3_log_lines(
+        self, lines: Iterable[str], mod_hint: str, workers: Optional[int] = None
+    ) -> Tuple[List[FullMatchInfo], List[Exception], int]:
+        """
+        Same as process_q3_log but consumes lines lazily (e.g. from an open file)
+        so at most DEDUP_BATCH_SIZE game logs (one deduplication batch)
+        are kept in memory at a time.
+        When :workers is given games are parsed and analyzed in a process pool
+        """
+        if workers:
+            return self._process_q3_log_parallel(lines, mod_hint, workers)
+
         errors: List[Exception] = []
         final_results: List[FullMatchInfo] = []
         skips = 0
 
-        for idx, game_log in enumerate(self.q3parser.split_games(raw_data, mod_hint)):
+        # games stored during this call
+        stored = set()
+        game_logs = self.q3parser.split_games_from_lines(lines, mod_hint)
+
+        for idx, (game_log, known) in enumerate(self.iter_game_logs_known(game_logs)):
             logger.debug("Processing match %s, %s", idx, game_log.identifier)
 
-            # TODO error handling
-            q3_game = self.q3parser.parse_game_log(game_log)
-            ql_game = self.q3toql.transform(q3_game)
-            if not ql_game.is_valid or ql_game.metadata.duration < 60:
-                logger.debug("Game %s ignored", q3_game.identifier)
+            if known or game_log.identifier in stored:
+                logger.debug("Game %s already in DB", game_log.identifier)
+                skips += 1
                 continue
 
-            if self.get_match(ql_game.game_guid):
-                logger.debug("Game %s already in DB", ql_game.game_guid)
-                skips += 1
+            # TODO error handling
+            ql_game = self.q3toql.transform_game_log(game_log)
+            if not ql_game.is_valid or ql_game.metadata.duration < 60:
+                logger.debug("Game %s ignored", game_log.identifier)
                 continue
 
             if not self.warehouse.has_item(ql_game.game_guid):
@@ -103,10 +391,74 @@ class QSSdk():
             try:
                 fmi = self.analyze_and_store(ql_game)
                 final_results.append(fmi)
+                stored.add(ql_game.game_guid)
+            except Exception as e:
+                logger.exception(e)
+                errors.append(e)
+
+        return final_results, errors, skips
+
+    def _process_q3_log_parallel(
+        self, lines: Iterable[str], mod_hint: str, workers: int
+    ) -> Tuple[List[FullMatchInfo], List[Exception], int]:
+        """
+        Games are split here, parsing, transformation and analysis is
+        done by the workers. Deduplication, warehouse and DB writes stay
+        in this process. Results are collected in the input order and
+        the number of in-flight games is bounded to keep memory flat.
+        """
+        errors: List[Exception] = []
+        final_results: List[FullMatchInfo] = []
+        skips = 0
+        seen = set()
+
+        def collect(game_log, future):
+            try:
+                result: Optional[Q3GameAnalysis] = future.result()
+            except Exception as e:
+                logger.exception(e)
+                errors.append(e)
+                return
+
+            if not result:
+                logger.debug("Game %s ignored", game_log.identifier)
+                return
+
+            match_guid = result.fmi.match_guid
+            if not self.warehouse.has_item(match_guid):
+                self.warehouse.save_match_log(match_guid, game_log.serialize())
+
+            if result.error:
+                errors.append(result.error)
+                return
+
+            try:
+                self.store_analysis_report(result.report)
+                final_results.append(result.fmi)
             except Exception as e:
                 logger.exception(e)
                 errors.append(e)
 
+        def iter_new_games():
+            nonlocal skips
+            game_logs = self.q3parser.split_games_from_lines(lines, mod_hint)
+            for idx, (game_log, known) in enumerate(self.iter_game_logs_known(game_logs)):
+                logger.debug("Processing match %s, %s", idx, game_log.identifier)
+
+                if known or game_log.identifier in seen:
+                    logger.debug("Game %s already in DB", game_log.identifier)
+                    skips += 1
+                    continue
+
+                seen.add(game_log.identifier)
+                yield game_log
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for game_log, future in iter_bounded(
+                executor, analyze_q3_game_log, iter_new_games(), workers * 2, self.server_domain
+            ):
+                collect(game_log, future)
+
         return final_results, errors, skips
 
     def analyze_and_store(self, game: QuakeGame) -> FullMatchInfo:
@@ -114,15 +466,7 @@ class QSSdk():
             logger.info("Game %s ignored", game.game_guid)
             return
 
-        fmi = FullMatchInfo(
-            events=game.get_events(),
-            match_guid=game.game_guid,
-            duration=game.metadata.duration,
-            start_date=game.metadata.start_date,
-            finish_date=game.metadata.finish_date,
-            server_domain=self.server_domain,
-            source=game.source,
-        )
+        fmi = create_full_match_info(game, self.server_domain)
 
         analyzer = analyze.Analyzer()
         report = analyzer.analyze(fmi)
@@ -134,44 +478,79 @@ class QSSdk():
         logger.info("Storing game %s in datastore", report.match_metadata.match_guid)
 
     def load_game_from_wh(self, wh_item: WarehouseItem) -> QuakeGame:
-        """Loads QL or Q3 game from WH
-        Following formats are supported:
-        - q3 log - new format (header + data)
-        - q3 log - old format (data)
-        - ql log - new format (header + json)
+        return load_game_from_wh(wh_item)
 
-        Q3 Game is transformed to QL
-        QL Game representation is returned
+    def rebuild_db(
+        self, workers: Optional[int] = None, batch_size: int = 100,
+        incremental: bool = False,
+    ) -> int:
         """
-        if not wh_item.data:
-            raise Exception("WH item was not read")
-
-        lines = wh_item.data.splitlines()
-
-        if self.qlparser.is_log_from_ql(lines[0]):
-            game_log = self.qlparser.load_game_log(lines)
-            game = QLGame()
-            for ev in game_log.events:
-                game.add_event(ev['__recv_timestamp'], ev)
+        Drop all match data and analyze every warehouse item again.
+        In :incremental mode nothing is dropped upfront, only matches whose
+        fingerprint (warehouse file checksum + analyzer version) differs
+        from the stored one are re-analyzed and replaced.
+        Items are analyzed in a process pool when :workers is given,
+        reports are written in batches of :batch_size matches.
+        Returns number of processed warehouse items
+        """
+        if incremental:
+            known_fingerprints = self.ctx.ds.get_match_fingerprints()
+            # databases created before player careers/rollups were introduced
+            self.ctx.ds.migrate()
         else:
-            # identifier and create date are needed for old warehouse items when only OSP was supported
-            raw_game = self.q3parser.load_game_log(lines, wh_item.identifier, wh_item.create_date)
-            game = self.q3toql.transform(raw_game)
-
-        return game
-
-    def rebuild_db(self):
-        self.ctx.ds.prepare_for_rebuild()
+            self.ctx.ds.prepare_for_rebuild()
+            known_fingerprints = {}
+
+        version = analyze.analyzer_version()
+        tasks = [
+            (item, known_fingerprints.get(item.identifier))
+            for item in self.warehouse.iter_matches()
+        ]
+        total = len(tasks)
         counter = 0
-
-        for item in self.warehouse.iter_matches():
-            self.warehouse.read_item(item)
-            logger.info("Processing file %s", item.path)
-
-            game = self.load_game_from_wh(item)
-            self.analyze_and_store(game)
+        changed = 0
+        stored = 0
+        batch: List[WarehouseAnalysis] = []
+        started = time.monotonic()
+
+        def flush():
+            nonlocal stored, batch
+            if batch:
+                if incremental:
+                    self.ctx.ds.drop_matches_info([r.fingerprint["match_guid"] for r in batch])
+
+                reports = [r.report for r in batch if r.report]
+                if reports:
+                    results = self.ctx.ds.store_analysis_reports(reports)
+                    stored += len([r for r in results if r[0]])
+                self.ctx.ds.store_match_fingerprints([r.fingerprint for r in batch])
+                batch = []
+
+            elapsed = time.monotonic() - started
+            logger.info(
+                "Rebuild progress %s/%s items, %s analyzed, %s matches stored, %.1f items/s",
+                counter, total, changed, stored, counter / elapsed if elapsed else 0,
+            )
+
+        def consume(result: WarehouseAnalysis):
+            nonlocal counter, changed
             counter += 1
+            if result.changed:
+                changed += 1
+                batch.append(result)
+            if len(batch) >= batch_size:
+                flush()
+
+        args = (self.warehouse, self.server_domain, version)
+        if workers:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for task, future in iter_bounded(executor, _analyze_wh_task, tasks, workers * 4, *args):
+                    consume(future.result())
+        else:
+            for task in tasks:
+                consume(_analyze_wh_task(task, *args))
 
+        flush()
         self.ctx.ds.post_rebuild()
         return counter
 
@@ -181,3 +560,63 @@ class QSSdk():
 
     def warehouse_iter(self) -> Iterator[WarehouseItem]:
         return self.warehouse.iter_matches()
+
+
+class QLAnalysisPipeline():
+    """
+    Finished QL games are analyzed in process pool,
+    results are stored one by one (in order of submission)
+    by single writer thread.
+    """
+
+    def __init__(self, sdk: QSSdk, workers: int):
+        self.sdk = sdk
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(
+            target=self.write_loop, name="ql-writer", daemon=True
+        )
+        self.writer.start()
+
+    def submit(self, match_log: QLGameLog, on_stored: Optional[Callable] = None):
+        """
+        :on_stored - called by writer when the game was processed
+        """
+        data = match_log.serialize()
+        future = self.executor.submit(
+            analyze_ql_game_log, data, self.sdk.server_domain
+        )
+        self.pending.put((match_log.identifier, data, future, on_stored))
+
+    def write_loop(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+
+            identifier, data, future, on_stored = item
+            try:
+                # saved upfront so the game can be reanalyzed if analysis fails
+                saved = self.sdk.save_ql_game_log(identifier, data)
+                report = future.result()
+                if report:
+                    self.sdk.store_ql_analysis(report)
+                else:
+                    logger.info("Game %s ignored", identifier)
+                    # invalid games are not kept, as in synchronous processing
+                    if saved:
+                        self.sdk.warehouse.delete_item(identifier)
+
+                if on_stored:
+                    on_stored()
+            except Exception as e:
+                logger.error("Failed to process game %s", identifier)
+                logger.exception(e)
+
+    def close(self):
+        """
+        Wait for submitted games to be stored
+        """
+        self.pending.put(None)
+        self.writer.join()
+        self.executor.shutdown()
@@ -0,0 +1,274 @@
+"""
+HTTP response cache for data which doesn't change between
+admin modifications of match data (delete, player merge, rebuild).
+Responses are kept in process LRU, optionally backed by
+a directory shared between processes (see RESPONSE_CACHE_DIR).
+Entries are keyed by shared data generation (changed by admin operations
+of any process) so modified match data is not served from other processes.
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import (
+    OrderedDict,
+)
+from functools import (
+    wraps,
+)
+from typing import (
+    Callable,
+    Hashable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+import flask
+
+logger = logging.getLogger(__name__)
+
+# (body, mimetype, etag)
+CachedResponse = Tuple[bytes, str, str]
+
+
+class LRUBackend():
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+            except KeyError:
+                return None
+            return self.entries[key]
+
+    def set(self, key: str, value: CachedResponse):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DiskBackend():
+    """
+    One json file per key and generation, written atomically.
+    Files of other generations are removed by prune, the number of
+    files is kept under :max_entries (oldest are removed)
+    """
+    # size bound is checked once per number of writes
+    CHECK_INTERVAL = 100
+
+    def __init__(self, directory: str, max_entries: int = 10000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str, generation: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{generation}-{digest}.json")
+
+    def get(self, key: str, generation: str = "0") -> Optional[CachedResponse]:
+        try:
+            with open(self.path(key, generation)) as fh:
+                entry = json.load(fh)
+            if entry["key"] != key:
+                return None
+            return (
+                base64.b64decode(entry["body"]), str(entry["mimetype"]),
+                str(entry["etag"]),
+            )
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Broken cache entry for %s, %s", key, e)
+            return None
+
+    def set(self, key: str, value: CachedResponse, generation: str = "0"):
+        body, mimetype, etag = value
+        entry = {
+            "key": key, "body": base64.b64encode(body).decode("ascii"),
+            "mimetype": mimetype, "etag": etag,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(entry, fh)
+        os.replace(tmp_path, self.path(key, generation))
+
+        self.writes += 1
+        if self.writes % self.CHECK_INTERVAL == 0:
+            self.enforce_limit()
+
+    def iter_entries(self) -> Iterator[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as entries:
+                yield from (e for e in entries if e.name.endswith(".json"))
+        except FileNotFoundError:
+            return
+
+    def remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def prune(self, generation: str):
+        """
+        Remove entries of other generations
+        """
+        for entry in self.iter_entries():
+            if not entry.name.startswith(f"{generation}-"):
+                self.remove(entry.path)
+
+    def enforce_limit(self):
+        entries = []
+        for entry in self.iter_entries():
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.max_entries]:
+                self.remove(path)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+
+class ResponseCache():
+    def __init__(
+        self, maxsize: int = 512, directory: Optional[str] = None,
+        max_age: int = 300, generation: Optional[Callable[[], Hashable]] = None,
+        generation_ttl: float = 5, disk_maxsize: int = 10000,
+    ):
+        """
+        :generation - returns current generation of cached data,
+            entries of previous generations are not used.
+            The value is checked at most once per :generation_ttl seconds
+        """
+        self.memory = LRUBackend(maxsize)
+        self.disk = DiskBackend(directory, disk_maxsize) if directory else None
+        self.max_age = max_age
+        self.generation = generation
+        self.generation_ttl = generation_ttl
+        # (generation, monotonic time of check)
+        self.known_generation: Optional[Tuple[str, float]] = None
+
+    @classmethod
+    def from_config(
+        cls, config, generation: Optional[Callable[[], Hashable]] = None
+    ) -> "ResponseCache":
+        return cls(
+            maxsize=config.get("RESPONSE_CACHE_SIZE", 512),
+            directory=config.get("RESPONSE_CACHE_DIR") or None,
+            max_age=config.get("RESPONSE_CACHE_MAX_AGE", 300),
+            generation=generation,
+            generation_ttl=config.get("RESPONSE_CACHE_GENERATION_TTL", 5),
+            disk_maxsize=config.get("RESPONSE_CACHE_DIR_SIZE", 10000),
+        )
+
+    def current_generation(self) -> str:
+        if self.generation is None:
+            return "0"
+
+        now = time.monotonic()
+        known = self.known_generation
+        if known and now - known[1] < self.generation_ttl:
+            return known[0]
+
+        generation = str(self.generation())
+        self.known_generation = (generation, now)
+        if known and known[0] != generation:
+            logger.info("Data generation changed to %s", generation)
+            self.memory.clear()
+            if self.disk:
+                self.disk.prune(generation)
+        return generation
+
+    def get(self, key: str, generation: str = "0") -> Optional[CachedResponse]:
+        memory_key = f"{generation}:{key}"
+        value = self.memory.get(memory_key)
+        if value is None and self.disk:
+            value = self.disk.get(key, generation)
+            if value is not None:
+                self.memory.set(memory_key, value)
+        return value
+
+    def set(self, key: str, value: CachedResponse, generation: str = "0"):
+        self.memory.set(f"{generation}:{key}", value)
+        if self.disk:
+            self.disk.set(key, value, generation)
+
+    def clear(self):
+        """
+        Drop entries of this process and the shared directory,
+        other processes drop theirs when data generation changes
+        """
+        logger.info("Clearing response cache")
+        self.known_generation = None
+        self.memory.clear()
+        if self.disk:
+            self.disk.clear()
+
+    def cached(self, view: Callable) -> Callable:
+        """
+        Cache successful non empty responses of given view,
+        keyed by request path and query string.
+        Responses get ETag and Cache-Control headers
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = flask.request.full_path
+            generation = self.current_generation()
+            value = self.get(key, generation)
+            if value is None:
+                response = flask.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+                # e.g. null of unknown match, it may be stored later
+                if response.is_json and not response.get_json(silent=True):
+                    return response
+
+                response.add_etag()
+                value = (
+                    response.get_data(), response.mimetype,
+                    response.get_etag()[0],
+                )
+                self.set(key, value, generation)
+
+            body, mimetype, etag = value
+            response = flask.Response(body, mimetype=mimetype)
+            response.set_etag(etag)
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+            return response.make_conditional(flask.request)
+
+        return wrapper
+
+
+def clear_disk_cache(directory: Optional[str]):
+    """
+    Drop responses cached by web app, used by CLI commands
+    modifying stored data. Entries of running web app processes
+    are invalidated by data generation change
+    """
+    if directory:
+        DiskBackend(directory).clear()
@@ -1,10 +1,17 @@
 import logging
+import threading
 from collections import (
     defaultdict,
 )
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
 from functools import (
     wraps,
 )
+from typing import (
+    Optional,
+)
 
 import flask
 
@@ -15,9 +22,15 @@ from quakestats.web.app import (
     app,
     data_store,
     get_sys_ctx,
+    response_cache,
+)
+from quakestats.web.uploads import (
+    UploadQueue,
 )
 
 logger = logging.getLogger("quakestats.webapp")
+# per match collections of match bundle are fetched concurrently
+bundle_executor = ThreadPoolExecutor(max_workers=8)
 
 
 def _sdk():
@@ -50,16 +63,19 @@ def api2_matches_all():
 
 
 @app.route("/api/v2/match/<match_guid>/metadata")
+@response_cache.cached
 def api2_match_metadata(match_guid):
     return flask.jsonify(data_store().get_match_metadata(match_guid))
 
 
 @app.route("/api/v2/match/<match_guid>/players")
+@response_cache.cached
 def api2_match_players(match_guid):
     return flask.jsonify(data_store().get_match_players(match_guid))
 
 
 @app.route("/api/v2/match/<match_guid>/teams")
+@response_cache.cached
 def api2_match_team_lifecycle(match_guid):
     return flask.jsonify(data_store().get_team_lifecycle(match_guid))
 
@@ -70,42 +86,68 @@ def api2_player(player_id):
 
 
 @app.route("/api/v2/match/<match_guid>/score")
+@response_cache.cached
 def api2_match_scores(match_guid):
     return flask.jsonify(data_store().get_match_scores(match_guid))
 
 
 @app.route("/api/v2/match/<match_guid>/special")
+@response_cache.cached
 def api2_match_special(match_guid):
     return flask.jsonify(data_store().get_match_special_scores(match_guid))
 
 
 @app.route("/api/v2/match/<match_guid>/kill")
+@response_cache.cached
 def api2_match_kill(match_guid):
     return flask.jsonify(data_store().get_match_kills(match_guid))
 
 
 @app.route("/api/v2/match/<match_guid>/badge")
+@response_cache.cached
 def api2_match_badge(match_guid):
     return flask.jsonify(data_store().get_match_badges(match_guid))
 
 
 @app.route("/api/v2/match/<match_guid>/player_stats")
+@response_cache.cached
 def api2_match_player_stats(match_guid):
     return flask.jsonify(data_store().get_match_player_stats(match_guid))
 
 
+@app.route("/api/v2/match/<match_guid>/bundle")
+@response_cache.cached
+def api2_match_bundle(match_guid):
+    bundle = data_store().get_match_bundle(match_guid, bundle_executor)
+    if bundle is None:
+        flask.abort(404)
+
+    return flask.jsonify(bundle)
+
+
+def board_range():
+    """
+    (latest, days) board range from request args
+    e.g. ?latest=50 for latest 50 matches, ?days=30 for last 30 days
+    """
+    latest = flask.request.args.get("latest", default=None)
+    days = flask.request.args.get("days", default=None)
+    return (
+        int(latest) if latest else None,
+        int(days) if days else None,
+    )
+
+
 @app.route("/api/v2/board/badges")
 def api2_board_badges():
-    latest = flask.request.args.get("latest", default=None)
-    latest = int(latest) if latest else None
-    return flask.jsonify(data_store().get_badge_sum(latest))
+    latest, days = board_range()
+    return flask.jsonify(data_store().get_badge_sum(latest, days))
 
 
 @app.route("/api/v2/board/total")
 def api2_board_total():
-    latest = flask.request.args.get("latest", default=None)
-    latest = int(latest) if latest else None
-    return flask.jsonify(data_store().get_total_stats(latest))
+    latest, days = board_range()
+    return flask.jsonify(data_store().get_total_stats(latest, days))
 
 
 @app.route("/api/v2/players")
@@ -145,26 +187,64 @@ def api2_map_info():
     return "Bye"
 
 
+def process_upload(stream, mod: str) -> dict:
+    # binary lines are decoded by the splitter
+    final_results, errors, skips = _sdk().process_q3_log_lines(stream, mod)
+    if final_results:
+        # player names may be updated by new matches
+        response_cache.clear()
+
+    return {
+        "ACCEPTED_MATCHES": [r.get_summary() for r in final_results],
+        "ERRORS": [repr(e) for e in errors],
+        "SKIPS": skips,
+    }
+
+
+# created on first use, so importing the module has no side effects
+upload_queue: Optional[UploadQueue] = None
+upload_queue_lock = threading.Lock()
+
+
+def get_upload_queue() -> UploadQueue:
+    global upload_queue
+    with upload_queue_lock:
+        if upload_queue is None:
+            spool_dir = app.config.get("UPLOAD_SPOOL_DIR")
+            if not spool_dir:
+                raise RuntimeError("UPLOAD_SPOOL_DIR is not configured")
+
+            upload_queue = UploadQueue(
+                spool_dir,
+                app.config.get("UPLOAD_WORKERS", 2),
+                process_upload,
+                app.config.get("UPLOAD_RETENTION", 24 * 3600),
+            )
+    return upload_queue
+
+
 @app.route('/api/v2/upload', defaults={'mod': 'osp'}, methods=["POST"])
 @app.route("/api/v2/upload/<string:mod>", methods=["POST"])
 @authenticate
 def api2_upload(mod):
-    # TODO this code should be rewritten
     if "file" not in flask.request.files:
-        raise Exception("No Files")
+        flask.abort(400)
 
-    req_file = flask.request.files["file"]
-    data = req_file.read().decode("utf-8")
+    queue = get_upload_queue()
+    job_id = queue.submit(flask.request.files["file"].stream, mod)
+    return flask.jsonify(queue.get_status(job_id)), 202
 
-    final_results, errors, skips = _sdk().process_q3_log(data, mod)
 
-    return flask.jsonify(
-        {
-            "ACCEPTED_MATCHES": [r.get_summary() for r in final_results],
-            "ERRORS": [repr(e) for e in errors],
-            "SKIPS": skips,
-        }
-    )
+@app.route("/api/v2/upload/<string:job_id>", methods=["GET"])
+def api2_upload_status(job_id):
+    """
+    Job status, ACCEPTED_MATCHES/ERRORS/SKIPS are present once it's DONE
+    """
+    status = get_upload_queue().get_status(job_id)
+    if status is None:
+        flask.abort(404)
+
+    return flask.jsonify(status)
 
 
 @app.route("/api/v2/admin/players/merge", methods=["POST"])
@@ -173,6 +253,7 @@ def api2_admin_players_merge():
     source_id = flask.request.form["source_player_id"]
     target_id = flask.request.form["target_player_id"]
     data_store().merge_players(source_id, target_id)
+    response_cache.clear()
     return "OK"
 
 
@@ -180,6 +261,7 @@ def api2_admin_players_merge():
 @authenticate
 def api2_admin_rebuild():
     counter = _sdk().rebuild_db()
+    response_cache.clear()
     return "Processed {} matches\n".format(counter)
 
 
@@ -190,6 +272,7 @@ def api2_admin_delete():
         return "Bye"
 
     _sdk().delete_match(flask.request.form["match_guid"])
+    response_cache.clear()
     return "OK"
 
 
@@ -222,118 +305,96 @@ def api2_presence(count):
 def api2_total_stats():
     """
     A little bit hacked endpoint to fetch total stats
+    Player numbers come from pre-aggregated player careers
     """
     ds = data_store()
     db = ds.db
-    matches = list(db.match.find(
-        {}, {"_id": 0}
-    ))
+    matches = list(db.match.aggregate([
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "duration": {"$sum": "$duration"},
+        }}
+    ]))
     result = {}
-    result['total_matches'] = len(matches)
-    result['total_time_h'] = sum(m['duration'] for m in matches) / (60*60)
+    result['total_matches'] = matches[0]['count'] if matches else 0
+    result['total_time_h'] = (
+        matches[0]['duration'] if matches else 0
+    ) / (60*60)
     result['total_time_d'] = result['total_time_h'] / 24
 
     all_players = {
         e['id']: e for e in db.player.find({}, {'_id': 0})
     }
+    careers = ds.get_player_careers()
 
-    kills = list(db.kill.find(
-        {}, {'_id': 0}
-    ))
-    non_selfkills = [
-        k for k in kills
-        if k['killer_id'] != 'q3-world' and k['killer_id'] != k['victim_id']
-    ]
-    player_stats = list(db.player_stats.find())
+    total_kills = sum(c.get('kills', 0) for c in careers)
+    total_self_kills = sum(c.get('selfkills', 0) for c in careers)
+    total_games = sum(c.get('games', 0) for c in careers)
+    world = ds.get_player_career('q3-world') or {}
 
-    result['total_matches'] = len(matches)
-    result['total_time_h'] = sum(m['duration'] for m in matches) / (60*60)
-    result['total_time_d'] = result['total_time_h'] / 24
-    result['total_kills'] = len(non_selfkills)
-    result['total_self_kills'] = len([
-        k for k in kills
-        if k['killer_id'] == 'q3-world' or k['killer_id'] == k['victim_id']
-    ])
-    result['world_only_kills'] = len([
-        k for k in kills
-        if k['killer_id'] == 'q3-world'
-    ])
+    result['total_kills'] = total_kills - total_self_kills
+    result['total_self_kills'] = total_self_kills
+    result['world_only_kills'] = world.get('kills', 0)
     result['total_players'] = len(all_players)
-    result['total_player_mandays'] = (len(player_stats) * 15) / (60 * 8)
-    result['total_damage_dealt'] = 0
-    result['total_damage_received'] = 0
-
-    player_matches = {}
-    for player_stat in player_stats:
-        pid = player_stat['player_id']
-        if pid not in player_matches:
-            player_matches[pid] = {
-                'total_games': 0,
-                'player_id': pid,
-                'total_damage_dealt': 0,
-                'total_damage_received': 0,
-                'player_name': None
-            }
-        info = player_matches[pid]
-        info['total_games'] += 1
-        info['total_damage_dealt'] += player_stat['damage_dealt']
-        info['total_damage_received'] += player_stat['damage_taken']
-        info['player_name'] = all_players[pid]['name']
-
-        result['total_damage_dealt'] += player_stat['damage_dealt']
-        result['total_damage_received'] += player_stat['damage_taken']
+    result['total_player_mandays'] = (total_games * 15) / (60 * 8)
+    result['total_damage_dealt'] = sum(
+        c.get('damage_dealt', 0) for c in careers
+    )
+    result['total_damage_received'] = sum(
+        c.get('damage_taken', 0) for c in careers
+    )
+
+    # players with at least one match stats
+    player_matches = [
+        {
+            'total_games': c['games'],
+            'total_damage_dealt': c.get('damage_dealt', 0),
+            'total_damage_received': c.get('damage_taken', 0),
+            'player_name': all_players[c['player_id']]['name'],
+        }
+        for c in careers if c.get('games', 0) > 0
+    ]
 
     result['top10_played_matches'] = sorted([
         (p['total_games'], p['player_name'])
-        for p in player_matches.values()
+        for p in player_matches
     ])[-10:]
     result['top10_played_damage_dealt'] = sorted([
         (p['total_damage_dealt'], p['player_name'])
-        for p in player_matches.values()
+        for p in player_matches
     ])[-10:]
     result['top10_played_damage_received'] = sorted([
         (p['total_damage_received'], p['player_name'])
-        for p in player_matches.values()
+        for p in player_matches
     ])[-10:]
 
-    player_kd = {}
-    for kill in kills:
-        kpid = kill['killer_id']
-        vpid = kill['victim_id']
-
-        kstat = player_kd.setdefault(
-            kpid, {
-                'selfkills': 0, 'kills': 0, 'deaths': 0,
-                'name': all_players[kpid]['name']
-            }
-        )
-        vstat = player_kd.setdefault(
-            vpid, {
-                'selfkills': 0, 'kills': 0, 'deaths': 0,
-                'name': all_players[vpid]['name']
-            }
-        )
-        kstat['kills'] += 1
-        vstat['deaths'] += 1
-
-        if kpid == vpid or kpid == 'q3-world':
-            vstat['selfkills'] += 1
+    # players who killed or died at least once
+    player_kd = [
+        {
+            'selfkills': c.get('selfkills', 0),
+            'kills': c.get('kills', 0),
+            'deaths': c.get('deaths', 0),
+            'name': all_players[c['player_id']]['name'],
+        }
+        for c in careers if c.get('kills', 0) or c.get('deaths', 0)
+    ]
 
     result['top10_kills'] = sorted([
-        (k['kills'], k['name']) for k in player_kd.values()
+        (k['kills'], k['name']) for k in player_kd
     ])[-10:]
     result['top10_deaths'] = sorted([
-        (k['deaths'], k['name']) for k in player_kd.values()
+        (k['deaths'], k['name']) for k in player_kd
     ])[-10:]
 
     result['top10_selfkills'] = sorted([
-        (k['selfkills'], k['name']) for k in player_kd.values()
+        (k['selfkills'], k['name']) for k in player_kd
     ])[-10:]
 
     result['unique_players_2+matches'] = len(
-        [e for e in player_matches.values() if e['total_games'] > 2]
+        [e for e in player_matches if e['total_games'] > 2]
     )
     result['regular_players_15+matches'] = len(
-        [e for e in player_matches.values() if e['total_games'] > 15]
+        [e for e in player_matches if e['total_games'] > 15]
     )
     return flask.jsonify({"matches": result})
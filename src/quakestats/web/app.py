@@ -1,4 +1,5 @@
 import logging
+import threading
 
 from flask import (
     Flask,
@@ -19,6 +20,11 @@ from quakestats.system.context import (
 from quakestats.system.log import (
     configure_logging,
 )
+from quakestats.system.cache import (
+    ResponseCache,
+)
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config.from_envvar(ENV_VAR_NAME)
@@ -26,8 +32,26 @@ app.config.from_envvar(ENV_VAR_NAME)
 mongo_db = PyMongo(app)
 
 
+# indexes are ensured once per process, on first DB access
+indexes_lock = threading.Lock()
+indexes_ensured = False
+
+
 def data_store():
-    return mongo2.DataStoreMongo(mongo_db.db)
+    global indexes_ensured
+    ds = mongo2.DataStoreMongo(mongo_db.db)
+    if not indexes_ensured:
+        with indexes_lock:
+            if not indexes_ensured:
+                for name in ds.ensure_indexes():
+                    logger.info("Created index %s", name)
+                indexes_ensured = True
+    return ds
+
+
+response_cache = ResponseCache.from_config(
+    app.config, generation=lambda: data_store().get_data_generation()
+)
 
 
 def load_stuff():
@@ -58,6 +58,10 @@ class QuakeStatsApi {
         return this.get(`match/${matchId}/player_stats`)
     }
 
+    getMatchBundle(matchId) {
+        return this.get(`match/${matchId}/bundle`)
+    }
+
     getBoardBadges(lastNMatches) {
         if (lastNMatches) {
             return this.get(`board/badges?latest=${lastNMatches}`)
@@ -0,0 +1,181 @@
+"""
+Background processing of uploaded log files.
+Uploads are written to spool directory and processed by a worker pool,
+job status is kept next to the spooled file so it can be read
+by any web app process sharing the spool directory.
+Status files are removed after :retention seconds, jobs interrupted
+by restart of the process are marked as failed on startup.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from concurrent.futures import (
+    ThreadPoolExecutor,
+)
+from typing import (
+    BinaryIO,
+    Callable,
+    Optional,
+)
+
+logger = logging.getLogger(__name__)
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadQueue():
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    FINAL = (DONE, FAILED)
+    # expired files are looked up at most once per interval
+    EXPIRE_INTERVAL = 600
+
+    def __init__(
+        self, spool_dir: str, workers: int,
+        process: Callable[[BinaryIO, str], dict],
+        retention: int = 24 * 3600,
+    ):
+        """
+        :process - called with spooled file object and mod,
+            returns job result payload
+        """
+        self.spool_dir = spool_dir
+        self.process = process
+        self.retention = retention
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="upload"
+        )
+        # identifies process owning unfinished jobs
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.last_expire = 0.0
+        os.makedirs(spool_dir, exist_ok=True)
+        self.fail_interrupted()
+        self.expire()
+
+    def log_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{job_id}.log")
+
+    def status_path(self, job_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{job_id}.json")
+
+    def set_status(self, job_id: str, status: str, **payload):
+        payload = dict(payload, JOB_ID=job_id, STATUS=status)
+        if status not in self.FINAL:
+            payload["OWNER"] = self.owner
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.spool_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(payload, fh)
+        os.replace(tmp_path, self.status_path(job_id))
+
+    def read_status(self, job_id: str) -> Optional[dict]:
+        try:
+            with open(self.status_path(job_id)) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def get_status(self, job_id: str) -> Optional[dict]:
+        if not JOB_ID_RE.match(job_id):
+            return None
+
+        status = self.read_status(job_id)
+        if status:
+            status.pop("OWNER", None)
+        return status
+
+    def iter_job_ids(self):
+        for filename in os.listdir(self.spool_dir):
+            job_id, ext = os.path.splitext(filename)
+            if ext == ".json" and JOB_ID_RE.match(job_id):
+                yield job_id
+
+    def is_owner_alive(self, owner: Optional[str]) -> bool:
+        """
+        Owners running on other hosts are assumed to be alive
+        """
+        hostname, _, pid = (owner or "").rpartition(":")
+        if hostname != socket.gethostname():
+            return bool(owner)
+
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (ValueError, PermissionError):
+            pass
+        return True
+
+    def fail_interrupted(self):
+        """
+        Jobs of processes which are not running anymore won't be finished
+        """
+        for job_id in self.iter_job_ids():
+            status = self.read_status(job_id)
+            if (
+                status and status["STATUS"] not in self.FINAL and
+                not self.is_owner_alive(status.get("OWNER"))
+            ):
+                logger.warning("Upload %s was interrupted", job_id)
+                self.set_status(
+                    job_id, self.FAILED, ERRORS=["Processing interrupted, upload the file again"]
+                )
+                self.remove(self.log_path(job_id))
+
+    def expire(self):
+        """
+        Remove files older than :retention
+        """
+        now = time.time()
+        self.last_expire = now
+        for filename in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, filename)
+            try:
+                expired = now - os.path.getmtime(path) > self.retention
+            except FileNotFoundError:
+                continue
+
+            if expired:
+                logger.info("Removing expired upload file %s", filename)
+                self.remove(path)
+
+    def remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def submit(self, stream: BinaryIO, mod: str) -> str:
+        if time.time() - self.last_expire > self.EXPIRE_INTERVAL:
+            self.expire()
+
+        job_id = uuid.uuid4().hex
+        with open(self.log_path(job_id), "wb") as fh:
+            shutil.copyfileobj(stream, fh)
+
+        self.set_status(job_id, self.QUEUED)
+        self.executor.submit(self.run, job_id, mod)
+        return job_id
+
+    def run(self, job_id: str, mod: str):
+        self.set_status(job_id, self.RUNNING)
+        log_path = self.log_path(job_id)
+        try:
+            with open(log_path, "rb") as fh:
+                payload = self.process(fh, mod)
+            self.set_status(job_id, self.DONE, **payload)
+
+        except Exception as e:
+            logger.exception("Upload %s failed", job_id)
+            self.set_status(job_id, self.FAILED, ERRORS=[repr(e)])
+
+        finally:
+            self.remove(log_path)
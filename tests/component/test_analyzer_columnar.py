@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from quakestats.core.game.qlmatch import (
+    FullMatchInfo,
+)
+from quakestats.core.ql import (
+    QLGame,
+)
+from quakestats.core.q3parser.api import (
+    Q3ParserAPI,
+)
+from quakestats.core.q3toql.api import (
+    Q3toQLAPI,
+)
+from quakestats.core.qlparser.splitter import (
+    QLGameLogSplitter,
+)
+from quakestats.dataprovider.analyze import (
+    Analyzer,
+)
+from quakestats.dataprovider.analyzer.columnar import (
+    ColumnarEvents,
+)
+
+
+def analyze(events, columnar):
+    if columnar:
+        events = ColumnarEvents.from_events(events)
+    fmi = FullMatchInfo(events, 'guid', 900, None, None, 'domain', 'test')
+    report = Analyzer().analyze(fmi)
+    return {
+        'players': {
+            pid: (p.name, p.model) for pid, p in report.players.items()
+        },
+        'scores': report.scores,
+        'final_scores': dict(report.final_scores),
+        'special_scores': dict(report.special_scores),
+        'kills': report.kills,
+        'badges': report.badges,
+        'team_switches': report.team_switches,
+        'player_stats': report.player_stats,
+    }
+
+
+def iter_q3_matches(testdata_loader, filename):
+    raw_data = testdata_loader(filename).read()
+    for game_log in Q3ParserAPI().split_games(raw_data, 'osp'):
+        game = Q3toQLAPI().transform_game_log(game_log)
+        if game.is_valid:
+            yield list(game.get_events())
+
+
+def iter_ql_matches(testdata_loader, filename):
+    splitter = QLGameLogSplitter()
+    for event in json.loads(testdata_loader(filename).read()):
+        match = splitter.add_event(event)
+        if not match:
+            continue
+
+        game = QLGame()
+        for ev in match.events:
+            game.add_event(0, ev)
+        if game.is_valid:
+            yield list(game.get_events())
+
+
+@pytest.mark.parametrize('filename, loader', [
+    ('osp-ffa-1.log', iter_q3_matches),
+    ('osp-ffa-2.log', iter_q3_matches),
+    ('ql-dump-1.log', iter_ql_matches),
+])
+def test_columnar_analysis_same_as_dict(testdata_loader, filename, loader):
+    matches = list(loader(testdata_loader, filename))
+    assert matches
+
+    for events in matches:
+        assert analyze(events, True) == analyze(events, False)
+
+
+def test_columnar_events():
+    events = ColumnarEvents.from_events([
+        {'TYPE': 'MATCH_STARTED', 'DATA': {'TIME': 0}},
+        {'TYPE': 'PLAYER_KILL', 'DATA': {
+            'TIME': 1, 'MOD': 'RAILGUN',
+            'KILLER': {'STEAM_ID': 'A', 'NAME': 'AN'},
+            'VICTIM': {'STEAM_ID': 'B', 'NAME': 'BN'},
+        }},
+        {'TYPE': 'PLAYER_DEATH', 'DATA': {
+            'TIME': 2, 'MOD': 'HURT',
+            'KILLER': {},
+            'VICTIM': {'STEAM_ID': 'A', 'NAME': 'AN'},
+        }},
+        {'TYPE': 'PLAYER_DEATH', 'DATA': {
+            'TIME': 3, 'MOD': 'LAVA',
+            'KILLER': None,
+            'VICTIM': {'STEAM_ID': 'B', 'NAME': 'BN'},
+        }},
+    ])
+
+    assert len(events) == 4
+    assert list(events.players.values) == ['A', 'B', 'q3-world']
+    rows = list(events.iter_rows())
+    assert rows[0] == ('MATCH_STARTED', {'TYPE': 'MATCH_STARTED', 'DATA': {'TIME': 0}})
+    _, kill = rows[1]
+    assert (kill.time, kill.killer_id, kill.victim_id, kill.killer_name, kill.mod) == (
+        1, 'A', 'B', 'AN', 'RAILGUN'
+    )
+    _, death = rows[2]
+    assert (death.killer_id, death.victim_id, death.killer_name, death.mod) == (
+        'q3-world', 'A', None, 'HURT'
+    )
+    _, death = rows[3]
+    assert (death.killer_id, death.victim_id, death.killer_name, death.mod) == (
+        'q3-world', 'B', None, 'LAVA'
+    )
@@ -0,0 +1,34 @@
+import pytest
+
+from quakestats.core.q3parser.api import (
+    Q3ParserAPI,
+)
+from quakestats.core.q3toql.api import (
+    Q3toQLAPI,
+)
+
+
+@pytest.mark.parametrize('filename, mod', [
+    ('osp-ffa-1.log', 'osp'),
+    ('osp-ffa-2.log', 'osp'),
+    ('osp-warmups.log', 'osp'),
+    ('baseq3-warmups.log', 'baseq3'),
+])
+def test_transform_game_log_same_as_parse_and_transform(
+    testdata_loader, filename, mod
+):
+    parser_api = Q3ParserAPI()
+    q3toql_api = Q3toQLAPI()
+    raw_data = testdata_loader(filename).read()
+
+    for game_log in parser_api.split_games(raw_data, mod):
+        expected = q3toql_api.transform(parser_api.parse_game_log(game_log))
+        game = q3toql_api.transform_game_log(game_log)
+
+        assert list(game.get_events()) == list(expected.get_events())
+        assert game.is_valid == expected.is_valid
+        assert game.game_guid == expected.game_guid
+        assert game.metadata.duration == expected.metadata.duration
+        if mod == 'osp':
+            assert game.metadata.start_date == expected.metadata.start_date
+            assert game.metadata.finish_date == expected.metadata.finish_date
@@ -4,6 +4,9 @@ from datetime import (
     timezone,
 )
 
+from quakestats.core.qlparser.raw import (
+    RawQLEvent,
+)
 from quakestats.core.qlparser.splitter import (
     QLGameLog,
     QLGameLogSplitter,
@@ -31,6 +34,24 @@ class TestQLSplitter():
         assert matches[4].identifier == '7ae0e362-3c99-442f-9f3c-f2d2eca37c61'
 
 
+    def test_ql_splitter_raw(self, testdata_loader):
+        data = json.loads(testdata_loader('ql-dump-1.log').read())
+
+        def split(events):
+            splitter = QLGameLogSplitter()
+            return [m for m in map(splitter.add_event, events) if m]
+
+        matches = split(data)
+        raw_matches = split([
+            RawQLEvent(memoryview(json.dumps(event).encode())) for event in data
+        ])
+
+        assert [m.identifier for m in raw_matches] == [m.identifier for m in matches]
+        for match, raw_match in zip(matches, raw_matches):
+            assert json.loads(raw_match.serialize().splitlines()[2]) == match.events
+            assert all(event._decoded is None for event in raw_match.events)
+
+
 class TestQLGameLog():
     def test_serialize(self):
         log = QLGameLog(datetime(2020, 10, 5, 22, 11, tzinfo=timezone.utc), 'identifier123')
@@ -1,6 +1,12 @@
 import os
 import pytest
 
+# modules which load config on import (e.g. sdk, web) need it
+os.environ.setdefault(
+    'QUAKESTATS_SETTINGS',
+    os.path.join(os.path.dirname(__file__), '..', 'examples', 'settings.py'),
+)
+
 @pytest.fixture(scope='session')
 def testdata_loader():
     class Loader():
@@ -104,3 +104,17 @@ class TestAnalyzer(object):
         assert stats['damage_dealt'] == 55
         assert stats['damage_taken'] == 155
         assert stats['weapons'] == {'S': 100, 'H': 15, 'K': None, 'D': None}
+
+
+def test_analyzer_version():
+    version = analyze.analyzer_version()
+    assert version == analyze.analyzer_version()
+
+    def dummy_badge(badger):
+        pass
+
+    analyze.badger_handlers.append(dummy_badge)
+    try:
+        assert analyze.analyzer_version() != version
+    finally:
+        analyze.badger_handlers.remove(dummy_badge)
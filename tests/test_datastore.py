@@ -1,5 +1,7 @@
 import pytest
 import pymongo
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from quakestats.datasource import mongo2
 from unittest import mock
 
@@ -25,7 +27,7 @@ class TestDataStoreMongo():
         md.map_name = 'map1'
         md.score_limit = 1000
         md.server_name = 'sv_name'
-        md.start_date = 1
+        md.start_date = datetime(2020, 1, 1, 12)
         md.time_limit = 100
         report.players = {}
         for i in ['1']:
@@ -56,6 +58,7 @@ class TestDataStoreMongo():
             {'player_id': 'p1', 'damage_dealt': 123},
             {'player_id': 'p2', 'damage_dealt': 125},
         ]
+        report.badges = [('WIN_GOLD', 'p1', 1)]
         report.summary = 'dummy_summary'
         return report
 
@@ -92,7 +95,7 @@ class TestDataStoreMongo():
             'game_type': 'FFA',
             'map_name': 'map1',
             'server_name': 'sv_name',
-            'start_date': 1,
+            'start_date': datetime(2020, 1, 1, 12),
             'time_limit': 100,
             'score_limit': 1000,
             'summary': 'dummy_summary',
@@ -150,6 +153,310 @@ class TestDataStoreMongo():
             {'player_id': 'p2', 'damage_dealt': 125, "match_guid": 'match_guid'},  # noqa
         ])
 
+    def test_store_analysis_reports(self, ds, report, stored_switches):
+        other = mock.Mock()
+        other.match_metadata.match_guid = 'in_db'
+        ds.db.match.find.return_value = [{'match_guid': 'in_db'}]
+
+        res = ds.store_analysis_reports([report, other, report])
+
+        assert res == [
+            (True, 'match_guid'), (False, 'in_db'), (False, 'match_guid'),
+        ]
+        ds.db.match.find.assert_called_with(
+            {'match_guid': {'$in': ['match_guid', 'in_db', 'match_guid']}},
+            {'match_guid': 1},
+        )
+        ds.db.match.insert_many.assert_called_once_with(
+            [ds.build_match(report)], ordered=False
+        )
+        ds.db.team_switch.insert_many.assert_called_once_with(
+            stored_switches, ordered=False
+        )
+        ds.db.kill.insert_many.assert_called_once_with(
+            ds.build_kills(report), ordered=False
+        )
+        ds.db.player.bulk_write.assert_called_once_with(
+            ds.build_players(report)
+        )
+        ds.db.player_career.bulk_write.assert_called_once_with(
+            ds.build_player_careers(ds.build_career_increments(
+                ds.build_kills(report), ds.build_player_stats(report),
+                ds.build_badges(report),
+            ))
+        )
+
+    def test_store_analysis_reports_rollups(self, ds, report):
+        ds.db.match.find.return_value = []
+        ds.store_analysis_reports([report])
+
+        operations = ds.db.player_rollup.bulk_write.call_args[0][0]
+        assert pymongo.UpdateOne(
+            {'period': 'day', 'bucket': datetime(2020, 1, 1), 'player_id': '88fdc96e8804eaa084d740f8'},
+            {'$inc': {'kills': 2}}, upsert=True,
+        ) in operations
+        assert pymongo.UpdateOne(
+            {'period': 'week', 'bucket': datetime(2019, 12, 30), 'player_id': 'p1'},
+            {'$inc': {'badges.WIN_GOLD': 1}}, upsert=True,
+        ) in operations
+        assert len(operations) == 2 * 6
+
+    def test_rollup_filter(self):
+        # wednesday
+        assert mongo2.rollup_filter(datetime(2020, 1, 1, 15)) == {'$or': [
+            {'period': 'day', 'bucket': {'$gte': datetime(2020, 1, 1), '$lt': datetime(2020, 1, 6)}},
+            {'period': 'week', 'bucket': {'$gte': datetime(2020, 1, 6)}},
+        ]}
+        # monday, no day buckets needed
+        assert mongo2.rollup_filter(datetime(2020, 1, 6)) == {'$or': [
+            {'period': 'day', 'bucket': {'$gte': datetime(2020, 1, 6), '$lt': datetime(2020, 1, 6)}},
+            {'period': 'week', 'bucket': {'$gte': datetime(2020, 1, 6)}},
+        ]}
+
+    def test_get_latest_stats(self, ds):
+        ds.db.match.find().sort().limit.return_value = [
+            {'match_guid': 'm3', 'start_date': datetime(2020, 1, 3, 10)},
+            {'match_guid': 'm2', 'start_date': datetime(2020, 1, 2, 20)},
+            {'match_guid': 'm1', 'start_date': datetime(2020, 1, 2, 10)},
+        ]
+        ds.db.player_rollup.find.return_value = [
+            {'period': 'day', 'bucket': datetime(2020, 1, 3), 'player_id': 'p1',
+             'kills': 2, 'deaths': 1, 'badges': {'DEATH': 1}},
+        ]
+        ds.db.kill.find.return_value = [{'killer_id': 'p1', 'victim_id': 'p2'}]
+        ds.db.badge.find.return_value = [{'player_id': 'p2', 'name': 'DEATH', 'count': 1}]
+
+        stats = ds.get_latest_stats(3)
+
+        assert stats == {
+            'p1': {'kills': 3, 'deaths': 1, 'badges.DEATH': 1},
+            'p2': {'deaths': 1, 'badges.DEATH': 1},
+        }
+        ds.db.player_rollup.find.assert_called_with(
+            mongo2.rollup_filter(datetime(2020, 1, 3)), {'_id': 0}
+        )
+        # only matches of the oldest day are read from documents
+        ds.db.kill.find.assert_called_with(
+            {'match_guid': {'$in': ['m2', 'm1']}}, {'killer_id': 1, 'victim_id': 1}
+        )
+        assert ds.get_badge_sum(3) == [
+            {'name': 'DEATH', 'player_id': 'p1', 'count': 1},
+            {'name': 'DEATH', 'player_id': 'p2', 'count': 1},
+        ]
+
+    def test_build_career_increments(self, ds):
+        increments = ds.build_career_increments(
+            [
+                {'killer_id': 'p1', 'victim_id': 'p2'},
+                {'killer_id': 'p1', 'victim_id': 'p1'},
+                {'killer_id': 'q3-world', 'victim_id': 'p2'},
+            ],
+            [{'player_id': 'p1', 'damage_dealt': 10, 'damage_taken': 5}],
+            [{'player_id': 'p2', 'name': 'DEATH', 'count': 2}],
+            sign=-1,
+        )
+        assert increments == {
+            'p1': {
+                'kills': -2, 'deaths': -1, 'selfkills': -1,
+                'games': -1, 'damage_dealt': -10, 'damage_taken': -5,
+            },
+            'p2': {'deaths': -2, 'selfkills': -1, 'badges.DEATH': -2},
+            'q3-world': {'kills': -1},
+        }
+        assert ds.build_player_careers({'p2': increments['p2']}) == [
+            pymongo.UpdateOne(
+                {'player_id': 'p2'},
+                {'$inc': {'deaths': -2, 'selfkills': -1, 'badges.DEATH': -2}},
+                upsert=True,
+            )
+        ]
+
+    def test_drop_match_info_updates_careers(self, ds):
+        ds.db.list_collection_names.return_value = []
+        ds.db.kill.find.return_value = [{'match_guid': 'match_guid', 'killer_id': 'p1', 'victim_id': 'p2'}]
+        ds.db.player_stats.find.return_value = []
+        ds.db.badge.find.return_value = []
+        ds.db.match.find.return_value = [{'match_guid': 'match_guid', 'start_date': datetime(2020, 1, 1, 12)}]
+
+        ds.drop_match_info('match_guid')
+
+        ds.db.kill.find.assert_any_call(
+            {'match_guid': 'match_guid'}, {'killer_id': 1, 'victim_id': 1}
+        )
+        ds.db.player_career.bulk_write.assert_called_once_with([
+            pymongo.UpdateOne({'player_id': 'p1'}, {'$inc': {'kills': -1}}, upsert=True),
+            pymongo.UpdateOne({'player_id': 'p2'}, {'$inc': {'deaths': -1}}, upsert=True),
+        ])
+        ds.db.match.find.assert_called_with(
+            {'match_guid': 'match_guid'}, {'match_guid': 1, 'start_date': 1}
+        )
+        ds.db.player_rollup.bulk_write.assert_called_once_with([
+            pymongo.UpdateOne(
+                {'period': 'day', 'bucket': datetime(2020, 1, 1), 'player_id': 'p1'},
+                {'$inc': {'kills': -1}}, upsert=True),
+            pymongo.UpdateOne(
+                {'period': 'day', 'bucket': datetime(2020, 1, 1), 'player_id': 'p2'},
+                {'$inc': {'deaths': -1}}, upsert=True),
+            pymongo.UpdateOne(
+                {'period': 'week', 'bucket': datetime(2019, 12, 30), 'player_id': 'p1'},
+                {'$inc': {'kills': -1}}, upsert=True),
+            pymongo.UpdateOne(
+                {'period': 'week', 'bucket': datetime(2019, 12, 30), 'player_id': 'p2'},
+                {'$inc': {'deaths': -1}}, upsert=True),
+        ])
+
+    def test_refresh_player_careers(self, ds):
+        ds.db.kill.aggregate.side_effect = [
+            [{'_id': 'p1', 'kills': 3}],
+            [{'_id': 'p1', 'deaths': 2, 'selfkills': 1}],
+        ]
+        ds.db.player_stats.aggregate.return_value = []
+        ds.db.badge.aggregate.return_value = [
+            {'_id': {'name': 'DEATH', 'player_id': 'p1'}, 'count': 4},
+        ]
+
+        ds.refresh_player_careers(['p1', 'p2'])
+
+        ds.db.player_career.bulk_write.assert_called_once_with([
+            pymongo.ReplaceOne({'player_id': 'p1'}, {
+                'player_id': 'p1', 'kills': 3, 'deaths': 2, 'selfkills': 1,
+                'damage_dealt': 0, 'damage_taken': 0, 'games': 0,
+                'badges': {'DEATH': 4},
+            }, upsert=True),
+            pymongo.DeleteOne({'player_id': 'p2'}),
+        ])
+
+    def test_data_generation(self, ds):
+        ds.db.data_generation.find_one.return_value = None
+        assert ds.get_data_generation() == 0
+        ds.db.data_generation.find_one.return_value = {'generation': 3}
+        assert ds.get_data_generation() == 3
+
+        ds.db.match.find.return_value = [{'match_guid': 'match_guid'}]
+        report = mock.Mock()
+        report.match_metadata.match_guid = 'match_guid'
+        ds.store_analysis_reports([report])
+        ds.db.data_generation.update_one.assert_not_called()
+
+        ds.db.list_collection_names.return_value = []
+        ds.db.kill.find.return_value = []
+        ds.db.player_stats.find.return_value = []
+        ds.db.badge.find.return_value = []
+        ds.drop_match_info('match_guid')
+        ds.db.data_generation.update_one.assert_called_once_with(
+            {'_id': 'data'}, {'$inc': {'generation': 1}}, upsert=True
+        )
+
+    def test_migrate(self, ds):
+        ds.db.migration.find_one.return_value = None
+        ds.db.kill.distinct.return_value = ['p1']
+        ds.db.player_stats.distinct.return_value = []
+        ds.db.badge.distinct.return_value = []
+        ds.db.match.find.return_value = [{'match_guid': 'm1'}]
+        ds.refresh_player_careers = mock.Mock()
+        ds.build_stored_rollup_increments = mock.Mock(return_value={})
+
+        # careers/rollups created by matches stored after upgrade don't count
+        ds.db.player_career.find_one.return_value = {'player_id': 'p2'}
+        ds.db.player_rollup.find_one.return_value = {'player_id': 'p2'}
+        assert ds.migrate() == ['player_career', 'player_rollup']
+
+        ds.refresh_player_careers.assert_called_once_with(['p1'])
+        ds.db.player_rollup.delete_many.assert_called_once_with({})
+        ds.build_stored_rollup_increments.assert_called_once_with(
+            {'match_guid': {'$in': ['m1']}}
+        )
+        ds.db.migration.update_one.assert_any_call(
+            {'name': 'player_rollup'}, mock.ANY, upsert=True
+        )
+
+        ds.db.migration.find_one.return_value = {'name': 'done'}
+        assert ds.migrate() == []
+        assert ds.get_pending_migrations() == []
+        ds.refresh_player_careers.assert_called_once()
+
+    def test_get_latest_stats_not_migrated(self, ds):
+        ds.db.migration.find_one.return_value = None
+        ds.db.match.find().sort().limit.return_value = [
+            {'match_guid': 'm1', 'start_date': datetime(2020, 1, 2, 10)},
+        ]
+        ds.db.kill.find.return_value = [{'killer_id': 'p1', 'victim_id': 'p2'}]
+        ds.db.badge.find.return_value = []
+
+        assert ds.get_latest_stats(3) == {'p1': {'kills': 1}, 'p2': {'deaths': 1}}
+        ds.db.player_rollup.find.assert_not_called()
+
+    def test_get_player_badges(self, ds):
+        ds.db.player_career.find_one.return_value = {
+            'player_id': 'p1', 'badges': {'DEATH': 3, 'WIN_GOLD': 0},
+        }
+        assert ds.get_player_badges('p1') == [{'name': 'DEATH', 'count': 3}]
+        ds.db.player_career.find_one.assert_called_with({'player_id': 'p1'}, {'_id': 0})
+
+        ds.db.player_career.find_one.return_value = None
+        assert ds.get_player_badges('p1') == []
+
+    def test_get_total_stats(self, ds):
+        ds.db.player_career.find.return_value = [
+            {'player_id': 'p1', 'kills': 150, 'deaths': 20},
+            {'player_id': 'p2', 'kills': 50, 'deaths': 120},
+        ]
+        assert ds.get_total_stats() == {
+            'kills': [{'player_id': 'p1', 'total': 150}],
+            'deaths': [{'player_id': 'p2', 'total': 120}],
+        }
+
+    def test_ensure_indexes(self, ds):
+        ds.db.match.index_information.return_value = {
+            '_id_': {'key': [('_id', 1)]},
+            'match_guid_1': {'key': [('match_guid', 1)]},
+        }
+        ds.db.match_fingerprint.index_information.return_value = {}
+        ds.db.match.create_index.return_value = 'start_date_-1'
+        ds.db.match_fingerprint.create_index.return_value = 'match_guid_1'
+
+        indexes = {
+            'match': mongo2.INDEXES['match'],
+            'match_fingerprint': mongo2.INDEXES['match_fingerprint'],
+        }
+        with mock.patch.object(mongo2, 'INDEXES', indexes):
+            assert ds.ensure_indexes() == ['start_date_-1', 'match_guid_1']
+        ds.db.match.create_index.assert_called_once_with(
+            [('start_date', pymongo.DESCENDING)], unique=False,
+        )
+        ds.db.match_fingerprint.create_index.assert_called_once_with(
+            [('match_guid', pymongo.ASCENDING)], unique=True,
+        )
+
+    def test_get_collection_scans(self, ds):
+        ds.db.match.find().sort().explain.return_value = {
+            'queryPlanner': {'winningPlan': {
+                'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'},
+            }},
+        }
+        ds.db.kill.find().explain.return_value = {
+            'queryPlanner': {'winningPlan': {
+                'stage': 'SORT', 'inputStage': {
+                    'stage': 'OR', 'inputStages': [
+                        {'stage': 'IXSCAN'}, {'stage': 'COLLSCAN'},
+                    ],
+                },
+            }},
+        }
+        patterns = [
+            ('match', {}, [('start_date', -1)]),
+            ('kill', {'killer_id': ''}, None),
+        ]
+        with mock.patch.object(mongo2, 'QUERY_PATTERNS', patterns):
+            assert ds.get_collection_scans() == [('kill', {'killer_id': ''})]
+
+    def test_get_known_match_guids(self, ds):
+        ds.db.match.find.return_value = [{'match_guid': 'm1'}]
+        assert ds.get_known_match_guids(['m1', 'm2']) == {'m1'}
+        ds.db.match.find.assert_called_once_with(
+            {'match_guid': {'$in': ['m1', 'm2']}}, {'match_guid': 1, '_id': 0}
+        )
+
     def test_get_matches(self, ds):
         ds.db.match.find().sort.return_value = [
             {'match_guid': 1, '_id': 1},
@@ -163,6 +470,33 @@ class TestDataStoreMongo():
             {'match_guid': 2}
         ]
 
+    def test_get_match_bundle(self, ds, stored_switches):
+        def documents(docs):
+            return lambda *args: [dict(doc, _id=1) for doc in docs]
+
+        ds.db.match.find_one.return_value = {'match_guid': 'match_guid', '_id': 1}
+        ds.db.team_switch.find.side_effect = documents(stored_switches)
+        ds.db.player.find.side_effect = documents([{'id': 'p1'}])
+        for collection in ['score', 'special_score', 'kill', 'badge', 'player_stats']:
+            getattr(ds.db, collection).find.side_effect = documents([{'match_guid': 'match_guid'}])
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            bundle = ds.get_match_bundle('match_guid', executor)
+
+        assert bundle == {
+            'metadata': {'match_guid': 'match_guid'},
+            'players': [{'id': 'p1'}],
+            'teams': stored_switches,
+            'score': [{'match_guid': 'match_guid'}],
+            'special': [{'match_guid': 'match_guid'}],
+            'kill': [{'match_guid': 'match_guid'}],
+            'badge': [{'match_guid': 'match_guid'}],
+            'player_stats': [{'match_guid': 'match_guid'}],
+        }
+
+        ds.db.match.find_one.return_value = None
+        assert ds.get_match_bundle('match_guid') is None
+
     def test_get_match_players(self, ds, stored_switches):
         ds.db.team_switch.find.return_value = stored_switches
         ds.db.player.find.return_value = []
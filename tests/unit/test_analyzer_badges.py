@@ -300,3 +300,22 @@ class TestBadger():
         assert badger.badges == [
             ('LUMBERJACK', 'B', 1),
         ]
+
+    @pytest.mark.parametrize('aggregate, count, head, expected', [
+        ('sum', 2, False, [('A', 11, 2), ('B', 11, 2)]),
+        ('sum', 2, True, [('C', 12, 1), ('A', 11, 2)]),
+        ('count', 1, False, [('B', 11, 2)]),
+        ('count', 5, True, [('C', 12, 1), ('A', 11, 2), ('B', 11, 2)]),
+    ])
+    def test_from_special_score_ties(self, badger, aggregate, count, head, expected):
+        badger.special_scores.scores = {
+            'TEST': [
+                (10, 'B', 'C', 1),
+                (11, 'A', 'B', 1),
+                (12, 'C', 'D', 1),
+                (11, 'B', 'C', 1),
+                (10, 'A', 'B', 1),
+            ]
+        }
+        assert badger.from_special_score(
+            'TEST', aggregate, count, head) == expected
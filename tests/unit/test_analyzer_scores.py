@@ -1,5 +1,7 @@
+import random
+
 from quakestats.dataprovider.analyzer.events import Event
-from quakestats.dataprovider.analyzer.scores import PlayerScores
+from quakestats.dataprovider.analyzer.scores import PlayerScores, RankedScores
 
 
 def gen_switch_team(time, player_id, old_team, new_team):
@@ -157,3 +159,38 @@ class TestPlayerScores():
 
         ps.from_player_switchteam(gen_switch_team(10, 'B', 'Free', 'Spect'))
         assert ps.players_sorted_by_score() == []
+
+    def test_score_bounds(self):
+        ps = PlayerScores()
+        assert ps.score_bounds(skip_world=True) == (None, None, 0)
+
+        ps.from_player_kill(gen_kill(1, 'q3-world', 'B', 'LAVA'))
+        ps.from_player_kill(gen_kill(2, 'A', 'B', 'SHOTGUN'))
+        assert ps.score_bounds() == ('A', 'q3-world', 2)
+        assert ps.score_bounds(skip_world=True) == ('A', 'A', 1)
+
+        ps.from_player_kill(gen_kill(3, 'C', 'B', 'SHOTGUN'))
+        assert ps.score_bounds(skip_world=True) == ('C', 'A', 2)
+        assert ps.is_ranked_below('A', 'C')
+        assert not ps.is_ranked_below('C', 'A')
+        assert not ps.is_ranked_below('A', 'X')
+
+
+def test_ranked_scores_order():
+    rnd = random.Random(1)
+    scores = RankedScores()
+    for i in range(2000):
+        player_id = rnd.choice('ABCDEFGH')
+        op = rnd.random()
+        if op < 0.1:
+            if player_id in scores:
+                del scores[player_id]
+        elif op < 0.2:
+            scores[player_id] = [rnd.randint(-2, 5), rnd.randint(0, 3)]
+        elif op < 0.6:
+            scores.set_score(player_id, scores[player_id][0] + 1, i % 7)
+        else:
+            scores.set_score(player_id, scores[player_id][0] - 1)
+
+        expected = sorted(scores.keys(), reverse=True, key=lambda k: scores[k])
+        assert scores.ordered() == expected
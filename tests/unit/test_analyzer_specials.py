@@ -1,6 +1,7 @@
 import pytest
 from unittest import mock
 
+from quakestats.dataprovider.analyzer.scores import PlayerScores
 from quakestats.dataprovider.analyzer.specials import SpecialScores
 from quakestats.dataprovider.analyzer.events import Event
 
@@ -145,16 +146,15 @@ class TestSpecialScores():
 
     def test_score_headduckhunter_empty(self, pss):
         pss.player_scores = mock.Mock(name='player_scores')
-        pss.player_scores.players_sorted_by_score.return_value = []
+        pss.player_scores.score_bounds.return_value = (None, None, 0)
         pss.score_headduckhunter(gen_kill(1, 'A', 'B', 'GAUNTLET'))
         assert pss.scores['HEADHUNTER'] == []
         assert pss.scores['DUCKHUNTER'] == []
 
     def test_score_headduckhunter_world(self, pss):
         pss.player_scores = mock.Mock(name='player_scores')
-        pss.player_state[None]['previous_players_by_score'] = ['A', 'B']
-        pss.player_scores.players_sorted_by_score.return_value = [
-            'A', 'B']
+        pss.player_state[None]['previous_score_bounds'] = ('A', 'B', 2)
+        pss.player_scores.score_bounds.return_value = ('A', 'B', 2)
         pss.score_headduckhunter(gen_kill(1, 'A', 'B', 'GAUNTLET'))
         assert pss.scores['HEADHUNTER'] == []
         assert pss.scores['DUCKHUNTER'] == [(1, 'A', 'B', 1)]
@@ -163,9 +163,25 @@ class TestSpecialScores():
         assert pss.scores['HEADHUNTER'] == [(1, 'B', 'A', 1)]
         assert pss.scores['HEADLESS_KNIGHT'] == [(1, 'A', 'B', 1)]
         assert pss.scores['DUCKHUNTER'] == [(1, 'A', 'B', 1)]
-        pss.player_scores.players_sorted_by_score.assert_called_with(
+        pss.player_scores.score_bounds.assert_called_with(
             skip_world=True)
 
+    def test_score_marauder(self):
+        player_scores = PlayerScores()
+        pss = SpecialScores(player_scores)
+        for kill in [
+            gen_kill(1, 'A', 'B', 'SHOTGUN'),
+            gen_kill(2, 'A', 'B', 'SHOTGUN'),
+            gen_kill(3, 'B', 'A', 'SHOTGUN'),
+            gen_kill(4, 'q3-world', 'A', 'LAVA'),
+            gen_kill(5, 'B', 'A', 'SHOTGUN'),
+        ]:
+            player_scores.from_player_kill(kill)
+            pss.score_marauder(kill)
+
+        # B was behind A after 3rd kill (1:2)
+        assert pss.scores['MARAUDER'] == [(3, 'B', 'A', 1)]
+
     def test_lifespan(self, pss):
         pss.process_lifespan(gen_death(1, 'B', 'A', 'dummy'))
         assert pss.player_state['A']['lifespan']['max'] == 0
@@ -0,0 +1,282 @@
+import asyncio
+import threading
+import time
+from functools import partial
+
+import pytest
+import zmq
+from zmq.auth.thread import ThreadAuthenticator
+
+from quakestats.core.collector import (
+    QLCollectorManager,
+    QLStatCollector,
+    TimerWheel,
+)
+from quakestats.core.qlparser.spool import (
+    QLEventSpool,
+)
+
+
+def test_consume_loop_offloads_in_order():
+    collector = QLStatCollector('localhost', '1234', 'pwd', queue_size=10)
+    received = []
+    loop_thread = []
+
+    def on_event(timestamp, event):
+        received.append(event['n'])
+        loop_thread.append(threading.current_thread())
+
+    async def run():
+        collector.queue = asyncio.Queue(collector.queue_size)
+        consumer = asyncio.create_task(collector.consume_loop(on_event))
+        for n in range(5):
+            await collector.queue.put((time.time(), {'n': n}))
+        assert collector.queue_depth > 0
+
+        await collector.queue.join()
+        consumer.cancel()
+        return threading.current_thread()
+
+    main_thread = asyncio.run(run())
+
+    assert received == [0, 1, 2, 3, 4]
+    assert main_thread not in loop_thread
+    assert collector.metrics()['processed'] == 5
+    assert collector.metrics()['queue_depth'] == 0
+
+
+def test_consume_loop_errors():
+    collector = QLStatCollector('localhost', '1234', 'pwd')
+
+    def on_event(timestamp, event):
+        if event['n'] == 1:
+            raise ValueError()
+
+    async def run():
+        collector.queue = asyncio.Queue()
+        consumer = asyncio.create_task(collector.consume_loop(on_event))
+        for n in range(3):
+            await collector.queue.put((time.time() - 5, {'n': n}))
+        await collector.queue.join()
+        consumer.cancel()
+
+    asyncio.run(run())
+
+    metrics = collector.metrics()
+    assert metrics['processed'] == 3
+    assert metrics['errors'] == 1
+    assert metrics['max_lag'] >= 5
+
+
+class TestTimerWheel():
+    def test_expire(self):
+        wheel = TimerWheel(5, 4, 100)
+        wheel.schedule('a', 107)
+        wheel.schedule('b', 112)
+
+        assert wheel.advance(104) == []
+        assert wheel.advance(105) == ['a']
+        assert wheel.advance(110) == ['b']
+        assert wheel.entries == {}
+
+    def test_cancel_and_reschedule(self):
+        wheel = TimerWheel(5, 4, 100)
+        wheel.schedule('a', 107)
+        wheel.cancel('a')
+        wheel.schedule('b', 107)
+        wheel.schedule('b', 111)
+
+        assert wheel.advance(105) == []
+        assert wheel.advance(110) == ['b']
+
+    def test_clamped_and_late(self):
+        wheel = TimerWheel(5, 4, 100)
+        # beyond wheel span, expires at its end
+        wheel.schedule('a', 1000)
+        assert wheel.advance(114) == []
+        assert wheel.advance(115) == ['a']
+
+        wheel.schedule('b', 120)
+        assert wheel.advance(5000) == ['b']
+        assert wheel.current == 1000
+
+
+@pytest.fixture(scope='module')
+def plain_auth():
+    # QL servers use PLAIN auth, it requires ZAP handler
+    auth = ThreadAuthenticator(zmq.Context.instance())
+    auth.start()
+    auth.configure_plain(domain='*', passwords={'stats': 'pwd'})
+    yield auth
+    auth.stop()
+
+
+@pytest.mark.parametrize('raw', [False, True])
+def test_manager_receives_from_many_servers(plain_auth, raw, tmpdir):
+    pubs = []
+    ports = []
+    for _ in range(2):
+        pub = zmq.Context.instance().socket(zmq.PUB)
+        pub.plain_server = True
+        ports.append(pub.bind_to_random_port('tcp://127.0.0.1'))
+        pubs.append(pub)
+
+    received = []
+
+    def on_event(server, timestamp, event):
+        received.append((server, event['n']))
+
+    spool = QLEventSpool(str(tmpdir.join('spool', 'serv1.jsonl')))
+
+    async def run():
+        manager = QLCollectorManager(tick=0.05, raw=raw)
+        for idx, port in enumerate(ports):
+            manager.add_server(
+                '127.0.0.1', port, 'pwd', partial(on_event, idx),
+                spool=spool if idx == 1 else None,
+            )
+        runner = asyncio.create_task(manager.run())
+
+        # subscriptions are propagated asynchronously
+        for n in range(200):
+            for pub in pubs:
+                pub.send_json({'n': n})
+            await asyncio.sleep(0.01)
+            if {server for server, _ in received} == {0, 1}:
+                break
+
+        await manager.remove_server(f'tcp://127.0.0.1:{ports[0]}')
+        await asyncio.sleep(0.1)
+        received.clear()
+        for pub in pubs:
+            pub.send_json({'n': -1})
+        await asyncio.sleep(0.2)
+
+        runner.cancel()
+        for collector in manager.collectors.values():
+            collector.consumer.cancel()
+        return manager
+
+    manager = asyncio.run(run())
+    for pub in pubs:
+        pub.close(linger=0)
+
+    assert received == [(1, -1)]
+    assert [m['endpoint'] for m in manager.metrics()] == [f'tcp://127.0.0.1:{ports[1]}']
+
+    spool.close()
+    spooled = list(QLEventSpool(spool.path).replay())
+    assert spooled[-1]['n'] == -1
+    assert all(e['__recv_timestamp'] for e in spooled)
+
+
+def test_manager_reconnects_idle():
+    async def run():
+        manager = QLCollectorManager(tick=1, max_reconnects=1)
+        manager.IDLE_TIMEOUT = 10
+        now = time.time()
+        collectors = [
+            manager.add_server('127.0.0.1', port, 'pwd', None)
+            for port in ['5001', '5002']
+        ]
+        sockets = [c.socket for c in collectors]
+
+        manager.reconnect_idle(now + 11)
+        reconnected = [c for c, s in zip(collectors, sockets) if c.socket is not s]
+        assert len(reconnected) == 1
+
+        manager.reconnect_idle(now + 12)
+        assert all(c.socket not in sockets for c in collectors)
+
+        for collector in collectors:
+            await manager.remove_server(collector.endpoint)
+        for socket in manager.closing:
+            socket.close(linger=0)
+
+    asyncio.run(run())
+
+
+def test_manager_spurious_poll_not_event():
+    async def run():
+        manager = QLCollectorManager()
+        collector = manager.add_server('127.0.0.1', '5001', 'pwd', None)
+        collector.last_event_timestamp = 100
+        await manager.receive(collector.socket, 200)
+        assert collector.last_event_timestamp == 100
+        assert collector.queue_depth == 0
+
+        await manager.remove_server(collector.endpoint)
+        for socket in manager.closing:
+            socket.close(linger=0)
+
+    asyncio.run(run())
+
+
+def test_manager_remove_server_waits_for_callback():
+    started = threading.Event()
+    finished = []
+
+    def on_event(timestamp, event):
+        started.set()
+        time.sleep(0.2)
+        finished.append(event)
+
+    async def run():
+        manager = QLCollectorManager()
+        collector = manager.add_server('127.0.0.1', '5001', 'pwd', on_event)
+        collector.queue.put_nowait((time.time(), {'n': 1}))
+        collector.queue.put_nowait((time.time(), {'n': 2}))
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, started.wait)
+
+        await manager.remove_server(collector.endpoint)
+        assert finished == [{'n': 1}]
+        for socket in manager.closing:
+            socket.close(linger=0)
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize('raw', [False, True])
+def test_manager_drops_malformed_frames(plain_auth, raw, tmpdir):
+    pub = zmq.Context.instance().socket(zmq.PUB)
+    pub.plain_server = True
+    port = pub.bind_to_random_port('tcp://127.0.0.1')
+    spool = QLEventSpool(str(tmpdir.join('spool', 'serv1.jsonl')))
+    received = []
+
+    async def run():
+        manager = QLCollectorManager(tick=0.05, raw=raw)
+        collector = manager.add_server(
+            '127.0.0.1', port, 'pwd', lambda ts, ev: received.append(ev['n']),
+            spool=spool,
+        )
+        runner = asyncio.create_task(manager.run())
+
+        # subscription is propagated asynchronously
+        for n in range(200):
+            pub.send_json({'n': n})
+            await asyncio.sleep(0.01)
+            if received:
+                break
+
+        received.clear()
+        pub.send(b'not json')
+        pub.send(b'"\xff\xfe"')
+        pub.send_json({'n': -1})
+        await asyncio.sleep(0.2)
+
+        runner.cancel()
+        await manager.remove_server(collector.endpoint)
+        for socket in manager.closing:
+            socket.close(linger=0)
+        return collector
+
+    collector = asyncio.run(run())
+    pub.close(linger=0)
+    spool.close()
+
+    assert received == [-1]
+    # raw frames are decoded when spooled
+    assert collector.errors == 2
+    assert list(QLEventSpool(spool.path).replay())[-1]['n'] == -1
@@ -0,0 +1,39 @@
+from copy import (
+    deepcopy,
+)
+
+import pytest
+
+from quakestats.core.game import (
+    qlevents,
+)
+
+
+@pytest.mark.parametrize('ev_cls', list(qlevents.EV_CLS_MAP.values()))
+def test_initialize_same_as_template(ev_cls):
+    ev = ev_cls()
+    ev.initialize(1.5, 'guid', False)
+    other = ev_cls()
+    other.initialize(1.5, 'guid', False)
+
+    expected = deepcopy(ev_cls.payload)
+    expected.update({'TIME': 1.5, 'WARMUP': False, 'MATCH_GUID': 'guid'})
+    if ev_cls is not qlevents.PlayerStats:
+        assert ev.data == expected
+
+    assert ev.data == other.data
+    for key, value in ev.data.items():
+        if isinstance(value, (dict, list)):
+            assert value is not other.data[key]
+            assert value is not ev_cls.payload[key]
+
+
+def test_compile_template_nested():
+    template = {'a': 1, 'b': [{'c': []}], 'd': {'e': {}}}
+    factory = qlevents.compile_template(template)
+
+    obj = factory()
+    assert obj == template
+    obj['b'][0]['c'].append(1)
+    obj['d']['e']['f'] = 1
+    assert template == {'a': 1, 'b': [{'c': []}], 'd': {'e': {}}}
@@ -5,6 +5,8 @@ from quakestats.core.q3parser.events import (
 )
 from quakestats.core.q3parser.parser import (
     BaseQ3ParserMixin,
+    GameLogParserBaseQ3,
+    GameLogParserEdawn,
     GameLogParserOsp,
     OspParserMixin,
 )
@@ -40,6 +42,45 @@ class TestGameLogParserOsp():
         assert result.payload == ex_payload
         assert result.name == ex_name
 
+    def test_line_to_event_malformed(self):
+        parser = GameLogParserOsp()
+        with pytest.raises(Exception):
+            parser.line_to_raw_event('garbage')
+
+    def test_parse_event_dispatch(self):
+        parser = GameLogParserOsp()
+        event = parser.parse_line('12.3 Kill: 2 3 1: A killed B by MOD_SHOTGUN')
+        assert event.time == 12300
+        assert event.client_id == 2
+        assert event.victim_id == 3
+        assert event.reason == 'MOD_SHOTGUN'
+
+    def test_parse_event_unsupported(self):
+        parser = GameLogParserOsp()
+        assert parser.parse_line('12.3 say: A: hello') is None
+
+
+class TestGameLogParserBaseQ3():
+    def test_line_to_event(self):
+        parser = GameLogParserBaseQ3()
+        result = parser.line_to_raw_event('  1:07 Item: 3 item_quad')
+        assert result.time == 67000
+        assert result.name == 'Item'
+        assert result.payload == '3 item_quad'
+
+    def test_parse_line_no_weapon_stats(self):
+        parser = GameLogParserBaseQ3()
+        assert parser.parse_line('  1:07 Weapon_Stats: 2 Given:1') is None
+
+
+class TestGameLogParserEdawn():
+    def test_line_to_event(self):
+        parser = GameLogParserEdawn()
+        result = parser.line_to_raw_event('  2:03.4 Exit: Fraglimit hit.')
+        assert result.time == 123400
+        assert result.name == 'Exit'
+        assert result.payload == 'Fraglimit hit.'
+
 
 class TestDefaultParser():
     def test_parse_user_info_changed(self):
@@ -110,3 +151,11 @@ class TestOspParser():
         assert e['LIGHTNING'].hits == 68  # noqa
         assert e['PLASMA'].shots == 326  # noqa
         assert e['PLASMA'].hits == 45  # noqa
+
+
+def test_events_have_no_instance_dict():
+    parser = GameLogParserOsp()
+    event = parser.parse_line('12.3 Kill: 2 3 1: A killed B by MOD_SHOTGUN')
+    assert not hasattr(event, '__dict__')
+    with pytest.raises(AttributeError):
+        event.unknown = 1
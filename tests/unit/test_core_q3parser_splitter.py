@@ -1,4 +1,7 @@
 import datetime
+import hashlib
+import io
+import pickle
 
 import pytest
 
@@ -23,6 +26,30 @@ class TestQ3GameLog():
             "testing 2"
         )
 
+    def test_checksum_incremental(self):
+        log = Q3GameLog(datetime.datetime.now(), 'osp')
+        log.add_line('testing 1')
+        assert log.checksum == hashlib.md5(b'testing 1').hexdigest()
+        log.add_line('żółw', 'żółw'.encode())
+        assert log.checksum == hashlib.md5('testing 1żółw'.encode()).hexdigest()
+
+    def test_pickle(self):
+        log = Q3GameLog(datetime.datetime.now(), 'osp')
+        log.add_line('testing 1')
+        restored = pickle.loads(pickle.dumps(log))
+        assert restored.checksum == log.checksum
+
+        restored.add_line('testing 2')
+        log.add_line('testing 2')
+        assert restored.checksum == log.checksum
+
+    def test_checksum_deserialized(self):
+        log = Q3GameLog.deserialize(['testing 1'], 'some-id', datetime.datetime.now())
+        assert log.checksum == 'some-id'
+
+        log.add_line('testing 2')
+        assert log.checksum == hashlib.md5(b'testing 1testing 2').hexdigest()
+
 
 class TestGameLogSplitter():
     @pytest.mark.parametrize('data, expected', [
@@ -90,3 +117,39 @@ class TestGameLogSplitter():
         res[0].identifier == '5acd2bb0453735885f5a9294b5ff67a3'
         res[1].identifier == '671b1bf98bb8e0c91d2137e749cb3d7c'
         res[2].identifier == 'f66ad0e4bdb4216e77d5e5856af6f5c0'
+
+    def test_split_from_lines_file(self):
+        data = (
+            "------------------\n"
+            "test\n"
+            "test2\r\n"
+            "------------------\n"
+            "test3\n"
+        )
+        splitter = GameLogSplitter('osp')
+        res = list(splitter.iter_games_from_lines(io.StringIO(data)))
+
+        assert [r.lines for r in res] == [['test', 'test2'], ['test3']]
+
+    def test_split_from_lines_bytes(self):
+        data = [b"test\n", b"-----------\n", b"test2\n"]
+        splitter = GameLogSplitter('osp')
+        res = list(splitter.iter_games_from_lines(data))
+
+        assert [r.lines for r in res] == [['test'], ['test2']]
+
+    def test_split_from_lines_bytes_checksum(self, testdata_loader):
+        data = testdata_loader('osp-warmups.log').read()
+        splitter = GameLogSplitter('osp')
+        res = splitter.iter_games_from_lines(io.BytesIO(data.encode()))
+        expected = splitter.iter_games(data)
+
+        assert [r.checksum for r in res] == [r.checksum for r in expected]
+
+    def test_split_from_lines_same_as_str(self, testdata_loader):
+        data = testdata_loader('osp-warmups.log').read()
+        splitter = GameLogSplitter('osp')
+        res = list(splitter.iter_games_from_lines(io.StringIO(data)))
+        expected = list(splitter.iter_games(data))
+
+        assert [r.identifier for r in res] == [e.identifier for e in expected]
@@ -1,5 +1,27 @@
+from quakestats.core.q3toql.transform import (
+    Client,
+    resolve_identity,
+)
 from quakestats.system.qa import _regen_asserts  # noqa
 
 
 class TestQ3toQL():
     pass
+
+
+class TestClient():
+    def test_resolve(self):
+        client = Client(1, '^1Bob^7', 'FREE')
+        assert client.resolve() == Client(2, 'bob', 'RED').resolve()
+        assert client.resolve() != Client(3, 'Alice', 'RED').resolve()
+        assert len(client.resolve()) == 24
+
+    def test_resolve_identity_cached(self):
+        resolve_identity.cache_clear()
+        resolve_identity('Q3', 'cached-player')
+        resolve_identity('Q3', 'cached-player')
+        resolve_identity('other', 'cached-player')
+
+        info = resolve_identity.cache_info()
+        assert info.hits == 1
+        assert info.misses == 2
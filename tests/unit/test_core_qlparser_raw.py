@@ -0,0 +1,49 @@
+import json
+
+from quakestats.core.qlparser.raw import (
+    RawQLEvent,
+    encode_event,
+    event_header,
+)
+
+EVENT = {
+    'TYPE': 'PLAYER_KILL',
+    'DATA': {'MATCH_GUID': 'guid-1', 'MOD': 'ROCKET', 'KILLER': {'NAME': 'A'}},
+}
+
+
+def raw_event(event=EVENT):
+    return RawQLEvent(memoryview(json.dumps(event).encode()))
+
+
+def test_header_without_decoding():
+    event = raw_event()
+    assert event_header(event) == ('PLAYER_KILL', 'guid-1')
+    assert event._decoded is None
+
+
+def test_header_fallback():
+    event = RawQLEvent(memoryview(b'{"TYPE": "X", "DATA": {"MATCH_GUID": "g\\u0105"}}'))
+    assert event.header() == ('X', 'g\u0105')
+
+
+def test_dict_access():
+    event = raw_event()
+    event['__recv_timestamp'] = 12.5
+    assert event._decoded is None
+
+    assert event['DATA']['MOD'] == 'ROCKET'
+    assert dict(event) == dict(EVENT, __recv_timestamp=12.5)
+
+
+def test_encode():
+    event = raw_event()
+    assert json.loads(encode_event(event)) == EVENT
+
+    event['__recv_timestamp'] = 12.5
+    assert json.loads(encode_event(event)) == dict(EVENT, __recv_timestamp=12.5)
+    assert event._decoded is None
+
+    event['DATA']['MOD'] = 'RAILGUN'
+    assert json.loads(encode_event(event))['DATA']['MOD'] == 'RAILGUN'
+    assert encode_event(EVENT) == json.dumps(EVENT)
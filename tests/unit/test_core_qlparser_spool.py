@@ -0,0 +1,140 @@
+import os
+from unittest import mock
+
+import pytest
+
+from quakestats.core.qlparser.spool import (
+    QLEventSpool,
+)
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('spool', 'serv1.jsonl'))
+
+
+def test_append_replay(path):
+    spool = QLEventSpool(path)
+    spool.append({'TYPE': 'A'})
+    spool.append({'TYPE': 'B'})
+    spool.close()
+
+    assert list(QLEventSpool(path).replay()) == [{'TYPE': 'A'}, {'TYPE': 'B'}]
+
+
+def test_replay_skips_partial_event(path):
+    spool = QLEventSpool(path)
+    spool.append({'TYPE': 'A'})
+    spool.fh.write('{"TYPE": "B", "DA')
+    spool.close()
+
+    assert list(QLEventSpool(path).replay()) == [{'TYPE': 'A'}]
+
+
+def test_batched_sync(path):
+    spool = QLEventSpool(path, batch_size=3, sync_interval=60)
+    with mock.patch('os.fsync') as fsync:
+        for idx in range(7):
+            spool.append({'n': idx})
+        assert fsync.call_count == 2
+
+        spool.sync_if_due()
+        assert fsync.call_count == 2
+
+        spool.last_sync -= 60
+        spool.sync_if_due()
+        assert fsync.call_count == 3
+        assert spool.pending == 0
+    spool.close()
+
+
+def test_reset(path):
+    spool = QLEventSpool(path)
+    spool.append({'TYPE': 'A'})
+    spool.reset([{'TYPE': 'C'}])
+    spool.append({'TYPE': 'D'})
+    spool.close()
+
+    assert list(QLEventSpool(path).replay()) == [{'TYPE': 'C'}, {'TYPE': 'D'}]
+
+
+def test_discard(path):
+    spool = QLEventSpool(path)
+    spool.append({'TYPE': 'A'})
+    spool.append({'TYPE': 'B'})
+    mark = spool.mark()
+    spool.append({'TYPE': 'C'})
+    spool.discard(mark)
+    spool.append({'TYPE': 'D'})
+    spool.discard(mark)
+    spool.close()
+
+    spool = QLEventSpool(path)
+    assert list(spool.replay()) == [{'TYPE': 'C'}, {'TYPE': 'D'}]
+    assert spool.mark() == 2
+    spool.discard(1)
+    assert list(spool.replay()) == [{'TYPE': 'D'}]
+    spool.close()
+
+
+def test_interrupted_rewrite_keeps_events(path):
+    spool = QLEventSpool(path)
+    spool.append({'TYPE': 'A'})
+    spool.append({'TYPE': 'B'})
+    with mock.patch('os.replace', side_effect=OSError):
+        with pytest.raises(OSError):
+            spool.reset([{'TYPE': 'B'}])
+
+    spool.append({'TYPE': 'C'})
+    spool.close()
+    assert list(QLEventSpool(path).replay()) == [{'TYPE': 'A'}, {'TYPE': 'B'}, {'TYPE': 'C'}]
+    assert os.listdir(os.path.dirname(path)) == ['serv1.jsonl']
+
+
+def test_fsync_outside_lock(path):
+    spool = QLEventSpool(path, batch_size=1)
+
+    def fsync(fd):
+        assert not spool.lock.locked()
+
+    with mock.patch('os.fsync', side_effect=fsync) as fsync_mock:
+        spool.append({'TYPE': 'A'})
+        spool.append({'TYPE': 'B'})
+        spool.discard(1)
+        assert fsync_mock.call_count == 4
+    spool.close()
+
+
+def test_append_during_discard_kept(path):
+    spool = QLEventSpool(path)
+    spool.append({'TYPE': 'A'})
+    spool.append({'TYPE': 'B'})
+    fsync = os.fsync
+    appended = []
+
+    def append_while_rewriting(fd):
+        # temporary file is being written, spool is not locked
+        if not appended:
+            appended.append(True)
+            spool.append({'TYPE': 'C'}, sync=False)
+        fsync(fd)
+
+    with mock.patch('os.fsync', side_effect=append_while_rewriting):
+        spool.discard(1)
+
+    assert spool.mark() == 3
+    spool.append({'TYPE': 'D'})
+    spool.close()
+    assert list(QLEventSpool(path).replay()) == [{'TYPE': 'B'}, {'TYPE': 'C'}, {'TYPE': 'D'}]
+
+
+def test_partial_event_terminated_on_open(path):
+    spool = QLEventSpool(path)
+    spool.append({'TYPE': 'A'})
+    spool.fh.write('{"TYPE": "B", "DA')
+    spool.close()
+
+    spool = QLEventSpool(path)
+    spool.append({'TYPE': 'C'})
+    spool.close()
+    assert list(QLEventSpool(path).replay()) == [{'TYPE': 'A'}, {'TYPE': 'C'}]
@@ -0,0 +1,329 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import pytest
+
+from quakestats.core.qlparser.spool import (
+    QLEventSpool,
+)
+from quakestats.sdk import (
+    QLAnalysisPipeline,
+    QSSdk,
+)
+
+
+class TestQSSdkProcessQ3Log():
+    @pytest.fixture
+    def sdk(self, tmpdir):
+        ctx = mock.Mock()
+        ctx.config = {
+            "RAW_DATA_DIR": str(tmpdir),
+            "SERVER_DOMAIN": "test-domain",
+        }
+        ctx.ds.get_known_match_guids.return_value = set()
+        return QSSdk(ctx)
+
+    @pytest.fixture
+    def osp_log(self, testdata_loader):
+        return testdata_loader('osp-ffa-2.log').read()
+
+    def stored_reports(self, sdk):
+        return [
+            c[0][0] for c in sdk.ctx.ds.store_analysis_report.call_args_list
+        ]
+
+    def test_process_q3_log(self, sdk, osp_log):
+        results, errors, skips = sdk.process_q3_log(osp_log, 'osp')
+
+        assert len(results) == 1
+        assert not errors
+        assert skips == 0
+        assert sdk.warehouse.has_item(results[0].match_guid)
+        assert len(self.stored_reports(sdk)) == 1
+
+    def test_process_q3_log_parallel(self, sdk, osp_log):
+        results, errors, skips = sdk.process_q3_log(osp_log, 'osp')
+        expected = self.stored_reports(sdk)[0]
+        for item in sdk.warehouse.iter_matches():
+            sdk.warehouse.delete_item(item.identifier)
+        sdk.ctx.ds.reset_mock()
+
+        par_results, par_errors, par_skips = sdk.process_q3_log(
+            osp_log, 'osp', workers=2
+        )
+
+        assert [r.get_summary() for r in par_results] == [
+            r.get_summary() for r in results
+        ]
+        assert not par_errors
+        assert par_skips == 0
+        assert sdk.warehouse.has_item(par_results[0].match_guid)
+
+        report = self.stored_reports(sdk)[0]
+        assert report.kills == expected.kills
+        assert report.scores == expected.scores
+        assert report.badges == expected.badges
+        assert report.special_scores == dict(expected.special_scores)
+        assert report.final_scores == dict(expected.final_scores)
+
+    def test_process_q3_log_parallel_skips_known(self, sdk, osp_log):
+        sdk.ctx.ds.get_known_match_guids.side_effect = set
+        results, errors, skips = sdk.process_q3_log(osp_log, 'osp', workers=2)
+
+        assert results == []
+        assert skips == 1
+        sdk.ctx.ds.store_analysis_report.assert_not_called()
+
+    def test_process_q3_log_skips_known_without_parsing(self, sdk, osp_log):
+        sdk.ctx.ds.get_known_match_guids.side_effect = set
+        with mock.patch.object(sdk.q3toql, 'transform_game_log') as transform:
+            results, errors, skips = sdk.process_q3_log(osp_log, 'osp')
+
+        assert results == []
+        assert skips == 1
+        transform.assert_not_called()
+        sdk.ctx.ds.get_match.assert_not_called()
+
+    def test_process_q3_log_duplicates(self, sdk, osp_log):
+        log = osp_log + osp_log
+        results, errors, skips = sdk.process_q3_log(log, 'osp')
+
+        assert len(results) == 1
+        assert skips == 1
+        sdk.ctx.ds.get_known_match_guids.assert_called_once_with(
+            [results[0].match_guid]
+        )
+
+
+class TestQSSdkRebuild():
+    @pytest.fixture
+    def sdk(self, tmpdir, testdata_loader):
+        ctx = mock.Mock()
+        ctx.config = {
+            "RAW_DATA_DIR": str(tmpdir),
+            "SERVER_DOMAIN": "test-domain",
+        }
+        ctx.ds.get_known_match_guids.return_value = set()
+        ctx.ds.store_analysis_reports.side_effect = lambda reports: [
+            (True, r.match_metadata.match_guid) for r in reports
+        ]
+        sdk = QSSdk(ctx)
+        for name in ['osp-ffa-1.log', 'osp-ffa-2.log', 'osp-warmups.log']:
+            sdk.process_q3_log(testdata_loader(name).read(), 'osp')
+        return sdk
+
+    def stored_reports(self, sdk):
+        return [
+            report
+            for c in sdk.ctx.ds.store_analysis_reports.call_args_list
+            for report in c[0][0]
+        ]
+
+    def test_rebuild(self, sdk):
+        wh_items = len(list(sdk.warehouse.iter_matches()))
+
+        assert sdk.rebuild_db(batch_size=2) == wh_items
+        sdk.ctx.ds.prepare_for_rebuild.assert_called_once_with()
+        sdk.ctx.ds.post_rebuild.assert_called_once_with()
+        assert len(self.stored_reports(sdk)) == wh_items
+        assert max(
+            len(c[0][0]) for c in sdk.ctx.ds.store_analysis_reports.call_args_list
+        ) == 2
+
+    def test_rebuild_parallel(self, sdk):
+        sdk.rebuild_db()
+        expected = {
+            r.match_metadata.match_guid: r for r in self.stored_reports(sdk)
+        }
+        sdk.ctx.ds.store_analysis_reports.reset_mock()
+
+        sdk.rebuild_db(workers=2, batch_size=2)
+        reports = self.stored_reports(sdk)
+
+        assert len(reports) == len(expected)
+        for report in reports:
+            ex = expected[report.match_metadata.match_guid]
+            assert report.kills == ex.kills
+            assert report.badges == ex.badges
+            assert report.special_scores == ex.special_scores
+
+    def stored_fingerprints(self, sdk):
+        return [
+            fingerprint
+            for c in sdk.ctx.ds.store_match_fingerprints.call_args_list
+            for fingerprint in c[0][0]
+        ]
+
+    def test_rebuild_incremental(self, sdk):
+        sdk.rebuild_db()
+        fingerprints = {
+            f['match_guid']: f for f in self.stored_fingerprints(sdk)
+        }
+        assert len(fingerprints) == len(list(sdk.warehouse.iter_matches()))
+
+        sdk.ctx.reset_mock()
+        sdk.ctx.ds.get_match_fingerprints.return_value = fingerprints
+        sdk.rebuild_db(incremental=True)
+
+        sdk.ctx.ds.prepare_for_rebuild.assert_not_called()
+        sdk.ctx.ds.store_analysis_reports.assert_not_called()
+        sdk.ctx.ds.drop_matches_info.assert_not_called()
+
+        changed_guid = sorted(fingerprints)[0]
+        fingerprints[changed_guid] = dict(
+            fingerprints[changed_guid], analyzer_version='old'
+        )
+        sdk.ctx.reset_mock()
+        sdk.rebuild_db(incremental=True)
+
+        sdk.ctx.ds.drop_matches_info.assert_called_once_with([changed_guid])
+        assert [
+            r.match_metadata.match_guid for r in self.stored_reports(sdk)
+        ] == [changed_guid]
+        assert [
+            f['match_guid'] for f in self.stored_fingerprints(sdk)
+        ] == [changed_guid]
+
+
+class TestQSSdkFeedQL():
+    @pytest.fixture
+    def sdk(self, tmpdir):
+        ctx = mock.Mock()
+        ctx.config = {
+            "RAW_DATA_DIR": str(tmpdir),
+            "SERVER_DOMAIN": "test-domain",
+        }
+        stored = set()
+        ctx.ds.get_match.side_effect = lambda guid: guid in stored or None
+        ctx.ds.store_analysis_report.side_effect = lambda report: stored.add(
+            report.match_metadata.match_guid
+        )
+        return QSSdk(ctx)
+
+    @pytest.fixture
+    def events(self, testdata_loader):
+        events = json.loads(testdata_loader('ql-dump-1.log').read())
+        for idx, event in enumerate(events):
+            event['__recv_timestamp'] = 1600000000 + idx
+        return events
+
+    def stored_guids(self, sdk):
+        return [
+            c[0][0].match_metadata.match_guid
+            for c in sdk.ctx.ds.store_analysis_report.call_args_list
+        ]
+
+    def receive(self, feed, event):
+        # events are spooled by collector when received
+        feed.spool.append(event)
+
+    def test_replay_after_crash(self, sdk, events, tmpdir):
+        path = str(tmpdir.join('spool', 'serv1.jsonl'))
+        expected_sdk = QSSdk(sdk.ctx)
+        feed = expected_sdk.create_ql_feed()
+        for event in events:
+            expected_sdk.feed_ql(feed, event)
+        expected = self.stored_guids(expected_sdk)
+        assert expected
+        sdk.ctx.ds.store_analysis_report.reset_mock()
+        sdk.ctx.ds.get_match.side_effect = None
+        sdk.ctx.ds.get_match.return_value = None
+
+        # collector crashes in the middle of a match,
+        # some of received events are not processed yet
+        split = len(events) // 2
+        feed = sdk.create_ql_feed(QLEventSpool(path))
+        for event in events[:split]:
+            self.receive(feed, event)
+        for event in events[:split - 10]:
+            sdk.feed_ql(feed, event)
+        feed.spool.close()
+
+        feed = sdk.create_ql_feed(QLEventSpool(path))
+        for event in events[split:]:
+            self.receive(feed, event)
+            sdk.feed_ql(feed, event)
+
+        assert self.stored_guids(sdk) == expected
+
+    def test_replay_finished_match_not_stored_twice(self, sdk, events, tmpdir):
+        path = str(tmpdir.join('spool', 'serv1.jsonl'))
+        spool = QLEventSpool(path)
+        for event in events:
+            spool.append(event)
+        spool.close()
+
+        sdk.create_ql_feed(QLEventSpool(path))
+        guids = self.stored_guids(sdk)
+        assert len(guids) == len(set(guids))
+
+        # only events of unfinished match are kept
+        last_guid = events[-1]['DATA']['MATCH_GUID']
+        assert all(
+            e['DATA']['MATCH_GUID'] == last_guid
+            for e in QLEventSpool(path).replay()
+        )
+
+        sdk.create_ql_feed(QLEventSpool(path))
+        assert self.stored_guids(sdk) == guids
+
+    def test_analysis_pipeline(self, sdk, events, tmpdir):
+        expected_sdk = QSSdk(sdk.ctx)
+        feed = expected_sdk.create_ql_feed()
+        for event in events:
+            expected_sdk.feed_ql(feed, event)
+        expected = self.stored_guids(expected_sdk)
+        sdk.ctx.ds.store_analysis_report.reset_mock()
+        sdk.ctx.ds.get_match.side_effect = None
+        sdk.ctx.ds.get_match.return_value = None
+
+        path = str(tmpdir.join('spool', 'serv1.jsonl'))
+        sdk.ql_pipeline = QLAnalysisPipeline(sdk, 2)
+        feed = sdk.create_ql_feed(QLEventSpool(path))
+        for event in events:
+            self.receive(feed, event)
+            sdk.feed_ql(feed, event)
+        sdk.ql_pipeline.close()
+
+        assert self.stored_guids(sdk) == expected
+        for guid in expected:
+            assert sdk.warehouse.has_item(guid)
+
+        # only events of unfinished match are kept
+        last_guid = events[-1]['DATA']['MATCH_GUID']
+        assert all(
+            e['DATA']['MATCH_GUID'] == last_guid
+            for e in QLEventSpool(path).replay()
+        )
+
+    def test_analysis_pipeline_failure(self, sdk, events, tmpdir):
+        expected_sdk = QSSdk(sdk.ctx)
+        feed = expected_sdk.create_ql_feed()
+        for event in events:
+            expected_sdk.feed_ql(feed, event)
+        expected = self.stored_guids(expected_sdk)
+        sdk.ctx.ds.store_analysis_report.reset_mock()
+        for guid in expected:
+            sdk.warehouse.delete_item(guid)
+
+        path = str(tmpdir.join('spool', 'serv1.jsonl'))
+        sdk.ql_pipeline = QLAnalysisPipeline(sdk, 1)
+        sdk.ql_pipeline.executor.shutdown()
+        sdk.ql_pipeline.executor = ThreadPoolExecutor(1)
+        feed = sdk.create_ql_feed(QLEventSpool(path))
+        with mock.patch(
+            'quakestats.sdk.analyze_ql_game_log', side_effect=BrokenProcessPool()
+        ):
+            for event in events:
+                self.receive(feed, event)
+                sdk.feed_ql(feed, event)
+            sdk.ql_pipeline.close()
+
+        assert self.stored_guids(sdk) == []
+        # raw logs are kept for reanalysis, so are spooled events
+        for guid in expected:
+            assert sdk.warehouse.has_item(guid)
+        feed.spool.close()
+        assert len(list(QLEventSpool(path).replay())) == len(events)
@@ -0,0 +1,132 @@
+import json
+import os
+from unittest import mock
+
+import flask
+import pytest
+
+from quakestats.system import cache
+
+
+def test_lru_backend_evicts_least_recently_used():
+    lru = cache.LRUBackend(2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+
+    assert lru.get('b') is None
+    assert lru.get('a') == 1
+    assert lru.get('c') == 3
+
+
+def test_disk_backend(tmpdir):
+    disk = cache.DiskBackend(str(tmpdir.join('cache')))
+    assert disk.get('/api/x') is None
+    disk.set('/api/x', (b'{}', 'application/json', 'etag'))
+    assert disk.get('/api/x') == (b'{}', 'application/json', 'etag')
+
+    cache.clear_disk_cache(disk.directory)
+    assert disk.get('/api/x') is None
+
+
+def test_disk_backend_json(tmpdir):
+    disk = cache.DiskBackend(str(tmpdir.join('cache')))
+    disk.set('/api/x', (b'{"a": 1}', 'application/json', 'etag'), '3')
+    with open(disk.path('/api/x', '3')) as fh:
+        assert json.load(fh)['etag'] == 'etag'
+    assert disk.get('/api/x', '2') is None
+
+    with open(disk.path('/api/y', '3'), 'w') as fh:
+        fh.write('not json')
+    assert disk.get('/api/y', '3') is None
+
+
+def test_disk_backend_prune(tmpdir):
+    disk = cache.DiskBackend(str(tmpdir.join('cache')), max_entries=2)
+    for idx, generation in enumerate(['1', '1', '2']):
+        disk.set(f'/api/{idx}', (b'1', 'text/plain', 'e'), generation)
+        os.utime(disk.path(f'/api/{idx}', generation), (idx, idx))
+
+    disk.prune('1')
+    assert disk.get('/api/2', '2') is None
+    assert disk.get('/api/0', '1') is not None
+
+    disk.set('/api/3', (b'1', 'text/plain', 'e'), '1')
+    disk.enforce_limit()
+    assert disk.get('/api/0', '1') is None
+    assert disk.get('/api/1', '1') is not None
+    assert disk.get('/api/3', '1') is not None
+
+
+def test_response_cache_disk_shared(tmpdir):
+    directory = str(tmpdir.join('cache'))
+    cache.ResponseCache(directory=directory).set('/api/x', (b'1', 'text/plain', 'e'))
+    assert cache.ResponseCache(directory=directory).get('/api/x') == (b'1', 'text/plain', 'e')
+
+
+class TestCachedView():
+    @pytest.fixture
+    def response_cache(self):
+        return cache.ResponseCache(max_age=60)
+
+    @pytest.fixture
+    def client(self, response_cache):
+        app = flask.Flask(__name__)
+        calls = []
+
+        @app.route('/item/<item_id>')
+        @response_cache.cached
+        def item(item_id):
+            calls.append(item_id)
+            if item_id == 'missing':
+                flask.abort(404)
+            if item_id == 'unknown':
+                return flask.jsonify(None)
+            return flask.jsonify({'id': item_id, 'calls': len(calls)})
+
+        client = app.test_client()
+        client.calls = calls
+        return client
+
+    def test_cached(self, client, response_cache):
+        res = client.get('/item/1')
+        assert res.json == {'id': '1', 'calls': 1}
+        assert res.headers['Cache-Control'] == 'public, max-age=60'
+        etag = res.headers['ETag']
+
+        res = client.get('/item/1')
+        assert res.json == {'id': '1', 'calls': 1}
+        assert res.headers['ETag'] == etag
+
+        res = client.get('/item/1', headers={'If-None-Match': etag})
+        assert res.status_code == 304
+
+        res = client.get('/item/1?x=1')
+        assert res.json == {'id': '1', 'calls': 2}
+
+        response_cache.clear()
+        assert client.get('/item/1').json == {'id': '1', 'calls': 3}
+
+    def test_errors_not_cached(self, client):
+        assert client.get('/item/missing').status_code == 404
+        assert client.get('/item/missing').status_code == 404
+        assert client.calls == ['missing', 'missing']
+
+    def test_empty_not_cached(self, client):
+        assert client.get('/item/unknown').json is None
+        assert client.get('/item/unknown').json is None
+        assert client.calls == ['unknown', 'unknown']
+
+    def test_generation(self, client, response_cache):
+        generation = mock.Mock(return_value=1)
+        response_cache.generation = generation
+        assert client.get('/item/1').json == {'id': '1', 'calls': 1}
+        assert client.get('/item/1').json == {'id': '1', 'calls': 1}
+        # checked once per generation_ttl
+        assert generation.call_count == 1
+
+        generation.return_value = 2
+        assert client.get('/item/1').json == {'id': '1', 'calls': 1}
+        response_cache.generation_ttl = 0
+        assert client.get('/item/1').json == {'id': '1', 'calls': 2}
@@ -0,0 +1,112 @@
+import importlib
+import io
+from unittest import mock
+
+import pytest
+
+from quakestats.datasource import mongo2
+from quakestats.web import api
+
+# package exports flask app under the same name
+web_app = importlib.import_module('quakestats.web.app')
+
+
+@pytest.fixture
+def ds():
+    ds = mongo2.DataStoreMongo(mock.Mock())
+    ds.db.data_generation.find_one.return_value = {'generation': 1}
+    ds.db.match.find_one.side_effect = lambda query: (
+        {'_id': 1, 'match_guid': 'm1', 'map_name': 'q3dm17'}
+        if query == {'match_guid': 'm1'} else None
+    )
+    for getter in [
+        'get_match_players', 'get_team_lifecycle', 'get_match_scores',
+        'get_match_special_scores', 'get_match_kills', 'get_match_badges',
+        'get_match_player_stats',
+    ]:
+        setattr(ds, getter, mock.Mock(return_value=[{'getter': getter}]))
+    return ds
+
+
+@pytest.fixture
+def client(ds):
+    api.response_cache.clear()
+    with mock.patch.object(api, 'data_store', lambda: ds), \
+            mock.patch.object(web_app, 'data_store', lambda: ds):
+        yield api.app.test_client()
+    api.response_cache.clear()
+
+
+def test_match_bundle(client, ds):
+    res = client.get('/api/v2/match/m1/bundle')
+    assert res.status_code == 200
+    assert res.json == {
+        'metadata': {'match_guid': 'm1', 'map_name': 'q3dm17'},
+        'players': [{'getter': 'get_match_players'}],
+        'teams': [{'getter': 'get_team_lifecycle'}],
+        'score': [{'getter': 'get_match_scores'}],
+        'special': [{'getter': 'get_match_special_scores'}],
+        'kill': [{'getter': 'get_match_kills'}],
+        'badge': [{'getter': 'get_match_badges'}],
+        'player_stats': [{'getter': 'get_match_player_stats'}],
+    }
+    ds.get_match_kills.assert_called_once_with('m1')
+    etag = res.headers['ETag']
+
+    res = client.get('/api/v2/match/m1/bundle', headers={'If-None-Match': etag})
+    assert res.status_code == 304
+    assert ds.db.match.find_one.call_count == 1
+
+
+def test_match_bundle_unknown_match(client, ds):
+    assert client.get('/api/v2/match/m2/bundle').status_code == 404
+    assert client.get('/api/v2/match/m2/bundle').status_code == 404
+    assert ds.db.match.find_one.call_count == 2
+
+
+def test_match_bundle_data_generation(client, ds):
+    etag = client.get('/api/v2/match/m1/bundle').headers['ETag']
+    client.get('/api/v2/match/m1/bundle')
+    assert ds.db.match.find_one.call_count == 1
+
+    # e.g. players merged by another process
+    ds.db.data_generation.find_one.return_value = {'generation': 2}
+    api.response_cache.known_generation = None
+    ds.get_match_kills.return_value = [{'getter': 'merged'}]
+    res = client.get('/api/v2/match/m1/bundle', headers={'If-None-Match': etag})
+    assert res.status_code == 200
+    assert res.json['kill'] == [{'getter': 'merged'}]
+    assert ds.db.match.find_one.call_count == 2
+
+
+def test_data_store_ensures_indexes_once():
+    with mock.patch.object(web_app, 'indexes_ensured', False), \
+            mock.patch.object(web_app, 'mongo_db'), \
+            mock.patch.object(mongo2, 'DataStoreMongo') as ds_cls:
+        ds_cls.return_value.ensure_indexes.return_value = ['match_guid_1']
+        web_app.data_store()
+        web_app.data_store()
+
+    ds_cls.return_value.ensure_indexes.assert_called_once_with()
+
+
+def test_upload_queue_created_lazily(tmpdir):
+    assert api.upload_queue is None
+
+    def process(fh, mod):
+        return {'ACCEPTED_MATCHES': [], 'ERRORS': [], 'SKIPS': 0}
+
+    client = api.app.test_client()
+    with mock.patch.object(api, 'process_upload', process), \
+            mock.patch.object(api, 'upload_queue', None), \
+            mock.patch.dict(api.app.config, {'UPLOAD_SPOOL_DIR': str(tmpdir)}):
+        res = client.post('/api/v2/upload', data={
+            'token': api.app.config['ADMIN_TOKEN'],
+            'file': (io.BytesIO(b'log data'), 'games.log'),
+        })
+        assert res.status_code == 202
+        queue = api.upload_queue
+        queue.executor.shutdown(wait=True)
+
+        job_id = res.json['JOB_ID']
+        assert client.get(f'/api/v2/upload/{job_id}').json['STATUS'] == 'DONE'
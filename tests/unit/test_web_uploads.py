@@ -0,0 +1,80 @@
+import io
+import os
+import socket
+import subprocess
+import time
+
+import pytest
+
+from quakestats.web.uploads import (
+    UploadQueue,
+)
+
+
+@pytest.fixture
+def spool_dir(tmpdir):
+    return str(tmpdir.join('spool'))
+
+
+def test_upload_processed(spool_dir):
+    def process(fh, mod):
+        return {'ACCEPTED_MATCHES': [fh.read().decode(), mod], 'ERRORS': [], 'SKIPS': 0}
+
+    queue = UploadQueue(spool_dir, 1, process)
+    job_id = queue.submit(io.BytesIO(b'log data'), 'osp')
+    queue.executor.shutdown(wait=True)
+
+    assert queue.get_status(job_id) == {
+        'JOB_ID': job_id, 'STATUS': 'DONE',
+        'ACCEPTED_MATCHES': ['log data', 'osp'], 'ERRORS': [], 'SKIPS': 0,
+    }
+
+
+def test_upload_failed(spool_dir):
+    def process(fh, mod):
+        raise ValueError('broken')
+
+    queue = UploadQueue(spool_dir, 1, process)
+    job_id = queue.submit(io.BytesIO(b'log data'), 'osp')
+    queue.executor.shutdown(wait=True)
+
+    status = queue.get_status(job_id)
+    assert status['STATUS'] == 'FAILED'
+    assert status['ERRORS'] == ["ValueError('broken')"]
+
+
+def test_unknown_job(spool_dir):
+    queue = UploadQueue(spool_dir, 1, None)
+    assert queue.get_status('0' * 32) is None
+    assert queue.get_status('../../etc/passwd') is None
+
+
+def test_interrupted_jobs_failed(spool_dir):
+    # finished process
+    proc = subprocess.Popen(['true'])
+    proc.wait()
+    queue = UploadQueue(spool_dir, 1, None)
+    queue.owner = '{}:{}'.format(socket.gethostname(), proc.pid)
+    queue.set_status('a' * 32, UploadQueue.RUNNING)
+    with open(queue.log_path('a' * 32), 'w') as fh:
+        fh.write('log data')
+    # owned by running process
+    queue.owner = '{}:{}'.format(socket.gethostname(), os.getpid())
+    queue.set_status('b' * 32, UploadQueue.QUEUED)
+
+    queue = UploadQueue(spool_dir, 1, None)
+    assert queue.get_status('a' * 32)['STATUS'] == 'FAILED'
+    assert not os.path.exists(queue.log_path('a' * 32))
+    assert queue.get_status('b' * 32) == {'JOB_ID': 'b' * 32, 'STATUS': 'QUEUED'}
+
+
+def test_expired_jobs_removed(spool_dir):
+    queue = UploadQueue(spool_dir, 1, None, retention=60)
+    queue.set_status('a' * 32, UploadQueue.DONE)
+    queue.set_status('b' * 32, UploadQueue.DONE)
+    old = time.time() - 120
+    os.utime(queue.status_path('a' * 32), (old, old))
+
+    queue.expire()
+    assert queue.get_status('a' * 32) is None
+    assert queue.get_status('b' * 32)['STATUS'] == 'DONE'